@@ -1,17 +1,28 @@
-import pandas as pd
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from sklearn.base import clone
 from sklearn.neural_network import MLPRegressor
 from sklearn.neighbors import KNeighborsRegressor
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split, GridSearchCV
+from sklearn.model_selection import train_test_split, GridSearchCV, KFold, ParameterGrid
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import r2_score, mean_squared_error
 from sklearn.feature_selection import SelectKBest, f_regression
+from threadpoolctl import threadpool_limits
 import numpy as np
 
+# 共享的数据集加载模块（列式缓存）位于后端目录
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '药植智境模型V2.0', 'backend'))
+from dataset_loader import load_dataset
+
+CV_FOLDS = 5  # 与 GridSearchCV 默认的 5 折一致
+
 # 1. 数据准备与特征工程
 def load_and_preprocess(file_path):
     """加载数据并进行预处理"""
-    data = pd.read_csv(file_path, sep='\t')  # 假设是制表符分隔
+    data = load_dataset(file_path, sep='\t')  # 假设是制表符分隔，首次加载后使用列式缓存
 
     # 确认关键列存在
     required_cols = ['Lat', 'Lon'] + [f'bio{i}' for i in range(1, 20)]
@@ -27,70 +38,96 @@ def select_features(X, y):
     return X_selected, selector.get_support()
 
 # 3. 构建并评估模型（含训练集和测试集指标）
-def build_optimized_models(X, y):
-    """构建三种优化后的预测模型，并评估训练集与测试集效果"""
+def model_specs():
+    """三种模型及其超参数网格"""
+    return {
+        'ANN': (MLPRegressor(max_iter=2000, random_state=42),  # 增加最大迭代次数
+                {'hidden_layer_sizes': [(50,), (100,), (50, 50)]}),
+        'KNN': (KNeighborsRegressor(),
+                {'n_neighbors': [3, 5, 7]}),
+        'RF': (RandomForestRegressor(random_state=42),
+               {'n_estimators': [100, 300], 'max_features': [5, 10]})
+    }
+
+def split_scaled(X, y):
+    """标准化后划分训练集和测试集"""
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X_scaled, y, test_size=0.2, random_state=42)
+    return train_test_split(X_scaled, y, test_size=0.2, random_state=42)
+
+def evaluate_model(model, X_train, X_test, y_train, y_test):
+    """计算训练集与测试集的 R² 和 RMSE"""
+    y_train_pred = model.predict(X_train)
+    y_test_pred = model.predict(X_test)
+
+    # 修改RMSE的计算方式
+    train_rmse = np.sqrt(mean_squared_error(y_train, y_train_pred))
+    test_rmse = np.sqrt(mean_squared_error(y_test, y_test_pred))
+
+    return {
+        'train_r2': r2_score(y_train, y_train_pred),
+        'train_rmse': train_rmse,
+        'test_r2': r2_score(y_test, y_test_pred),
+        'test_rmse': test_rmse
+    }
+
+def build_optimized_models(X, y):
+    """构建三种优化后的预测模型，并评估训练集与测试集效果"""
+    X_train, X_test, y_train, y_test = split_scaled(X, y)
 
     models = {
-        'ANN': GridSearchCV(
-            MLPRegressor(max_iter=2000, random_state=42),  # 增加最大迭代次数
-            param_grid={'hidden_layer_sizes': [(50,), (100,), (50, 50)]},
-            cv=5
-        ),
-        'KNN': GridSearchCV(
-            KNeighborsRegressor(),
-            param_grid={'n_neighbors': [3, 5, 7]},
-            cv=5
-        ),
-        'RF': GridSearchCV(
-            RandomForestRegressor(random_state=42),
-            param_grid={'n_estimators': [100, 300], 'max_features': [5, 10]},
-            cv=5
-        )
+        name: GridSearchCV(estimator, param_grid=param_grid, cv=CV_FOLDS)
+        for name, (estimator, param_grid) in model_specs().items()
     }
 
     results = {}
     for name, model in models.items():
         model.fit(X_train, y_train)
 
-        y_train_pred = model.predict(X_train)
-        y_test_pred = model.predict(X_test)
-
-        # 修改RMSE的计算方式
-        train_rmse = np.sqrt(mean_squared_error(y_train, y_train_pred))
-        test_rmse = np.sqrt(mean_squared_error(y_test, y_test_pred))
-
-        results[name] = {
-            'train_r2': r2_score(y_train, y_train_pred),
-            'train_rmse': train_rmse,
-            'test_r2': r2_score(y_test, y_test_pred),
-            'test_rmse': test_rmse,
-            'best_params': model.best_params_
-        }
+        results[name] = evaluate_model(model, X_train, X_test, y_train, y_test)
+        results[name]['best_params'] = model.best_params_
 
     return results
 
 # 4. 主分析流程
-def analyze_climate_impact(data_path):
-    """分析气候因子对黄芪指标的影响"""
+def prepare_target(data, target):
+    """为单个目标变量做特征选择"""
+    X = data[['Lat', 'Lon'] + [f'bio{i}' for i in range(1, 20)]]
+    y = data[target]
+
+    X_selected, selected_mask = select_features(X, y)
+    return X_selected, y, X.columns[selected_mask]
+
+def print_target_results(target, result):
+    """打印单个目标变量的模型表现"""
+    print(f"\n=== 分析目标变量: {target} ===")
+    print(f"关键环境因子: {result['selected_features']}")
+    for model, res in result['models'].items():
+        print(f"\n{model}：")
+        print(f"  训练集 -> R² = {res['train_r2']:.3f}, RMSE = {res['train_rmse']:.3f}")
+        print(f"  测试集 -> R² = {res['test_r2']:.3f}, RMSE = {res['test_rmse']:.3f}")
+        print(f"  最佳参数：{res['best_params']}")
+
+def analyze_climate_impact(data_path, n_jobs=None):
+    """
+    分析气候因子对黄芪指标的影响
+    n_jobs: 大于 1（或 -1 表示全部核）时使用并行模式，结果按目标变量完成的先后输出
+    """
+    if n_jobs is not None and n_jobs != 1:
+        final_results = {}
+        for target, result in iter_climate_impact_parallel(data_path, n_jobs):
+            print_target_results(target, result)
+            final_results[target] = result
+        return final_results
+
     data = load_and_preprocess(data_path)
     target_cols = [col for col in data.columns if col.startswith(('2022', '2023'))]
 
     final_results = {}
     for target in target_cols:
-        print(f"\n=== 分析目标变量: {target} ===")
-
-        X = data[['Lat', 'Lon'] + [f'bio{i}' for i in range(1, 20)]]
-        y = data[target]
-
         # 特征选择
-        X_selected, selected_mask = select_features(X, y)
-        selected_features = X.columns[selected_mask]
-        print(f"关键环境因子: {list(selected_features)}")
+        X_selected, y, selected_features = prepare_target(data, target)
 
         # 模型训练与评估
         metrics = build_optimized_models(X_selected, y)
@@ -102,14 +139,106 @@ def analyze_climate_impact(data_path):
         }
 
         # 打印模型表现
-        for model, res in metrics.items():
-            print(f"\n{model}：")
-            print(f"  训练集 -> R² = {res['train_r2']:.3f}, RMSE = {res['train_rmse']:.3f}")
-            print(f"  测试集 -> R² = {res['test_r2']:.3f}, RMSE = {res['test_rmse']:.3f}")
-            print(f"  最佳参数：{res['best_params']}")
+        print_target_results(target, final_results[target])
 
     return final_results
 
-# 5. 运行分析
+# 5. 并行分析流程：(目标变量 × 模型 × 网格点 × 折) 作为独立任务提交到同一个进程池
+def _init_parallel_worker():
+    # 每个任务单线程运行，总并发只由进程池大小决定
+    threadpool_limits(limits=1)
+
+def _score_fold(estimator, params, X, y, train_idx, test_idx):
+    """网格搜索中的一个 (网格点, 折) 任务，返回验证折上的 R²（与 GridSearchCV 默认评分一致）"""
+    model = clone(estimator).set_params(**params).fit(X[train_idx], y[train_idx])
+    return model.score(X[test_idx], y[test_idx])
+
+def _refit_best(estimator, params, X_train, X_test, y_train, y_test):
+    """用最佳参数在整个训练集上重新训练并评估"""
+    model = clone(estimator).set_params(**params).fit(X_train, y_train)
+    metrics = evaluate_model(model, X_train, X_test, y_train, y_test)
+    metrics['best_params'] = params
+    return metrics
+
+def iter_climate_impact_parallel(data_path, n_jobs=-1):
+    """
+    并行分析，每个目标变量的全部模型完成后立即产出 (目标变量, 结果)
+    进程池按先进先出执行任务：只有排队任务少于进程数时才提交下一个目标变量的网格搜索，
+    先开始的目标变量的 refit 不会排在所有后续目标变量之后，结果逐个产出
+    """
+    n_jobs = os.cpu_count() if n_jobs is None or n_jobs < 1 else n_jobs
+    data = load_and_preprocess(data_path)
+    target_cols = [col for col in data.columns if col.startswith(('2022', '2023'))]
+    specs = model_specs()
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_parallel_worker) as executor:
+        tasks = {}  # future -> (任务类型, 目标变量, 模型名, 网格点序号, 折序号)
+        states = {}
+        pending_targets = iter(target_cols)
+
+        def submit_target(target):
+            X_selected, y, selected_features = prepare_target(data, target)
+            X_train, X_test, y_train, y_test = split_scaled(X_selected, y)
+            y_train, y_test = np.asarray(y_train), np.asarray(y_test)
+            folds = list(KFold(n_splits=CV_FOLDS).split(X_train))
+
+            state = {
+                'selected_features': selected_features.tolist(),
+                'split': (X_train, X_test, y_train, y_test),
+                'candidates': {},
+                'scores': {},
+                'models': {}
+            }
+            for name, (estimator, param_grid) in specs.items():
+                candidates = list(ParameterGrid(param_grid))
+                state['candidates'][name] = candidates
+                state['scores'][name] = np.full((len(candidates), CV_FOLDS), np.nan)
+                for ci, params in enumerate(candidates):
+                    for fi, (train_idx, test_idx) in enumerate(folds):
+                        future = executor.submit(_score_fold, estimator, params,
+                                                 X_train, y_train, train_idx, test_idx)
+                        tasks[future] = ('fold', target, name, ci, fi)
+            states[target] = state
+
+        def fill_pool():
+            while len(tasks) < n_jobs:
+                target = next(pending_targets, None)
+                if target is None:
+                    return
+                submit_target(target)
+
+        fill_pool()
+        while tasks:
+            done, _ = wait(tasks, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, target, name, ci, fi = tasks.pop(future)
+                state = states[target]
+
+                if kind == 'fold':
+                    scores = state['scores'][name]
+                    scores[ci, fi] = future.result()
+                    if not np.isnan(scores).any():
+                        # 与 GridSearchCV 相同：平均验证得分最高者胜出，并列时取网格顺序靠前的
+                        best = int(np.argmax(scores.mean(axis=1)))
+                        refit = executor.submit(_refit_best, specs[name][0],
+                                                state['candidates'][name][best], *state['split'])
+                        tasks[refit] = ('refit', target, name, best, None)
+                    continue
+
+                state['models'][name] = future.result()
+                if len(state['models']) == len(specs):
+                    del states[target]
+                    yield target, {
+                        'selected_features': state['selected_features'],
+                        'models': {model: state['models'][model] for model in specs}
+                    }
+            fill_pool()
+
+# 6. 运行分析
 if __name__ == "__main__":
-    results = analyze_climate_impact("final.input.txt")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='气候因子对黄芪指标的影响分析')
+    parser.add_argument('--n-jobs', type=int, default=None,
+                        help="并行进程数（-1 表示全部核），不指定时串行运行")
+    args = parser.parse_args()
+
+    results = analyze_climate_impact("final.input.txt", n_jobs=args.n_jobs)
\ No newline at end of file
@@ -1,7 +1,117 @@
+import argparse
+import os
+import sys
+
 import pandas as pd
 
-# 读取原始TXT文件
-df = pd.read_csv("final.input.txt", sep='\t', encoding='utf-8')
+# 共享的数据集加载模块（列式缓存）位于后端目录
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '药植智境模型V2.0', 'backend'))
+from dataset_loader import ChunkTypeMismatch, ColumnarCacheWriter, cache_path_for, source_digest
+
+REQUIRED_COLUMNS = ['Lat', 'Lon'] + [f'bio{i}' for i in range(1, 20)]
+BYTES_PER_CELL = 64  # 解析时每个单元格的估计内存占用（含 pandas 中间缓冲），用于由内存上限推算分块行数
+
+
+def read_header(path, sep):
+    """只读取表头一行"""
+    with open(path, encoding='utf-8-sig') as f:
+        return f.readline().rstrip('\r\n').split(sep)
+
+
+def validate_header(columns):
+    """确认关键列存在，只检查表头，不读取数据"""
+    missing = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing:
+        raise ValueError(f"缺少必需的气候因子列: {missing}")
+
+
+def _convert_pass(src, dst, cache_path, chunk_rows, sep, text_columns):
+    """
+    读取一遍源文件，写出 CSV 和/或列式缓存，返回行数
+    CSV 先写入同目录下的临时文件，成功后再替换 dst，中途失败不会破坏已有的 CSV
+    text_columns 中的列按文本读取
+    """
+    total_bytes = os.path.getsize(src)
+    dtype = {col: str for col in text_columns} or None
+    writer = ColumnarCacheWriter(cache_path) if cache_path else None
+    tmp_dst = f"{dst}.{os.getpid()}.tmp" if dst else None
+
+    n_rows = 0
+    try:
+        with open(src, 'rb') as f_in:
+            out = open(tmp_dst, 'w', encoding='utf-8', newline='') if tmp_dst else None
+            try:
+                for i, chunk in enumerate(pd.read_csv(f_in, sep=sep, encoding='utf-8', chunksize=chunk_rows,
+                                                      dtype=dtype)):
+                    if out is not None:
+                        chunk.to_csv(out, header=(i == 0), index=False)
+                    if writer is not None:
+                        writer.write_chunk(chunk)
+                    n_rows += len(chunk)
+                    progress = min(f_in.tell() / total_bytes, 1.0) if total_bytes else 1.0
+                    print(f"\r已处理 {n_rows} 行 ({progress:.1%})", end='', flush=True)
+            finally:
+                if out is not None:
+                    out.close()
+        if writer is not None:
+            writer.finalize(source_digest(src))
+        if tmp_dst:
+            os.replace(tmp_dst, dst)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        if tmp_dst and os.path.exists(tmp_dst):
+            os.remove(tmp_dst)
+        raise
+    return n_rows
+
+
+def convert(src, dst=None, emit_cache=False, max_memory_mb=256, sep='\t'):
+    """
+    分块把制表符分隔的 TXT 转换为 CSV，内存占用不超过 max_memory_mb
+    emit_cache=True 时在同一次读取中写出列式缓存（与 dataset_loader.load_dataset 使用的格式一致）
+    某列在后面的分块中才出现文本（列式缓存要求各分块类型一致）时，把该列改为文本重新转换
+    """
+    columns = read_header(src, sep)
+    validate_header(columns)
+    chunk_rows = max(1, max_memory_mb * 2 ** 20 // (len(columns) * BYTES_PER_CELL))
+
+    cache_path = None
+    if emit_cache:
+        cache_path = cache_path_for(src, source_digest(src))
+        if os.path.exists(os.path.join(cache_path, 'meta.json')):
+            print(f"列式缓存已存在: {cache_path}")
+            cache_path = None
+
+    text_columns = []
+    while True:
+        try:
+            n_rows = _convert_pass(src, dst, cache_path, chunk_rows, sep, text_columns)
+            break
+        except ChunkTypeMismatch as e:
+            if e.column is None or e.column in text_columns:
+                raise
+            print(f"\n{e}，按文本重新转换")
+            text_columns.append(e.column)
+
+    print(f"\n转换完成，共 {n_rows} 行，每块 {chunk_rows} 行")
+    if text_columns:
+        print(f"按文本保存的列: {text_columns}")
+    if dst:
+        print(f"CSV 已保存至 {dst}")
+    if cache_path:
+        print(f"列式缓存已保存至 {cache_path}")
+    return n_rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='把制表符分隔的 TXT 分块转换为 CSV / 列式缓存')
+    parser.add_argument('src', nargs='?', default='final.input.txt', help="原始 TXT 文件")
+    parser.add_argument('dst', nargs='?', default='final_input.csv', help="输出 CSV 文件")
+    parser.add_argument('--no-csv', action='store_true', help="不输出 CSV，只生成列式缓存")
+    parser.add_argument('--cache', action='store_true', help="同时生成列式缓存")
+    parser.add_argument('--max-memory-mb', type=int, default=256, help="单个分块的内存上限（MB）")
+    args = parser.parse_args()
 
-# 保存为CSV文件
-df.to_csv("final_input.csv", index=False, encoding='utf-8')
\ No newline at end of file
+    convert(args.src, None if args.no_csv else args.dst,
+            emit_cache=args.cache or args.no_csv, max_memory_mb=args.max_memory_mb)
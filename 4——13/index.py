@@ -1,12 +1,17 @@
-import pandas as pd
+import os
+import sys
 import seaborn as sns
 import matplotlib.pyplot as plt
 
-# 读取数据
-df = pd.read_csv("final_input.csv")
+# 共享的数据集加载模块（列式缓存）位于后端目录
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '药植智境模型V2.0', 'backend'))
+from dataset_loader import load_dataset
 
 # 选择目标变量（修改此处更换指标）
 target_column = "2023 Root length (cm)"  # 示例：2023年根长
+
+# 读取数据（只加载需要的列）
+df = load_dataset("final_input.csv", columns=["source", target_column])
 year = target_column.split()[0]          # 提取年份
 metric = " ".join(target_column.split()[1:])  # 提取指标名称
 
@@ -1,45 +1,142 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import pandas as pd
+from functools import wraps
 import os
-from astragalus_predictor import AstragalusPredictor, RESULTS_PATH
-from climate_seed_model import ClimateSeedModel
+from astragalus_predictor import AstragalusPredictor, RESULTS_PATH, MODELS_DIR, MODEL_NAMES
+from climate_seed_model import ClimateSeedModel, artifact_files as climate_artifact_files
+from prediction_logging import configure_logging
+from memory_stats import read_memory_usage
+from model_reloader import ModelSlot, ModelReloader
+from request_metrics import track, stage, render as render_metrics
+from micro_batcher import MicroBatcher, MICRO_BATCH_ENABLED
+from climate_raster import load_default_raster
+from climate_lattice import load_default_index, RADIUS_QUERY_MAX_LIMIT
+import prediction_handlers as handlers
+
+configure_logging()
 
 app = Flask(__name__)
 CORS(app)
 
-# 初始化两个预测器
-astragalus_predictor = AstragalusPredictor()
-if not astragalus_predictor.is_loaded:
-    raise RuntimeError("产量预测模型未加载，请先生成模型文件")
+# 模型指标响应的浏览器缓存时间（秒），过期后凭 ETag 重新验证
+MODEL_METRICS_MAX_AGE = int(os.environ.get("MODEL_METRICS_MAX_AGE", "60"))
+
+# 管理接口令牌，设置后调用 /api/admin/* 需在请求头 X-Admin-Token 中携带
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+# 热更新前的冒烟测试样例，新模型必须全部预测成功才会替换当前模型
+ASTRAGALUS_SMOKE_RECORDS = [
+    {"root_length": 10.5, "yield": 200.0, "c7g_content": 0.8},
+    {"root_length": 29.37, "yield": 161.2, "c7g_content": 0.0393}
+]
+CLIMATE_SMOKE_RECORDS = [
+    {"bio1": 15.0, "bio12": 1200.0, "bio3": 0.5, "bio5": 30.0, "bio7": 20.0},
+    {"bio15": 114.23, "bio16": 193.0, "bio17": 7.0, "bio18": 193.0, "bio19": 7.0}
+]
+
+def load_astragalus_predictor():
+    predictor = AstragalusPredictor()
+    if not predictor.is_loaded:
+        raise RuntimeError("产量预测模型未加载，请先生成模型文件")
+    return predictor
+
+def validate_astragalus_predictor(predictor):
+    # 逐个模型校验；懒加载模式下每个模型校验完即释放，不会同时加载全部四个模型
+    for model_name in MODEL_NAMES:
+        predictor.validate_model(model_name, ASTRAGALUS_SMOKE_RECORDS)
+
+def load_climate_predictor():
+    predictor = ClimateSeedModel()
+    if not predictor._load_models():
+        raise RuntimeError("气象预测模型未加载，请先生成模型文件")
+    return predictor
+
+def validate_climate_predictor(predictor):
+    result = predictor.predict_batch(CLIMATE_SMOKE_RECORDS)
+    errors = [row["error"] for row in result.get("results", []) if "error" in row]
+    if "error" in result or errors:
+        raise RuntimeError(f"气候模型冒烟测试失败: {result.get('error') or errors}")
+    if not all(0.0 <= row["confidence"] <= 1.0 for row in result["results"]):
+        raise RuntimeError("气候模型冒烟测试失败: 置信度超出 [0, 1]")
+
+# 初始化两个预测器，热更新时整体替换 slot 中的引用
+astragalus_slot = ModelSlot("astragalus", load_astragalus_predictor, validate_astragalus_predictor,
+                            lambda: [MODELS_DIR, RESULTS_PATH])
+climate_slot = ModelSlot("climate", load_climate_predictor, validate_climate_predictor,
+                         climate_artifact_files)
+astragalus_slot.reload()
+climate_slot.reload()
+model_reloader = ModelReloader([astragalus_slot, climate_slot])
+
+# 按经纬度取气候值的本地栅格（CLIMATE_RASTER_DIR），未配置时接口返回 404
+climate_raster = load_default_raster()
+
+# 格点预测结果的空间索引（CLIMATE_LATTICE_DIR），气候模型切换后在后台重建
+climate_lattice = load_default_index(climate_raster)
+if climate_lattice is not None:
+    climate_slot.listeners.append(climate_lattice.ensure)
+    # 导入时（gunicorn preload 下即 master 进程）只加载已有结果，构建线程在 start_background_tasks 中启动
+    climate_lattice.ensure(climate_slot, build=False)
 
-climate_predictor = ClimateSeedModel()
-if not climate_predictor._load_models():
-    raise RuntimeError("气象预测模型未加载，请先生成模型文件")
+# 单条预测请求合批（MICRO_BATCH_ENABLED=1），每批计算时取 slot 中当前生效的模型
+astragalus_batcher = climate_batcher = None
+if MICRO_BATCH_ENABLED:
+    astragalus_batcher = MicroBatcher(
+        "astragalus", lambda model_name, records: astragalus_slot.get().predict_batch(records, model_name=model_name))
+    climate_batcher = MicroBatcher("climate", lambda _, records: climate_slot.get().predict_batch(records))
+
+def start_background_tasks():
+    """当前进程的后台线程：模型文件监视、格点索引构建；线程不会随 fork 复制，gunicorn 下在 post_fork 中调用"""
+    model_reloader.start_watching()
+    if climate_lattice is not None:
+        climate_lattice.ensure(climate_slot)
+
+def instrumented(view):
+    """统计请求耗时、状态码和进行中请求数，见 request_metrics"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with track(request.url_rule.rule) as timer:
+            response = view(*args, **kwargs)
+            if timer is not None and isinstance(response, tuple):
+                timer.status = response[1]
+            return response
+    return wrapper
 
 @app.route('/api/astragalus/predict', methods=['POST'])
+@instrumented
 def predict_astragalus():
     """处理根长、产量和C7G含量的预测请求"""
-    data = request.json
-    try:
-        # 从请求中获取模型名称，如果没有提供则使用默认值
-        model_name = data.get('model_name', 'XGBoost')
-        
-        result = astragalus_predictor.predict({
-            'root_length': float(data['root_length']),
-            'yield': float(data['yield']),
-            'c7g_content': float(data['c7g_content'])
-        }, model_name=model_name)
-        
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
+    with stage("parse"):
+        data = request.get_json(silent=True)  # 格式错误时为 None，由处理函数返回 400
+    result, status = handlers.astragalus_predict(astragalus_slot.get(), data, batcher=astragalus_batcher)
+    with stage("serialize"):
+        return jsonify(result), status
+
+@app.route('/api/astragalus/predict/batch', methods=['POST'])
+@instrumented
+def predict_astragalus_batch():
+    """批量处理根长、产量和C7G含量的预测请求"""
+    with stage("parse"):
+        data = request.get_json(silent=True)
+    result, status = handlers.astragalus_predict_batch(astragalus_slot.get(), data)
+    with stage("serialize"):
+        return jsonify(result), status
+
+@app.route('/api/astragalus/predict/ensemble', methods=['POST'])
+@instrumented
+def predict_astragalus_ensemble():
+    """四个模型的集成预测，附带预测区间"""
+    with stage("parse"):
+        data = request.get_json(silent=True)
+    result, status = handlers.astragalus_predict_ensemble(astragalus_slot.get(), data)
+    with stage("serialize"):
+        return jsonify(result), status
 
 @app.route('/api/astragalus/models', methods=['GET'])
 def get_available_models():
     """获取可用模型列表"""
     try:
-        available_models = ["XGBoost", "RandomForest", "KNN", "ANN"]
+        available_models = MODEL_NAMES
         return jsonify({
             "models": available_models,
             "default": "XGBoost"
@@ -49,50 +146,148 @@ def get_available_models():
 
 @app.route('/api/astragalus/model-metrics', methods=['GET'])
 def get_model_metrics():
-    """获取所有模型的训练和测试指标"""
-    try:
-        if not os.path.exists(RESULTS_PATH):
-            return jsonify({"error": "模型指标文件不存在"}), 404
-        
-        # 读取模型比较结果
-        df = pd.read_csv(RESULTS_PATH)
-        
-        # 转换为前端友好的格式
-        metrics = []
-        for _, row in df.iterrows():
-            metrics.append({
-                "name": row["Model"],
-                "metrics": {
-                    "train": {
-                        "r2": round(row["Train_R2_mean"] * 100, 2),  # 转换为百分比
-                        "rmse": round(row["Train_RMSE_mean"], 4)
-                    },
-                    "test": {
-                        "r2": round(row["Test_R2_mean"] * 100, 2),  # 转换为百分比
-                        "rmse": round(row["Test_RMSE_mean"], 4)
-                    }
-                }
-            })
-        
-        return jsonify({
-            "metrics": metrics,
-            "description": {
-                "r2": "R²得分（越高越好）",
-                "rmse": "均方根误差（越低越好）"
-            }
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
+    """获取所有模型的训练和测试指标（模型加载时预先生成，支持 ETag 协商缓存）"""
+    metrics_response = astragalus_slot.get().metrics_response
+    if metrics_response is None:
+        return jsonify({"error": "模型指标文件不存在"}), 404
+
+    body, etag = metrics_response
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = f"public, max-age={MODEL_METRICS_MAX_AGE}"
+    return response.make_conditional(request)  # If-None-Match 命中时返回 304
 
 @app.route('/api/climate/predict', methods=['POST'])
+@instrumented
 def predict_climate():
     """处理气候因子的预测请求"""
-    data = request.json
+    with stage("parse"):
+        data = request.get_json(silent=True)
+    result, status = handlers.climate_predict(climate_slot.get(), data, batcher=climate_batcher)
+    with stage("serialize"):
+        return jsonify(result), status
+
+@app.route('/api/climate/predict/batch', methods=['POST'])
+@instrumented
+def predict_climate_batch():
+    """批量处理多个站点气候因子的预测请求"""
+    with stage("parse"):
+        data = request.get_json(silent=True)
+    result, status = handlers.climate_predict_batch(climate_slot.get(), data)
+    with stage("serialize"):
+        return jsonify(result), status
+
+@app.route('/api/climate/predict/by-location', methods=['POST'])
+@instrumented
+def predict_climate_by_location():
+    """按经纬度（单个或批量）从本地气候栅格取值并预测"""
+    with stage("parse"):
+        data = request.get_json(silent=True)
+    result, status = handlers.climate_predict_by_location(climate_slot.get(), data, raster=climate_raster)
+    with stage("serialize"):
+        return jsonify(result), status
+
+def lattice_query(query):
+    """格点索引查询的公共部分：检查索引状态、解析坐标"""
+    if climate_lattice is None:
+        return jsonify({"error": "未配置格点索引（CLIMATE_LATTICE_DIR、CLIMATE_RASTER_DIR）"}), 404
+    climate_lattice.ensure(climate_slot)
+    lattice = climate_lattice.current
+    if lattice is None:
+        return jsonify({"error": "格点索引构建中，请稍后重试", "status": climate_lattice.status()}), 503
     try:
-        result = climate_predictor.predict(data)
-        return jsonify(result)
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        return jsonify({"query": {"lat": lat, "lon": lon}, "fingerprint": lattice.fingerprint,
+                        "results": query(lattice, lat, lon)})
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@app.route('/api/climate/lattice/nearest', methods=['GET'])
+def lattice_nearest():
+    """离指定坐标最近的 k 个格点的预计算预测（参数 lat、lon、k）"""
+    k = request.args.get('k', 1, type=int)
+    return lattice_query(lambda lattice, lat, lon: lattice.nearest(lat, lon, k=max(1, min(k, 100))))
+
+@app.route('/api/climate/lattice/radius', methods=['GET'])
+def lattice_radius():
+    """指定半径（公里）内格点的预计算预测，按距离排序（参数 lat、lon、radius_km、limit）"""
+    radius_km = request.args.get('radius_km', 10.0, type=float)
+    limit = max(1, min(request.args.get('limit', 1000, type=int), RADIUS_QUERY_MAX_LIMIT))
+    return lattice_query(lambda lattice, lat, lon: lattice.within(lat, lon, radius_km, limit=limit))
+
+@app.route('/api/climate/lattice/status', methods=['GET'])
+def lattice_status():
+    if climate_lattice is None:
+        return jsonify({"error": "未配置格点索引（CLIMATE_LATTICE_DIR、CLIMATE_RASTER_DIR）"}), 404
+    return jsonify(climate_lattice.status())
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """预测结果缓存的命中/未命中/淘汰统计"""
+    return jsonify({
+        "astragalus": astragalus_slot.get().cache.stats(),
+        "climate": climate_slot.get().cache.stats(),
+        "climate_raster": climate_raster.stats() if climate_raster is not None else None
+    })
+
+@app.route('/api/system/micro-batch', methods=['GET'])
+def get_micro_batch_stats():
+    """单条请求合批的批次数和平均批大小"""
+    if not MICRO_BATCH_ENABLED:
+        return jsonify({"enabled": False})
+    return jsonify({
+        "enabled": True,
+        "astragalus": astragalus_batcher.stats(),
+        "climate": climate_batcher.stats()
+    })
+
+@app.route('/api/admin/reload', methods=['POST'])
+def reload_models():
+    """在后台重新加载模型，校验通过后替换，期间请求继续使用当前模型
+    多 worker 部署需开启模型文件监视才能通知到所有 worker，响应中的 broadcast 表示是否已通知"""
+    if ADMIN_TOKEN and request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({"error": "无权限"}), 403
+
+    data = request.get_json(silent=True) or {}
+    target = data.get('target', 'all')
+    if target == 'all':
+        names = None
+    elif target in model_reloader.slots:
+        names = [target]
+    else:
+        return jsonify({"error": f"无效目标，可选: all, {', '.join(model_reloader.slots)}"}), 400
+
+    # 每个 gunicorn worker 持有各自的模型：监视线程开启时写入共享请求，其他 worker 在下一轮检查时跟进
+    broadcast = model_reloader.watching
+    if broadcast:
+        model_reloader.broadcast(names)
+    status = model_reloader.trigger(names, wait=bool(data.get('wait', False)))
+    body = {"status": status, "pid": os.getpid(), "broadcast": broadcast}
+    if not broadcast:
+        body["warning"] = ("模型文件监视未开启（MODEL_WATCH_INTERVAL=0），只重新加载了处理本请求的 worker；"
+                           "多 worker 部署请设置 MODEL_WATCH_INTERVAL>0 或重启服务")
+    return jsonify(body), 202
+
+@app.route('/api/admin/reload', methods=['GET'])
+def get_reload_status():
+    """模型版本和最近一次重新加载的状态"""
+    return jsonify({"status": model_reloader.status()})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus 文本格式的请求计数与各阶段耗时（当前 worker 进程）"""
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route('/api/system/memory', methods=['GET'])
+def get_memory_usage():
+    """当前 worker 进程的内存占用（共享页/私有页，单位 kB）"""
+    usage = read_memory_usage()
+    if usage is None:
+        return jsonify({"error": "当前系统不支持读取内存信息"}), 404
+    return jsonify({"pid": os.getpid(), "memory_kb": usage})
+
 if __name__ == '__main__':
+    # 开发模式；生产环境请使用 gunicorn -c gunicorn.conf.py
+    start_background_tasks()
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
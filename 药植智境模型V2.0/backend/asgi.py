@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+asgi.py
+异步服务入口：uvicorn asgi:app 或
+GUNICORN_APP=asgi:app GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c gunicorn.conf.py
+
+预测接口由 Starlette 在事件循环中处理，模型计算交给有界推理线程池（inference_executor）：
+队列满时返回 503，超过 INFERENCE_TIMEOUT 返回 504。
+其余接口（模型列表、模型指标、缓存统计、管理接口、/metrics）仍由 Flask 应用处理，经 a2wsgi 挂载，
+使用 a2wsgi 自己的线程池，不会被慢速推理占满。
+开启合批（MICRO_BATCH_ENABLED=1）时，单条预测接口直接在事件循环中等待合批结果，不占用推理线程。
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+import prediction_handlers as handlers
+from app import (app as flask_app, astragalus_slot, climate_slot, astragalus_batcher,
+                 climate_batcher, climate_raster, start_background_tasks)
+from inference_executor import InferenceExecutor, ExecutorOverloaded, DeadlineExceeded
+from request_metrics import track, stage, set_model
+
+executor = InferenceExecutor()
+
+
+async def _read_json(request):
+    """请求体不是合法 JSON 时返回 None，由处理函数返回 400"""
+    with stage("parse"):
+        try:
+            return await request.json()
+        except ValueError:
+            return None
+
+
+def _json_response(result, status, timer):
+    if timer is not None:
+        timer.status = status
+    with stage("serialize"):
+        headers = {"Retry-After": "1"} if status == 503 else None
+        return JSONResponse(result, status_code=status, headers=headers)
+
+
+def prediction_endpoint(route, slot, handler):
+    """把与框架无关的处理函数包装为异步接口"""
+    async def endpoint(request):
+        with track(route) as timer:
+            data = await _read_json(request)
+            try:
+                result, status = await executor.run_async(handler, slot.get(), data)
+            except ExecutorOverloaded as e:
+                result, status = {"error": str(e)}, 503
+            except DeadlineExceeded as e:
+                result, status = {"error": str(e)}, 504
+            return _json_response(result, status, timer)
+    return endpoint
+
+
+def batched_endpoint(route, batcher, parse, fallback):
+    """单条预测接口：解析后交给合批队列，在事件循环中等待结果；无需合批的请求回退到普通处理"""
+    async def endpoint(request):
+        with track(route) as timer:
+            data = await _read_json(request)
+            try:
+                key, record = parse(data)
+            except Exception as e:
+                return _json_response({"error": str(e)}, 400, timer)
+            set_model(key)
+
+            try:
+                future = batcher.submit(key, record)
+            except ExecutorOverloaded as e:
+                return _json_response({"error": str(e)}, 503, timer)
+            try:
+                with stage("micro_batch"):
+                    result = await asyncio.wait_for(asyncio.wrap_future(future), executor.timeout)
+                status = 200
+            except asyncio.TimeoutError:
+                result, status = {"error": f"推理超过 {executor.timeout:g} 秒未完成"}, 504
+            except Exception as e:
+                result, status = {"error": str(e)}, 400
+            return _json_response(result, status, timer)
+
+    if batcher is None:
+        return fallback
+    return endpoint
+
+
+def parse_astragalus_batched(data):
+    """模型名无效时直接返回 400，不为其建立合批队列"""
+    model_name, record = handlers.parse_astragalus_request(data)
+    if model_name not in handlers.MODEL_NAMES:
+        raise ValueError(f"无效模型名称，可选: {handlers.MODEL_NAMES}")
+    return model_name, record
+
+
+async def inference_stats(request):
+    """推理线程池的排队、拒绝和超时统计"""
+    return JSONResponse(executor.stats())
+
+
+@asynccontextmanager
+async def lifespan(app):
+    start_background_tasks()
+    yield
+    executor.shutdown(wait=False)
+
+
+PREDICTION_ROUTES = [
+    ('/api/astragalus/predict', astragalus_slot, handlers.astragalus_predict),
+    ('/api/astragalus/predict/batch', astragalus_slot, handlers.astragalus_predict_batch),
+    ('/api/astragalus/predict/ensemble', astragalus_slot, handlers.astragalus_predict_ensemble),
+    ('/api/climate/predict', climate_slot, handlers.climate_predict),
+    ('/api/climate/predict/batch', climate_slot, handlers.climate_predict_batch),
+    ('/api/climate/predict/by-location', climate_slot,
+     lambda predictor, data: handlers.climate_predict_by_location(predictor, data, raster=climate_raster)),
+]
+
+ENDPOINTS = {path: prediction_endpoint(path, slot, handler) for path, slot, handler in PREDICTION_ROUTES}
+ENDPOINTS['/api/astragalus/predict'] = batched_endpoint(
+    '/api/astragalus/predict', astragalus_batcher, parse_astragalus_batched, ENDPOINTS['/api/astragalus/predict'])
+ENDPOINTS['/api/climate/predict'] = batched_endpoint(
+    '/api/climate/predict', climate_batcher, handlers.parse_climate_request, ENDPOINTS['/api/climate/predict'])
+
+app = Starlette(
+    routes=[Route(path, endpoint, methods=['POST']) for path, endpoint in ENDPOINTS.items()]
+    + [Route('/api/system/inference', inference_stats, methods=['GET']),
+       Mount('/', app=WSGIMiddleware(flask_app))],
+    # 与 Flask 端的 CORS(app) 一致，允许任意来源
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
@@ -1,13 +1,28 @@
 import pandas as pd
-import pickle
+import numpy as np
+import hashlib
+import json
+import math
 import os
+import threading
+import joblib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sklearn.base import clone
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import PolynomialFeatures, StandardScaler
-from sklearn.model_selection import cross_validate
+from sklearn.model_selection import KFold
+from sklearn.metrics import r2_score, mean_squared_error
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.neighbors import KNeighborsRegressor
 from sklearn.neural_network import MLPRegressor
 from xgboost import XGBRegressor
+from threadpoolctl import threadpool_limits
+from prediction_logging import get_logger, configure_logging
+from model_artifacts import save_artifact, load_artifact, artifact_exists, artifact_format
+from prediction_cache import PredictionCache
+from dataset_loader import load_dataset
+from request_metrics import stage
 
 # 常量定义
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -16,26 +31,100 @@ MODELS_DIR = os.path.join(PREDICTOR_DIR, "saved_models")
 RESULTS_PATH = os.path.join(PREDICTOR_DIR, "model_comparison.csv")
 DATA_PATH = os.path.join(BASE_DIR, "final_input.csv")  # 数据文件保持在原位置
 
+# 请求字段与训练特征列的对应关系（顺序即训练时的列顺序）
+FEATURE_COLUMNS = {
+    'root_length': '2022 Root length (cm)',
+    'yield': '2022 Root yields (kg/mu)',
+    'c7g_content': '2022 Calycosin-7-glucoside (C7G) content (%)'
+}
+MODEL_NAMES = ["XGBoost", "RandomForest", "KNN", "ANN"]
+
+# 训练配置
+CV_FOLDS = 5
+TRAIN_N_JOBS = int(os.environ.get("TRAIN_N_JOBS", os.cpu_count() or 1))  # 训练总核数预算
+
+# 增量更新配置：每次新增的 XGBoost 提升轮数 / 随机森林树数 / MLP partial_fit 轮数
+INCREMENTAL_XGB_ROUNDS = int(os.environ.get("INCREMENTAL_XGB_ROUNDS", "20"))
+INCREMENTAL_RF_TREES = int(os.environ.get("INCREMENTAL_RF_TREES", "20"))
+INCREMENTAL_MLP_EPOCHS = int(os.environ.get("INCREMENTAL_MLP_EPOCHS", "20"))
+
+# 懒加载配置：首次使用时才反序列化模型，已加载的模型按 LRU 保留
+LAZY_LOAD = os.environ.get("ASTRAGALUS_LAZY_LOAD", "0") == "1"
+MODEL_CACHE_SIZE = int(os.environ.get("ASTRAGALUS_MODEL_CACHE_SIZE", "2"))
+PRELOAD_MODELS = [name for name in os.environ.get("ASTRAGALUS_PRELOAD_MODELS", "XGBoost").split(",") if name]
+
+log = get_logger("astragalus")
+
 # 确保所需目录存在
 os.makedirs(PREDICTOR_DIR, exist_ok=True)
 os.makedirs(MODELS_DIR, exist_ok=True)
 
-def train_and_compare_models():
-    # 加载数据
-    data = pd.read_csv(DATA_PATH)
-    print(f"数据加载成功，样本数: {data.shape[0]}")
-    
-    # 定义特征和目标
-    numeric_features = [
-        '2022 Root length (cm)',
-        '2022 Root yields (kg/mu)',
-        '2022 Calycosin-7-glucoside (C7G) content (%)'
-    ]
-    X = data[numeric_features]
-    y = data['source']
-    
-    # 定义对比模型
-    models = {
+def model_base_path(model_name):
+    """模型文件路径（不含扩展名，格式见 model_artifacts）"""
+    return os.path.join(MODELS_DIR, f"{model_name}_model")
+
+def load_pipeline(model_name):
+    """从磁盘加载一个模型管道，native 格式会内存映射"""
+    return load_artifact(model_base_path(model_name))
+
+def load_inference_pipeline(model_name):
+    """加载用于推理的模型管道：校验训练时的特征列顺序，然后去掉第一步记录的列名，
+    之后直接输入按 FEATURE_COLUMNS 顺序排列的 NumPy 数组，不再构造 DataFrame"""
+    model = load_pipeline(model_name)
+    first = model.steps[0][1]
+    trained_columns = getattr(first, "feature_names_in_", None)
+    if trained_columns is not None:
+        if list(trained_columns) != list(FEATURE_COLUMNS.values()):
+            raise ValueError(f"{model_name} 模型的特征列 {list(trained_columns)} 与 FEATURE_COLUMNS 不一致")
+        del first.feature_names_in_  # 否则 sklearn 每次输入数组都会警告缺少列名
+    return model
+
+def pipeline_transform(model, X):
+    """依次执行管道中除最后一步以外的预处理，与 Pipeline.predict 内部的处理一致"""
+    for _, step in model.steps[:-1]:
+        X = step.transform(X)
+    return X
+
+def pipeline_predict(model, X):
+    """分阶段执行 Pipeline.predict，分别记录预处理和模型计算的耗时"""
+    with stage("transform"):
+        X = pipeline_transform(model, X)
+    with stage("estimator"):
+        return model.steps[-1][1].predict(X)
+
+def preprocess_key(model):
+    """预处理步骤（多项式+标准化）的内容哈希；训练时四个模型共用同一组预处理，哈希相同时集成预测只需变换一次"""
+    return joblib.hash(model.steps[:-1])
+
+def build_metrics_response(model_metrics):
+    """/api/astragalus/model-metrics 的响应体，模型加载时生成一次；返回 (JSON 字节, ETag)"""
+    metrics = []
+    for name, row in model_metrics.items():
+        metrics.append({
+            "name": name,
+            "metrics": {
+                "train": {
+                    "r2": round(row["Train_R2_mean"] * 100, 2),  # 转换为百分比
+                    "rmse": round(row["Train_RMSE_mean"], 4)
+                },
+                "test": {
+                    "r2": round(row["Test_R2_mean"] * 100, 2),  # 转换为百分比
+                    "rmse": round(row["Test_RMSE_mean"], 4)
+                }
+            }
+        })
+    body = json.dumps({
+        "metrics": metrics,
+        "description": {
+            "r2": "R²得分（越高越好）",
+            "rmse": "均方根误差（越低越好）"
+        }
+    }, ensure_ascii=False).encode("utf-8")
+    return body, hashlib.sha256(body).hexdigest()[:32]
+
+def build_models():
+    """定义对比模型"""
+    return {
         "XGBoost": XGBRegressor(
             n_estimators=100,
             learning_rate=0.1,
@@ -64,95 +153,340 @@ def train_and_compare_models():
         )
     }
 
-    # 结果存储
-    results = []
+def build_preprocessor():
+    """所有模型共用的预处理步骤"""
+    return Pipeline([
+        ('poly', PolynomialFeatures(degree=2, include_bias=False)),
+        ('scaler', StandardScaler())
+    ])
+
+def prepare_fold_cache(X, y):
+    """每折只拟合一次多项式+标准化，结果供所有模型共享；另含全量数据的预处理结果用于最终训练"""
+    folds = []
+    for train_idx, test_idx in KFold(n_splits=CV_FOLDS).split(X):
+        preprocessor = build_preprocessor().fit(X.iloc[train_idx])
+        folds.append((
+            preprocessor.transform(X.iloc[train_idx]), y.iloc[train_idx].to_numpy(),
+            preprocessor.transform(X.iloc[test_idx]), y.iloc[test_idx].to_numpy()
+        ))
+    preprocessor = build_preprocessor().fit(X)
+    return {
+        "folds": folds,
+        "full": (preprocessor.transform(X), y.to_numpy()),
+        "preprocessor": preprocessor
+    }
+
+_fold_cache = None  # 训练子进程中的共享折数据，由进程池 initializer 设置
+
+def _init_training_worker(fold_cache):
+    global _fold_cache
+    _fold_cache = fold_cache
+
+def _train_single_model(model_name, estimator, n_threads):
+    """在当前进程中完成一个模型的交叉验证、最终训练和保存，线程数限制为 n_threads"""
+    if 'n_jobs' in estimator.get_params():
+        estimator.set_params(n_jobs=n_threads)
+
+    scores = {'train_r2': [], 'test_r2': [], 'train_rmse': [], 'test_rmse': []}
+    with threadpool_limits(limits=n_threads):
+        for X_train, y_train, X_test, y_test in _fold_cache["folds"]:
+            fold_model = clone(estimator).fit(X_train, y_train)
+            for split, X_split, y_split in (('train', X_train, y_train), ('test', X_test, y_test)):
+                y_pred = fold_model.predict(X_split)
+                scores[f'{split}_r2'].append(r2_score(y_split, y_pred))
+                scores[f'{split}_rmse'].append(np.sqrt(mean_squared_error(y_split, y_pred)))
+
+        # 完整训练，复用全量数据上已拟合的预处理步骤
+        X_full, y_full = _fold_cache["full"]
+        final_model = clone(estimator).fit(X_full, y_full)
+        if model_name == "KNN":
+            keep_training_set(final_model, X_full, y_full)
+
+    pipe = Pipeline(_fold_cache["preprocessor"].steps + [('model', final_model)])
+    model_paths = save_artifact(pipe, model_base_path(model_name))
+
+    model_results = {
+        'Model': model_name,
+        'Train_R2_mean': np.mean(scores['train_r2']),
+        'Test_R2_mean': np.mean(scores['test_r2']),
+        'Train_RMSE_mean': np.mean(scores['train_rmse']),
+        'Test_RMSE_mean': np.mean(scores['test_rmse'])
+    }
+    return model_results, model_paths
+
+def train_and_compare_models(n_jobs=None):
+    """
+    训练并比较所有模型
+    n_jobs: 总核数预算，默认读取环境变量 TRAIN_N_JOBS；模型之间并行，剩余核数分给每个模型内部的线程
+    """
+    # 定义特征和目标
+    numeric_features = list(FEATURE_COLUMNS.values())
+
+    # 加载数据（列式缓存，只读取需要的列）
+    data = load_dataset(DATA_PATH, columns=numeric_features + ['source'])
+    print(f"数据加载成功，样本数: {data.shape[0]}")
     
-    for model_name, estimator in models.items():
-        print(f"\n=== 正在训练 {model_name} ===")
-        
-        # 构建管道
-        pipe = Pipeline([
-            ('poly', PolynomialFeatures(degree=2, include_bias=False)),
-            ('scaler', StandardScaler()),
-            ('model', estimator)
-        ])
-        
-        # 交叉验证
-        cv_results = cross_validate(
-            pipe, X, y,
-            cv=5,
-            scoring=('r2', 'neg_root_mean_squared_error'),
-            return_train_score=True,
-            n_jobs=-1
-        )
-        
-        # 记录结果
-        model_results = {
-            'Model': model_name,
-            'Train_R2_mean': cv_results['train_r2'].mean(),
-            'Test_R2_mean': cv_results['test_r2'].mean(),
-            'Train_RMSE_mean': (-cv_results['train_neg_root_mean_squared_error']).mean(),
-            'Test_RMSE_mean': (-cv_results['test_neg_root_mean_squared_error']).mean()
-        }
+    X = data[numeric_features]
+    y = data['source']
+    
+    models = build_models()
+    fold_cache = prepare_fold_cache(X, y)
+
+    # 核数预算：先按模型数分配进程，再把剩余的核平均分给每个模型内部的线程，避免嵌套超订
+    n_jobs = max(1, n_jobs or TRAIN_N_JOBS)
+    n_workers = min(len(models), n_jobs)
+    n_threads = max(1, n_jobs // n_workers)
+    print(f"核数预算: {n_jobs}，并行训练进程: {n_workers}，每个模型线程数: {n_threads}")
+
+    trained = {}
+    if n_workers == 1:
+        _init_training_worker(fold_cache)
+        for model_name, estimator in models.items():
+            print(f"\n=== 正在训练 {model_name} ===")
+            trained[model_name] = _train_single_model(model_name, estimator, n_threads)
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_training_worker,
+                                 initargs=(fold_cache,)) as executor:
+            futures = {
+                executor.submit(_train_single_model, model_name, estimator, n_threads): model_name
+                for model_name, estimator in models.items()
+            }
+            for future in as_completed(futures):
+                model_name = futures[future]
+                trained[model_name] = future.result()
+                print(f"\n=== {model_name} 训练完成 ===")
+
+    # 结果存储（保持模型定义顺序）
+    results = []
+    for model_name in models:
+        model_results, model_paths = trained[model_name]
         results.append(model_results)
-        
-        # 完整训练并保存
-        print("训练最终模型...")
-        pipe.fit(X, y)
-        model_path = os.path.join(MODELS_DIR, f"{model_name}_model.pkl")
-        with open(model_path, 'wb') as f:
-            pickle.dump(pipe, f)
-        print(f"模型已保存至 {model_path}")
+        print(f"{model_name}: 测试集 R² = {model_results['Test_R2_mean']:.4f}，模型已保存至 {', '.join(model_paths)}")
 
     # 保存对比结果
     pd.DataFrame(results).to_csv(RESULTS_PATH, index=False)
     print(f"\n模型对比结果已保存至 {RESULTS_PATH}")
 
+def keep_training_set(estimator, X, y):
+    """KNN 的预测依赖全部训练样本：在模型上另存一份预处理后的训练矩阵，增量更新时在其后追加新样本"""
+    estimator.train_X_ = np.asarray(X, dtype=np.float64)
+    estimator.train_y_ = np.asarray(y, dtype=np.float64)
+    return estimator
+
+def _update_estimator(model_name, estimator, X, y):
+    """在已拟合的估计器上用新数据继续训练，返回更新后的估计器"""
+    if model_name == "XGBoost":
+        # 从已保存的提升树继续追加若干轮；超参数取 build_models 中的定义（native 格式加载后不保留超参数）
+        updated = clone(build_models()["XGBoost"]).set_params(n_estimators=INCREMENTAL_XGB_ROUNDS)
+        return updated.fit(X, y, xgb_model=estimator.get_booster())
+    if model_name == "RandomForest":
+        # warm_start：保留已有的树，只在新数据上训练新增的树
+        estimator.set_params(warm_start=True, n_estimators=estimator.n_estimators + INCREMENTAL_RF_TREES)
+        estimator.fit(X, y)
+        estimator.set_params(warm_start=False)
+        return estimator
+    if model_name == "ANN":
+        # partial_fit 不支持 early_stopping；以 early_stopping 训练的模型 best_loss_ 为 None，需按普通模式重新初始化
+        estimator.set_params(early_stopping=False)
+        if getattr(estimator, "best_loss_", None) is None:
+            estimator.best_loss_ = np.inf
+        for _ in range(INCREMENTAL_MLP_EPOCHS):
+            estimator.partial_fit(X, y)
+        return estimator
+    if model_name == "KNN":
+        # KNN 没有参数可更新，把新样本追加到已有样本后重建索引
+        X_all = np.vstack([estimator.train_X_, X])
+        y_all = np.concatenate([estimator.train_y_, y])
+        return keep_training_set(estimator.fit(X_all, y_all), X_all, y_all)
+    raise ValueError(f"未知模型: {model_name}")
+
+def _score(estimator, X, y):
+    y_pred = estimator.predict(X)
+    return r2_score(y, y_pred), np.sqrt(mean_squared_error(y, y_pred))
+
+def update_models(new_data_path, full_retrain=False, n_jobs=None):
+    """
+    用新一季的数据增量更新已保存的模型，耗时与新数据量成正比
+    预处理（多项式+标准化）保持不变，只更新最后的估计器；模型文件缺失或 full_retrain=True 时
+    改为在 DATA_PATH（应已并入新数据）上完整重新训练
+    增量更新不重新做交叉验证，model_comparison.csv 保持不变；这里输出更新前后在新数据上的指标
+    四个模型全部更新并校验通过后才写入磁盘，任一模型失败时磁盘上的模型保持不变，不会出现新旧混用；
+    每个模型按其原有文件格式（pickle/native）保存
+    """
+    missing = [name for name in MODEL_NAMES if not artifact_exists(model_base_path(name))]
+    if full_retrain or missing:
+        if missing:
+            print(f"缺少模型文件 {missing}，改为完整重新训练")
+        train_and_compare_models(n_jobs=n_jobs)
+        return
+
+    numeric_features = list(FEATURE_COLUMNS.values())
+    data = load_dataset(new_data_path, columns=numeric_features + ['source'])
+    if data.empty:
+        print("新数据为空，未更新模型")
+        return
+    print(f"新数据加载成功，样本数: {data.shape[0]}")
+    y_new = data['source'].to_numpy(dtype=np.float64)
+
+    # 不使用内存映射：增量训练会原地修改模型参数
+    pipes = {name: load_artifact(model_base_path(name), mmap_mode=None) for name in MODEL_NAMES}
+    formats = {name: artifact_format(model_base_path(name)) for name in MODEL_NAMES}
+    if not hasattr(pipes["KNN"].steps[-1][1], "train_X_"):
+        print("KNN 模型文件中没有保存训练样本（旧版本训练），改为完整重新训练")
+        train_and_compare_models(n_jobs=n_jobs)
+        return
+
+    updated = {}
+    for model_name, pipe in pipes.items():
+        X_new = pipeline_transform(pipe, data[numeric_features])
+        estimator = pipe.steps[-1][1]
+        r2_before, rmse_before = _score(estimator, X_new, y_new)
+
+        estimator = _update_estimator(model_name, estimator, X_new, y_new)
+        if not np.isfinite(estimator.predict(X_new)).all():
+            raise ValueError(f"{model_name} 增量更新后的预测值包含 NaN/inf，未保存任何模型")
+        r2_after, rmse_after = _score(estimator, X_new, y_new)
+        updated[model_name] = Pipeline(pipe.steps[:-1] + [(pipe.steps[-1][0], estimator)])
+        print(f"{model_name}: 新数据 R² {r2_before:.4f} -> {r2_after:.4f}，"
+              f"RMSE {rmse_before:.4f} -> {rmse_after:.4f}")
+
+    for model_name, pipe in updated.items():
+        paths = save_artifact(pipe, model_base_path(model_name), fmt=formats[model_name])
+        print(f"{model_name} 已保存至 {', '.join(paths)}")
+
 class AstragalusPredictor:
-    def __init__(self, model_name="XGBoost"):
+    def __init__(self, model_name="XGBoost", lazy=None, cache_size=None, preload=None):
+        """
+        lazy: 是否懒加载，默认读取环境变量 ASTRAGALUS_LAZY_LOAD
+        cache_size: 懒加载模式下最多同时保留的模型数，默认 ASTRAGALUS_MODEL_CACHE_SIZE
+        preload: 懒加载模式下启动时预热的模型，默认 ASTRAGALUS_PRELOAD_MODELS
+        """
         self.model_name = model_name
-        self.models = {}
+        self.lazy = LAZY_LOAD if lazy is None else lazy
+        self.cache_size = max(1, cache_size or MODEL_CACHE_SIZE)
+        self.models = None  # 已加载的模型，懒加载模式下按 LRU 顺序排列
         self.model_metrics = {}  # 存储模型指标
-        
+        self.metrics_response = None  # 预先生成的模型指标响应 (JSON 字节, ETag)，指标文件不存在时为 None
+        self.cache = PredictionCache()  # 预测结果缓存
+        self.is_loaded = False
+        self._preload = PRELOAD_MODELS if preload is None else preload
+        self._lock = threading.Lock()  # 保护 self.models 的 LRU 顺序，只在查找/插入时短暂持有
+        self._load_locks = {name: threading.Lock() for name in MODEL_NAMES}  # 每个模型一把加载锁
+        self._local = threading.local()  # 每个线程一个单行输入缓冲区
+        self._preprocess_keys = {}  # 模型名 -> 预处理步骤哈希
+        self._load_models()
+
+    def _load_models(self):
+        """加载模型和指标，并清空预测结果缓存"""
+        self.models = OrderedDict()
+        if self.is_loaded:
+            self.cache.clear()  # 重新加载后旧模型的预测结果全部失效
         try:
-            # 加载模型
-            for name in ["XGBoost", "RandomForest", "KNN", "ANN"]:
-                model_path = os.path.join(MODELS_DIR, f"{name}_model.pkl")
-                with open(model_path, 'rb') as f:
-                    self.models[name] = pickle.load(f)
+            if self.lazy:
+                # 只检查模型文件是否齐全，按配置预热部分模型
+                missing = [name for name in MODEL_NAMES if not artifact_exists(model_base_path(name))]
+                if missing:
+                    raise FileNotFoundError(f"缺少模型文件: {missing}")
+                for name in self._preload[:self.cache_size]:
+                    if name in MODEL_NAMES:
+                        self.get_model(name)
+                    else:
+                        log.warning("忽略未知的预热模型: %s", name)
+            else:
+                # 加载模型
+                for name in MODEL_NAMES:
+                    self.models[name] = load_inference_pipeline(name)
+                    self._preprocess_keys[name] = preprocess_key(self.models[name])
             
             # 加载模型指标
             if os.path.exists(RESULTS_PATH):
                 metrics_df = pd.read_csv(RESULTS_PATH)
                 self.model_metrics = metrics_df.set_index('Model').to_dict('index')
+                self.metrics_response = build_metrics_response(self.model_metrics)
             
             self.is_loaded = True
         except FileNotFoundError:
             self.is_loaded = False
-            print("警告: 未找到模型文件，请先训练模型")
+            log.warning("未找到模型文件，请先训练模型")
+        return self.is_loaded
+
+    def get_model(self, model_name):
+        """获取模型管道；懒加载模式下首次使用时加载，超出容量时淘汰最久未用的模型"""
+        if not self.lazy:
+            return self.models[model_name]
+
+        model = self._cached_model(model_name)
+        if model is not None:
+            return model
+
+        # 从磁盘加载时只持有该模型的锁：同一模型只加载一次，已加载模型的请求不被阻塞
+        with self._load_locks[model_name]:
+            model = self._cached_model(model_name)
+            if model is not None:
+                return model
+            model = load_inference_pipeline(model_name)
+            key = preprocess_key(model)
+            with self._lock:
+                self.models[model_name] = model
+                self._preprocess_keys[model_name] = key
+                while len(self.models) > self.cache_size:
+                    evicted, _ = self.models.popitem(last=False)
+                    log.info("模型缓存已满，卸载 %s", evicted)
+            log.info("已加载模型 %s", model_name)
+            return model
+
+    def validate_model(self, model_name, records):
+        """
+        用 records 检查一个模型能否给出有限的预测值，失败时抛出 RuntimeError；热更新前的冒烟测试使用
+        懒加载模式下缓存中没有的模型单独从磁盘加载，检查完即释放，不进入（也不打乱）模型缓存
+        """
+        try:
+            model = self._cached_model(model_name) if self.lazy else self.models[model_name]
+            if model is None:
+                model = load_inference_pipeline(model_name)
+            X = np.array([[float(record[key]) for key in FEATURE_COLUMNS] for record in records], dtype=np.float64)
+            preds = pipeline_predict(model, X)
+        except Exception as e:
+            raise RuntimeError(f"{model_name} 冒烟测试失败: {e}") from e
+        if not np.isfinite(preds).all():
+            raise RuntimeError(f"{model_name} 冒烟测试失败: 预测值包含 NaN/inf")
+
+    def _cached_model(self, model_name):
+        with self._lock:
+            model = self.models.get(model_name)
+            if model is not None:
+                self.models.move_to_end(model_name)
+            return model
 
     def predict(self, input_data, model_name=None):
         if not self.is_loaded:
             return {"error": "模型未加载"}
         
         model_name = model_name or self.model_name
-        if model_name not in self.models:
-            return {"error": f"无效模型名称，可选: {list(self.models.keys())}"}
+        if model_name not in MODEL_NAMES:
+            return {"error": f"无效模型名称，可选: {MODEL_NAMES}"}
         
+        if log.sampled():
+            log.debug("模型: %s 输入数据: %s", model_name, input_data)
+
+        cache_key = self._cache_key(model_name, input_data)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         try:
-            input_df = pd.DataFrame([{
-                '2022 Root length (cm)': input_data['root_length'],
-                '2022 Root yields (kg/mu)': input_data['yield'],
-                '2022 Calycosin-7-glucoside (C7G) content (%)': input_data['c7g_content']
-            }])
+            with stage("build_input"):
+                X = self._row_buffer()
+                for j, key in enumerate(FEATURE_COLUMNS):
+                    X[0, j] = input_data[key]
             
-            model = self.models[model_name]
-            pred = float(model.predict(input_df)[0])
+            model = self.get_model(model_name)
+            pred = float(pipeline_predict(model, X)[0])
             
             # 获取该模型的测试集R²均值
             test_r2 = self.model_metrics.get(model_name, {}).get('Test_R2_mean', 'N/A')
             
-            return {
+            result = {
                 "model_used": model_name,
                 "seed_id": int(round(pred)),
                 "r2_score": test_r2  # 直接返回测试集R²值
@@ -160,16 +494,175 @@ class AstragalusPredictor:
         except Exception as e:
             return {"error": f"预测失败: {str(e)}"}
 
+        self.cache.put(cache_key, result)
+        return result
+
+    def predict_batch(self, records, model_name=None):
+        """批量预测：所有合法记录只调用一次 Pipeline.predict，逐行返回结果或错误"""
+        if not self.is_loaded:
+            return {"error": "模型未加载"}
+
+        model_name = model_name or self.model_name
+        if model_name not in MODEL_NAMES:
+            return {"error": f"无效模型名称，可选: {MODEL_NAMES}"}
+
+        results = [None] * len(records)
+        rows, row_indices, row_keys = [], [], []
+        error_count = 0
+        for i, record in enumerate(records):
+            try:
+                row = tuple(float(record[key]) for key in FEATURE_COLUMNS)
+            except KeyError as e:
+                results[i] = {"index": i, "error": f"缺少字段: {e.args[0]}"}
+                error_count += 1
+                continue
+            except (TypeError, ValueError) as e:
+                results[i] = {"index": i, "error": f"输入数据错误: {str(e)}"}
+                error_count += 1
+                continue
+            # float() 接受 "nan"/"inf" 和溢出的 1e400，这些值会使整批预处理失败，按行拒绝
+            bad = [key for key, value in zip(FEATURE_COLUMNS, row) if not math.isfinite(value)]
+            if bad:
+                results[i] = {"index": i, "error": f"输入数据错误: 字段 {bad} 不是有限数值"}
+                error_count += 1
+                continue
+
+            # 命中缓存的行不再参与模型计算
+            cache_key = self.cache.make_key(model_name, row)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                results[i] = {"index": i, **cached}
+                continue
+            rows.append(row)
+            row_indices.append(i)
+            row_keys.append(cache_key)
+
+        if log.sampled():
+            log.debug("模型: %s 批量预测 %d 条，其中无效 %d 条，需计算 %d 条，首条输入: %s",
+                      model_name, len(records), error_count, len(rows), records[:1])
+
+        if rows:
+            try:
+                with stage("build_input"):
+                    X = np.array(rows, dtype=np.float64)
+                preds = pipeline_predict(self.get_model(model_name), X)
+            except Exception as e:
+                return {"error": f"预测失败: {str(e)}"}
+
+            test_r2 = self.model_metrics.get(model_name, {}).get('Test_R2_mean', 'N/A')
+            for i, cache_key, pred in zip(row_indices, row_keys, preds):
+                result = {
+                    "model_used": model_name,
+                    "seed_id": int(round(float(pred))),
+                    "r2_score": test_r2
+                }
+                self.cache.put(cache_key, result)
+                results[i] = {"index": i, **result}
+
+        return {
+            "model_used": model_name,
+            "count": len(records),
+            "error_count": error_count,
+            "results": results
+        }
+
+    def predict_ensemble(self, input_data):
+        """
+        集成预测：四个模型对同一输入各预测一次，返回均值、标准差、最小/最大值区间和各模型的预测
+        预处理相同的模型共享一次变换结果，四个模型只各自执行最后的估计器
+        懒加载模式下需要 ASTRAGALUS_MODEL_CACHE_SIZE >= 4，否则每次集成预测都会淘汰并重新加载模型，此时直接返回错误
+        """
+        if not self.is_loaded:
+            return {"error": "模型未加载"}
+        if not self.ensemble_available:
+            return {"error": f"懒加载模式下集成预测需要 ASTRAGALUS_MODEL_CACHE_SIZE >= {len(MODEL_NAMES)}"}
+
+        cache_key = self._cache_key("ensemble", input_data)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            with stage("build_input"):
+                X = self._row_buffer()
+                for j, key in enumerate(FEATURE_COLUMNS):
+                    X[0, j] = input_data[key]
+            preds = self.ensemble_predictions(X)[0]
+        except Exception as e:
+            return {"error": f"预测失败: {str(e)}"}
+
+        mean = float(preds.mean())
+        result = {
+            "model_used": "ensemble",
+            "seed_id": int(round(mean)),
+            "mean": round(mean, 4),
+            "std": round(float(preds.std()), 4),
+            "interval": [round(float(preds.min()), 4), round(float(preds.max()), 4)],
+            "members": {
+                name: {
+                    "prediction": round(float(pred), 4),
+                    "seed_id": int(round(float(pred))),
+                    "r2_score": self.model_metrics.get(name, {}).get('Test_R2_mean', 'N/A')
+                }
+                for name, pred in zip(MODEL_NAMES, preds)
+            }
+        }
+        self.cache.put(cache_key, result)
+        return result
+
+    @property
+    def ensemble_available(self):
+        """四个模型能否同时留在缓存中"""
+        return not self.lazy or self.cache_size >= len(MODEL_NAMES)
+
+    def ensemble_predictions(self, X):
+        """返回 (样本数, 模型数) 的预测矩阵，列顺序同 MODEL_NAMES"""
+        preds = np.empty((len(X), len(MODEL_NAMES)), dtype=np.float64)
+        transformed = {}  # 预处理哈希 -> 变换结果
+        for j, name in enumerate(MODEL_NAMES):
+            model = self.get_model(name)
+            key = self._preprocess_keys[name]
+            if key not in transformed:
+                with stage("transform"):
+                    transformed[key] = pipeline_transform(model, X)
+            with stage("estimator"):
+                preds[:, j] = model.steps[-1][1].predict(transformed[key])
+        return preds
+
+    def _row_buffer(self):
+        """当前线程复用的 (1, 特征数) 输入数组；管道各步骤都返回新数组，不会持有缓冲区"""
+        buffer = getattr(self._local, "row", None)
+        if buffer is None:
+            buffer = self._local.row = np.empty((1, len(FEATURE_COLUMNS)), dtype=np.float64)
+        return buffer
+
+    def _cache_key(self, model_name, input_data):
+        """按请求字段顺序生成缓存键，输入不合法时返回 None（不使用缓存）"""
+        try:
+            return self.cache.make_key(model_name, [input_data[key] for key in FEATURE_COLUMNS])
+        except (KeyError, TypeError):
+            return None
+
 if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('--train', action='store_true', help="训练并保存所有模型")
+    parser.add_argument('--n-jobs', type=int, help="训练使用的总核数，默认读取 TRAIN_N_JOBS")
     parser.add_argument('--predict', nargs=4, metavar=('MODEL', 'ROOT_LEN', 'YIELD', 'C7G'), 
                        help="指定模型预测，参数: 模型名 根长 产量 C7G含量")
+    parser.add_argument('--convert', choices=['pickle', 'native'],
+                       help="把已保存的模型转换为指定格式（native: joblib 内存映射 + XGBoost UBJ）")
+    parser.add_argument('--update', metavar='NEW_DATA',
+                       help="用新一季的数据增量更新已保存的模型")
+    parser.add_argument('--full-retrain', action='store_true',
+                       help="与 --update 一起使用时改为在完整数据上重新训练")
     args = parser.parse_args()
+    configure_logging()
 
     if args.train:
-        train_and_compare_models()
+        train_and_compare_models(n_jobs=args.n_jobs)
+    elif args.update:
+        update_models(args.update, full_retrain=args.full_retrain, n_jobs=args.n_jobs)
     elif args.predict:
         model_name, root_len, yield_, c7g = args.predict
         predictor = AstragalusPredictor()
@@ -179,7 +672,13 @@ if __name__ == '__main__':
             'c7g_content': float(c7g)
         }, model_name=model_name)
         print("预测结果:", result)
+    elif args.convert:
+        for name in MODEL_NAMES:
+            paths = save_artifact(load_pipeline(name), model_base_path(name), fmt=args.convert)
+            print(f"{name} 已转换为 {args.convert} 格式: {', '.join(paths)}")
     else:
         print("请指定运行模式：")
         print("  --train              训练所有模型")
         print("  --predict MODEL_NAME ROOT_LEN YIELD C7G  使用指定模型预测")
+        print("  --convert FORMAT     转换已保存模型的格式 (pickle/native)")
+        print("  --update NEW_DATA    用新数据增量更新模型（加 --full-retrain 则完整重新训练）")
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+benchmark.py
+两个预测服务的性能基准测试
+覆盖：
+1. 进程内单条预测延迟（每个模型）
+2. 不同批量大小下的批量吞吐
+3. 每个模型文件的加载耗时与常驻内存增量（每个文件在独立子进程中加载）
+4. 通过 Flask test client 的端到端 HTTP 吞吐
+结果写为 JSON；指定 --baseline 时与上一次结果比较，超出容差视为性能回退并以非零状态退出
+
+用法：
+python benchmark.py --output bench.json
+python benchmark.py --output new.json --baseline bench.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import sys
+import time
+
+import numpy as np
+
+from astragalus_predictor import AstragalusPredictor, FEATURE_COLUMNS, MODEL_NAMES, DATA_PATH
+from climate_seed_model import ClimateSeedModel
+from dataset_loader import load_dataset
+from memory_stats import read_memory_usage
+from prediction_cache import PredictionCache
+
+BATCH_SIZES = [1, 10, 100, 1000]
+
+
+def _percentiles(samples_ms):
+    samples = np.asarray(samples_ms)
+    return {
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "mean_ms": float(samples.mean())
+    }
+
+
+def time_calls(fn, args_list, repeat, warmup=5):
+    """依次调用 fn(*args)，返回每次调用的耗时（毫秒）"""
+    for i in range(warmup):
+        fn(*args_list[i % len(args_list)])
+    samples = []
+    for i in range(repeat):
+        args = args_list[i % len(args_list)]
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def load_sample_records():
+    """从训练数据中取真实样本作为输入"""
+    all_bio = [f"bio{i}" for i in range(1, 20)]
+    data = load_dataset(DATA_PATH, columns=list(FEATURE_COLUMNS.values()) + all_bio).dropna()
+    astragalus_records = [
+        {key: float(row[column]) for key, column in FEATURE_COLUMNS.items()}
+        for _, row in data.iterrows()
+    ]
+    climate_records = [{bio: float(row[bio]) for bio in all_bio} for _, row in data.iterrows()]
+    return astragalus_records, climate_records
+
+
+def _repeat_to(records, size):
+    return [records[i % len(records)] for i in range(size)]
+
+
+def bench_in_process(results, astragalus, climate, astragalus_records, climate_records, repeat):
+    """单条延迟与批量吞吐"""
+    for model_name in MODEL_NAMES:
+        samples = time_calls(lambda record: astragalus.predict(record, model_name=model_name),
+                             [(record,) for record in astragalus_records], repeat)
+        for key, value in _percentiles(samples).items():
+            results[f"latency.astragalus.{model_name}.{key}"] = {"value": value, "unit": "ms", "better": "lower"}
+
+    samples = time_calls(climate.predict, [(record,) for record in climate_records], repeat)
+    for key, value in _percentiles(samples).items():
+        results[f"latency.climate.{key}"] = {"value": value, "unit": "ms", "better": "lower"}
+
+    for size in BATCH_SIZES:
+        batch_repeat = max(3, repeat // size)
+        astragalus_batch = _repeat_to(astragalus_records, size)
+        for model_name in MODEL_NAMES:
+            samples = time_calls(lambda: astragalus.predict_batch(astragalus_batch, model_name=model_name),
+                                 [()], batch_repeat, warmup=1)
+            results[f"throughput.astragalus.{model_name}.batch{size}"] = {
+                "value": size / (np.median(samples) / 1000), "unit": "rows/s", "better": "higher"}
+
+        climate_batch = _repeat_to(climate_records, size)
+        samples = time_calls(lambda: climate.predict_batch(climate_batch), [()], batch_repeat, warmup=1)
+        results[f"throughput.climate.batch{size}"] = {
+            "value": size / (np.median(samples) / 1000), "unit": "rows/s", "better": "higher"}
+
+
+def _load_artifact_in_child(name, queue):
+    """在干净的子进程中加载单个模型文件，报告耗时和 RSS 增量"""
+    import astragalus_predictor
+    import climate_seed_model
+    from flat_forest import FlatForest
+    from model_artifacts import load_artifact, MMAP_MODE
+
+    loaders = {f"astragalus.{model}": (lambda model=model: astragalus_predictor.load_pipeline(model))
+               for model in MODEL_NAMES}
+    loaders["climate.model"] = lambda: load_artifact(climate_seed_model.MODEL_BASE)
+    loaders["climate.selector"] = lambda: load_artifact(climate_seed_model.SELECTOR_BASE)
+    loaders["climate.flat_forest"] = lambda: FlatForest.load(climate_seed_model.FLAT_FOREST_DIR, mmap_mode=MMAP_MODE)
+
+    before = read_memory_usage() or {}
+    start = time.perf_counter()
+    obj = loaders[name]()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    after = read_memory_usage() or {}
+    queue.put((elapsed_ms, after.get("rss", 0) - before.get("rss", 0)))
+    del obj
+
+
+def bench_artifact_loading(results):
+    names = [f"astragalus.{model}" for model in MODEL_NAMES]
+    names += ["climate.model", "climate.selector", "climate.flat_forest"]
+    context = multiprocessing.get_context("spawn")  # 子进程不继承父进程已加载的模块和模型
+    for name in names:
+        queue = context.Queue()
+        process = context.Process(target=_load_artifact_in_child, args=(name, queue))
+        process.start()
+        try:
+            elapsed_ms, rss_kb = queue.get(timeout=300)
+        except Exception as e:
+            print(f"加载 {name} 失败: {e}")
+            process.join()
+            continue
+        process.join()
+        results[f"load.{name}.time_ms"] = {"value": elapsed_ms, "unit": "ms", "better": "lower"}
+        results[f"load.{name}.rss_kb"] = {"value": rss_kb, "unit": "kB", "better": "lower"}
+
+
+def bench_http(results, astragalus_records, climate_records, repeat):
+    """通过 Flask test client 测量端到端吞吐（含 JSON 解析、路由和序列化）"""
+    import app as app_module
+
+    # 关闭结果缓存，测量的是模型计算而不是缓存命中
+    app_module.astragalus_slot.get().cache = PredictionCache(maxsize=0)
+    app_module.climate_slot.get().cache = PredictionCache(maxsize=0)
+    client = app_module.app.test_client()
+
+    cases = {
+        "astragalus_predict": ("/api/astragalus/predict", [{**record, "model_name": "XGBoost"}
+                                                           for record in astragalus_records]),
+        "climate_predict": ("/api/climate/predict", climate_records),
+        "astragalus_batch100": ("/api/astragalus/predict/batch",
+                                [{"model_name": "XGBoost", "records": _repeat_to(astragalus_records, 100)}]),
+        "climate_batch100": ("/api/climate/predict/batch",
+                             [{"records": _repeat_to(climate_records, 100)}]),
+        "model_metrics": ("/api/astragalus/model-metrics", None),
+    }
+    for name, (url, payloads) in cases.items():
+        if payloads is None:
+            call = lambda: client.get(url)
+            args_list = [()]
+        else:
+            call = lambda payload: client.post(url, json=payload)
+            args_list = [(payload,) for payload in payloads]
+
+        start = time.perf_counter()
+        samples = time_calls(call, args_list, repeat)
+        total_s = time.perf_counter() - start
+        stats = _percentiles(samples)
+        results[f"http.{name}.p50_ms"] = {"value": stats["p50_ms"], "unit": "ms", "better": "lower"}
+        results[f"http.{name}.p95_ms"] = {"value": stats["p95_ms"], "unit": "ms", "better": "lower"}
+        results[f"http.{name}.requests_per_s"] = {"value": repeat / total_s, "unit": "req/s", "better": "higher"}
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """返回回退的指标列表"""
+    regressions = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None or not previous["value"]:
+            continue
+        change = (current["value"] - previous["value"]) / abs(previous["value"])
+        regressed = change > tolerance if current["better"] == "lower" else change < -tolerance
+        flag = "回退" if regressed else ""
+        print(f"{name:55s} {previous['value']:12.3f} -> {current['value']:12.3f} {current['unit']:6s} "
+              f"{change:+7.1%} {flag}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def environment_info():
+    import pandas
+    import sklearn
+
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pandas.__version__,
+        "scikit-learn": sklearn.__version__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='预测服务性能基准测试')
+    parser.add_argument('--output', default='benchmark_results.json', help="结果 JSON 文件")
+    parser.add_argument('--baseline', help="用于比较的历史结果 JSON 文件")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="允许的相对变化（默认 0.2 即 20%%）")
+    parser.add_argument('--repeat', type=int, default=200, help="单条延迟测试的调用次数")
+    parser.add_argument('--skip', nargs='*', default=[], choices=['inprocess', 'load', 'http'],
+                        help="跳过的测试项")
+    args = parser.parse_args()
+
+    astragalus_records, climate_records = load_sample_records()
+    results = {}
+
+    if 'inprocess' not in args.skip:
+        print("=== 进程内延迟与批量吞吐 ===")
+        astragalus = AstragalusPredictor(lazy=False)
+        climate = ClimateSeedModel()
+        if not astragalus.is_loaded or not climate._load_models():
+            print("错误: 模型未加载，请先训练模型")
+            return 1
+        astragalus.cache = PredictionCache(maxsize=0)
+        climate.cache = PredictionCache(maxsize=0)
+        bench_in_process(results, astragalus, climate, astragalus_records, climate_records, args.repeat)
+
+    if 'load' not in args.skip:
+        print("=== 模型文件加载耗时与内存 ===")
+        bench_artifact_loading(results)
+
+    if 'http' not in args.skip:
+        print("=== HTTP 端到端吞吐 ===")
+        bench_http(results, astragalus_records, climate_records, args.repeat)
+
+    with open(args.output, 'w') as f:
+        json.dump({"environment": environment_info(), "results": results}, f, indent=2, ensure_ascii=False)
+    print(f"结果已保存至 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n性能回退 {len(regressions)} 项: {regressions}")
+            return 1
+        print("\n未发现性能回退")
+    else:
+        for name, metric in sorted(results.items()):
+            print(f"{name:55s} {metric['value']:12.3f} {metric['unit']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+bioclim.py
+由逐月最低气温、最高气温和降水量计算 19 个生物气候变量（bio1–bio19）
+计算方式与 WorldClim / R dismo::biovars 一致：
+- 月均温 tavg = (tmin + tmax) / 2
+- 标准差使用样本标准差（ddof=1），bio4 = 100 × sd(tavg)
+- bio15（降水季节性）= 100 × sd(prec + 1) / mean(prec + 1)
+- “季度”为连续 3 个月的滑动窗口，跨年首尾相接（如 11、12、1 月）；并列时取第一个
+所有计算都在 (..., 12) 的数组上向量化完成，站点 (N, 12) 和栅格 (行, 列, 12) 通用
+
+用法：
+站点 CSV（列 tmin1..tmin12、tmax1..tmax12、prec1..prec12，其他列原样保留）：
+python bioclim.py --csv monthly.csv --output bio.csv
+栅格（目录中 grid.json + tmin.npy/tmax.npy/prec.npy，形状 (12, 行, 列)），输出为 climate_grid 图层目录：
+python bioclim.py --raster monthly_dir --output layers_dir
+"""
+
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+BIO_NAMES = [f"bio{i}" for i in range(1, 20)]
+MONTHLY_VARIABLES = ("tmin", "tmax", "prec")
+GRID_META = "grid.json"  # bio 图层目录的元数据文件，格式见 climate_grid
+CHUNK_ROWS = int(os.environ.get("BIOCLIM_CHUNK_ROWS", "100000"))
+
+
+def read_grid_meta(layer_dir):
+    with open(os.path.join(layer_dir, GRID_META)) as f:
+        return json.load(f)
+
+
+def open_bio_layers(layer_dir, names=None, mmap_mode="r"):
+    """返回 (grid.json 内容, {图层名: 二维数组})；图层形状必须与 grid.json 一致"""
+    meta = read_grid_meta(layer_dir)
+    shape = (meta["height"], meta["width"])
+    layers = {}
+    for name in names or BIO_NAMES:
+        layer = np.load(os.path.join(layer_dir, f"{name}.npy"), mmap_mode=mmap_mode)
+        if layer.shape != shape:
+            raise ValueError(f"图层 {name} 的形状 {layer.shape} 与 grid.json 中的 {shape} 不一致")
+        layers[name] = layer
+    return meta, layers
+
+
+def monthly_columns(variable):
+    return [f"{variable}{month}" for month in range(1, 13)]
+
+
+def _quarter_sums(x):
+    """每个月开始的连续 3 个月之和（首尾相接），形状与 x 相同"""
+    return x + np.roll(x, -1, axis=-1) + np.roll(x, -2, axis=-1)
+
+
+def _take(x, index):
+    """按最后一维的下标取值"""
+    return np.take_along_axis(x, index[..., np.newaxis], axis=-1)[..., 0]
+
+
+def compute_bioclim(tmin, tmax, prec):
+    """tmin/tmax/prec 形状为 (..., 12)，返回 (..., 19)，最后一维依次为 bio1..bio19"""
+    tmin = np.asarray(tmin, dtype=np.float64)
+    tmax = np.asarray(tmax, dtype=np.float64)
+    prec = np.asarray(prec, dtype=np.float64)
+    if not (tmin.shape == tmax.shape == prec.shape) or tmin.shape[-1] != 12:
+        raise ValueError(f"tmin/tmax/prec 的形状必须相同且最后一维为 12: {tmin.shape}, {tmax.shape}, {prec.shape}")
+
+    tavg = (tmin + tmax) / 2
+    bio = np.empty(tmin.shape[:-1] + (19,), dtype=np.float64)
+
+    bio[..., 0] = tavg.mean(axis=-1)                                # bio1 年均温
+    bio[..., 1] = (tmax - tmin).mean(axis=-1)                       # bio2 平均日较差
+    bio[..., 4] = tmax.max(axis=-1)                                 # bio5 最热月最高温
+    bio[..., 5] = tmin.min(axis=-1)                                 # bio6 最冷月最低温
+    bio[..., 6] = bio[..., 4] - bio[..., 5]                         # bio7 年较差
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bio[..., 2] = 100 * bio[..., 1] / bio[..., 6]               # bio3 等温性
+    bio[..., 3] = 100 * tavg.std(axis=-1, ddof=1)                   # bio4 温度季节性
+
+    bio[..., 11] = prec.sum(axis=-1)                                # bio12 年降水
+    bio[..., 12] = prec.max(axis=-1)                                # bio13 最湿月降水
+    bio[..., 13] = prec.min(axis=-1)                                # bio14 最干月降水
+    prec1 = prec + 1
+    bio[..., 14] = 100 * prec1.std(axis=-1, ddof=1) / prec1.mean(axis=-1)  # bio15 降水季节性
+
+    prec_quarter = _quarter_sums(prec)
+    tavg_quarter = _quarter_sums(tavg) / 3
+    wettest = prec_quarter.argmax(axis=-1)
+    driest = prec_quarter.argmin(axis=-1)
+    warmest = tavg_quarter.argmax(axis=-1)
+    coldest = tavg_quarter.argmin(axis=-1)
+
+    bio[..., 7] = _take(tavg_quarter, wettest)                      # bio8 最湿季均温
+    bio[..., 8] = _take(tavg_quarter, driest)                       # bio9 最干季均温
+    bio[..., 9] = _take(tavg_quarter, warmest)                      # bio10 最暖季均温
+    bio[..., 10] = _take(tavg_quarter, coldest)                     # bio11 最冷季均温
+    bio[..., 15] = _take(prec_quarter, wettest)                     # bio16 最湿季降水
+    bio[..., 16] = _take(prec_quarter, driest)                      # bio17 最干季降水
+    bio[..., 17] = _take(prec_quarter, warmest)                     # bio18 最暖季降水
+    bio[..., 18] = _take(prec_quarter, coldest)                     # bio19 最冷季降水
+    return bio
+
+
+def bioclim_frame(monthly):
+    """
+    monthly: 含 tmin1..tmin12、tmax1..tmax12、prec1..prec12 的 DataFrame
+    返回去掉逐月列、追加 bio1..bio19 列的 DataFrame，可直接用于 ClimateSeedModel 的训练和预测
+    """
+    arrays = [monthly[monthly_columns(variable)].to_numpy(dtype=np.float64) for variable in MONTHLY_VARIABLES]
+    bio = pd.DataFrame(compute_bioclim(*arrays), columns=BIO_NAMES, index=monthly.index)
+    monthly_cols = [column for variable in MONTHLY_VARIABLES for column in monthly_columns(variable)]
+    return pd.concat([monthly.drop(columns=monthly_cols), bio], axis=1)
+
+
+def convert_csv(src, dst, chunksize=CHUNK_ROWS):
+    """分块读取逐月数据 CSV，逐块计算并追加写入输出 CSV，返回总行数"""
+    total = 0
+    tmp_path = f"{dst}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        for i, chunk in enumerate(pd.read_csv(src, encoding="utf-8", chunksize=chunksize)):
+            bioclim_frame(chunk).to_csv(f, index=False, header=(i == 0))
+            total += len(chunk)
+            print(f"已处理 {total} 行")
+    os.replace(tmp_path, dst)
+    return total
+
+
+def convert_raster(src_dir, dst_dir, tile_rows=None):
+    """
+    src_dir: grid.json + tmin.npy/tmax.npy/prec.npy（形状 (12, 行, 列)）
+    dst_dir: 写出 climate_grid 格式的图层目录（grid.json + bio1.npy..bio19.npy，float32）
+    按行分块计算，内存占用与分块大小成正比
+    """
+    monthly = {variable: np.load(os.path.join(src_dir, f"{variable}.npy"), mmap_mode="r")
+               for variable in MONTHLY_VARIABLES}
+    shape = monthly["tmin"].shape
+    if shape[0] != 12 or any(array.shape != shape for array in monthly.values()):
+        raise ValueError(f"逐月栅格形状必须一致且为 (12, 行, 列): {[a.shape for a in monthly.values()]}")
+    height, width = shape[1:]
+
+    nodata = read_grid_meta(src_dir).get("nodata")
+
+    os.makedirs(dst_dir, exist_ok=True)
+    shutil.copyfile(os.path.join(src_dir, GRID_META), os.path.join(dst_dir, GRID_META))
+    outputs = [np.lib.format.open_memmap(os.path.join(dst_dir, f"{name}.npy"), mode="w+",
+                                         dtype=np.float32, shape=(height, width))
+               for name in BIO_NAMES]
+
+    tile_rows = tile_rows or max(1, CHUNK_ROWS // width)
+    for start in range(0, height, tile_rows):
+        stop = min(start + tile_rows, height)
+        # (12, 行, 列) -> (行, 列, 12)
+        arrays = [np.moveaxis(np.asarray(monthly[variable][:, start:stop]), 0, -1)
+                  for variable in MONTHLY_VARIABLES]
+        bio = compute_bioclim(*arrays)
+        if nodata is not None:
+            # 任一月份为无数据值的像元输出 NaN（climate_grid/climate_raster 均视 NaN 为无数据）
+            bio[np.any([(array == nodata).any(axis=-1) for array in arrays], axis=0)] = np.nan
+        for j, output in enumerate(outputs):
+            output[start:stop] = bio[..., j]
+        print(f"已处理 {stop}/{height} 行")
+
+    for output in outputs:
+        output.flush()
+    return height * width
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='由逐月气温和降水计算 bio1–bio19')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--csv', help="逐月数据 CSV（tmin1..12, tmax1..12, prec1..12）")
+    source.add_argument('--raster', help="逐月栅格目录（grid.json + tmin.npy/tmax.npy/prec.npy）")
+    parser.add_argument('--output', required=True, help="输出 CSV（--csv）或图层目录（--raster）")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help="每块行数（CSV）")
+    args = parser.parse_args()
+
+    if args.csv:
+        n = convert_csv(args.csv, args.output, chunksize=args.chunk_rows)
+        print(f"完成：{n} 个站点，结果保存至 {args.output}")
+    else:
+        n = convert_raster(args.raster, args.output)
+        print(f"完成：{n} 个像元，图层保存至 {args.output}")
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+climate_grid.py
+整片气候栅格的种子来源适宜性制图
+功能：
+1. 读取 bio 图层目录（grid.json + bio1.npy ... bio19.npy，每个图层为 (行, 列) 的二维数组），以内存映射方式打开
+2. 按行切分为若干分块，每块只读取被选中的特征图层，用 sklearn 随机森林的 predict_proba 整块推理
+   （分块有数万像元，扁平化森林只适合小批量，见 flat_forest）
+3. 分块在进程池中并行计算，结果直接写入内存映射的输出栅格（seed_id.npy、confidence.npy），
+   内存占用与分块大小成正比，与整幅栅格大小无关
+
+图层目录 grid.json：
+  {"height": 行数, "width": 列数, "lon_min": 左边界经度, "lat_max": 上边界纬度,
+   "cell_size": 像元大小（度）, "nodata": 无数据值（可省略，NaN 总是视为无数据）}
+  第 0 行在北，像元 (r, c) 的中心为 (lat_max - (r + 0.5) * cell_size, lon_min + (c + 0.5) * cell_size)
+输出目录：grid.json（复制自输入）、seed_id.npy（int32，无数据为 -1）、confidence.npy（float32，无数据为 NaN）
+
+用法：python climate_grid.py --layers 图层目录 --output 输出目录 [--n-jobs 4] [--tile-cells 65536]
+"""
+
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from bioclim import BIO_NAMES, GRID_META, read_grid_meta, open_bio_layers
+from climate_seed_model import ClimateSeedModel, MODEL_BASE
+from model_artifacts import load_artifact
+
+TILE_CELLS = int(os.environ.get("CLIMATE_GRID_TILE_CELLS", "65536"))  # 每个分块的像元数上限
+GRID_N_JOBS = int(os.environ.get("CLIMATE_GRID_N_JOBS", os.cpu_count() or 1))
+NODATA_SEED = -1
+
+
+def tile_rows(meta, tile_cells=None):
+    """按像元数上限把栅格切成连续的行区间"""
+    rows_per_tile = max(1, (tile_cells or TILE_CELLS) // meta["width"])
+    return [(start, min(start + rows_per_tile, meta["height"]))
+            for start in range(0, meta["height"], rows_per_tile)]
+
+
+def score_tile(model, layers, feature_names, nodata, start, stop):
+    """用 sklearn 随机森林 model 计算一个分块，返回 (seed_id, confidence)，形状均为 (stop - start, 列数)"""
+    X = np.stack([np.asarray(layers[name][start:stop], dtype=np.float64) for name in feature_names], axis=-1)
+    shape = X.shape[:2]
+    X = X.reshape(-1, len(feature_names))
+
+    valid = ~np.isnan(X).any(axis=1)
+    if nodata is not None:
+        valid &= ~(X == nodata).any(axis=1)
+
+    seed_id = np.full(X.shape[0], NODATA_SEED, dtype=np.int32)
+    confidence = np.full(X.shape[0], np.nan, dtype=np.float32)
+    if valid.any():
+        proba = model.predict_proba(X[valid])
+        best = proba.argmax(axis=1)
+        seed_id[valid] = model.classes_[best]
+        confidence[valid] = proba[np.arange(len(best)), best]
+    return seed_id.reshape(shape), confidence.reshape(shape)
+
+
+_worker = None  # 子进程中的模型、图层和输出栅格，由进程池 initializer 设置
+
+
+def _init_grid_worker(layer_dir, output_dir, feature_names):
+    global _worker
+    meta, layers = open_bio_layers(layer_dir, feature_names)
+    _worker = {
+        "model": load_artifact(MODEL_BASE),  # native 格式时各子进程内存映射共享同一份树数组
+        "layers": layers,
+        "feature_names": feature_names,
+        "nodata": meta.get("nodata"),
+        "seed_id": np.load(os.path.join(output_dir, "seed_id.npy"), mmap_mode="r+"),
+        "confidence": np.load(os.path.join(output_dir, "confidence.npy"), mmap_mode="r+"),
+    }
+
+
+def _score_tile_into_output(start, stop):
+    """在子进程中计算一个分块并写入输出栅格，返回有效像元数"""
+    seed_id, confidence = score_tile(_worker["model"], _worker["layers"], _worker["feature_names"],
+                                     _worker["nodata"], start, stop)
+    _worker["seed_id"][start:stop] = seed_id
+    _worker["confidence"][start:stop] = confidence
+    _worker["seed_id"].flush()
+    _worker["confidence"].flush()
+    return int((seed_id != NODATA_SEED).sum())
+
+
+def score_grid(layer_dir, output_dir, n_jobs=None, tile_cells=None):
+    """对整幅栅格打分，返回统计信息"""
+    model = ClimateSeedModel()
+    if not model._load_models():
+        raise RuntimeError("气象预测模型未加载，请先训练模型")
+
+    meta = read_grid_meta(layer_dir)
+    feature_names = model.feature_names  # 只需要被选择器选中的图层
+    open_bio_layers(layer_dir, feature_names)  # 提前检查图层是否齐全、形状是否一致
+
+    os.makedirs(output_dir, exist_ok=True)
+    shape = (meta["height"], meta["width"])
+    np.lib.format.open_memmap(os.path.join(output_dir, "seed_id.npy"), mode="w+", dtype=np.int32, shape=shape).flush()
+    np.lib.format.open_memmap(os.path.join(output_dir, "confidence.npy"), mode="w+", dtype=np.float32,
+                              shape=shape).flush()
+    shutil.copyfile(os.path.join(layer_dir, GRID_META), os.path.join(output_dir, GRID_META))
+
+    tiles = tile_rows(meta, tile_cells)
+    n_jobs = max(1, min(n_jobs or GRID_N_JOBS, len(tiles)))
+    print(f"栅格 {shape[0]}×{shape[1]}，分块 {len(tiles)} 个，并行进程 {n_jobs}，使用图层: {feature_names}")
+
+    started = time.time()
+    scored = 0
+    if n_jobs == 1:
+        _init_grid_worker(layer_dir, output_dir, feature_names)
+        for i, (start, stop) in enumerate(tiles, 1):
+            scored += _score_tile_into_output(start, stop)
+            print(f"已完成 {i}/{len(tiles)} 个分块")
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_grid_worker,
+                                 initargs=(layer_dir, output_dir, feature_names)) as executor:
+            futures = [executor.submit(_score_tile_into_output, start, stop) for start, stop in tiles]
+            for i, future in enumerate(as_completed(futures), 1):
+                scored += future.result()
+                if i % max(1, len(tiles) // 20) == 0 or i == len(tiles):
+                    print(f"已完成 {i}/{len(tiles)} 个分块")
+
+    elapsed = time.time() - started
+    stats = {
+        "cells": shape[0] * shape[1],
+        "scored": scored,
+        "tiles": len(tiles),
+        "seconds": round(elapsed, 2),
+    }
+    print(f"完成：有效像元 {scored}/{stats['cells']}，耗时 {elapsed:.1f}s，结果保存至 {output_dir}")
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='气候栅格种子来源制图')
+    parser.add_argument('--layers', required=True, help="bio 图层目录（grid.json + bio*.npy）")
+    parser.add_argument('--output', required=True, help="输出目录")
+    parser.add_argument('--n-jobs', type=int, default=None, help="并行进程数，默认 CLIMATE_GRID_N_JOBS 或 CPU 核数")
+    parser.add_argument('--tile-cells', type=int, default=None, help="每个分块的像元数上限，默认 CLIMATE_GRID_TILE_CELLS")
+    args = parser.parse_args()
+    score_grid(args.layers, args.output, n_jobs=args.n_jobs, tile_cells=args.tile_cells)
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+climate_lattice.py
+经纬度格点上的预计算预测结果 + 球面 BallTree 空间索引
+功能：
+1. 预计算：按步长取气候栅格（climate_raster 的图层目录）的像元中心作为格点，分块用气候模型打分，
+   保存 lat/lon/seed_id/confidence 数组和 BallTree（haversine 距离）
+2. 查询：最近邻 / 半径范围查询只走索引（O(log n)），请求时不调用模型
+3. 结果目录以 (气候模型文件指纹, 步长, 栅格文件指纹) 的哈希命名；任一变化后在后台重建，重建完成前继续使用旧结果
+4. 多个进程（gunicorn worker）共用结果目录，构建时持有文件锁，只有一个进程计算，其他进程等结果写入后直接加载；
+   加载时持有目录共享锁，清理旧结果时持有排他锁，并保留上一代结果（KEEP_GENERATIONS），尚未切换的进程仍可读取
+
+目录结构：<CLIMATE_LATTICE_DIR>/<索引键>/{meta.json, lat.npy, lon.npy, seed_id.npy, confidence.npy, tree.joblib}
+配置（环境变量）：CLIMATE_LATTICE_DIR（未设置时不启用，另需 CLIMATE_RASTER_DIR）、CLIMATE_LATTICE_STRIDE（每隔几个像元取一个格点）
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+import joblib
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from bioclim import BIO_NAMES
+from model_reloader import file_fingerprint
+from prediction_logging import get_logger
+
+CLIMATE_LATTICE_DIR = os.environ.get("CLIMATE_LATTICE_DIR")
+LATTICE_STRIDE = int(os.environ.get("CLIMATE_LATTICE_STRIDE", "1"))
+LATTICE_CHUNK_CELLS = int(os.environ.get("CLIMATE_LATTICE_CHUNK_CELLS", "65536"))
+EARTH_RADIUS_KM = 6371.0088
+ARRAY_NAMES = ["lat", "lon", "seed_id", "confidence"]
+ROOT_LOCK = ".lattice.lock"  # 加载（共享）与清理旧结果（排他）之间的目录锁
+KEEP_GENERATIONS = 2  # 当前结果 + 上一代
+RADIUS_QUERY_MAX_LIMIT = 10000  # 半径查询单次最多返回的格点数
+
+log = get_logger("lattice")
+
+
+def lattice_key(model_fingerprint, raster_fingerprint, stride):
+    """
+    结果目录名：模型文件指纹、栅格图层文件指纹（均为 model_reloader.file_fingerprint 的结果）和步长的哈希，
+    三者任一变化都对应新的目录，不会误用旧结果
+    """
+    key = (model_fingerprint, raster_fingerprint, max(1, stride or LATTICE_STRIDE))
+    return hashlib.sha256(repr(key).encode("utf-8")).hexdigest()[:16]
+
+
+def score_lattice(predictor, raster, stride=None):
+    """对栅格像元中心（按步长抽取）打分，返回 {lat, lon, seed_id, confidence}，跳过无数据像元"""
+    stride = max(1, stride or LATTICE_STRIDE)
+    rows = np.arange(0, raster.height, stride)
+    cols = np.arange(0, raster.width, stride)
+    layers = [raster.layers[BIO_NAMES.index(name)] for name in predictor.feature_names]  # 只读取被选中的特征图层
+    lons = raster.lon_min + (cols + 0.5) * raster.cell_size
+
+    parts = {name: [] for name in ARRAY_NAMES}
+    rows_per_chunk = max(1, LATTICE_CHUNK_CELLS // len(cols))
+    for start in range(0, len(rows), rows_per_chunk):
+        chunk_rows = rows[start:start + rows_per_chunk]
+        X = np.stack([np.asarray(layer[chunk_rows][:, cols], dtype=np.float64) for layer in layers], axis=-1)
+        X = X.reshape(-1, len(layers))
+        valid = ~np.isnan(X).any(axis=1)
+        if raster.nodata is not None:
+            valid &= ~(X == raster.nodata).any(axis=1)
+
+        lat_grid = np.repeat(raster.lat_max - (chunk_rows + 0.5) * raster.cell_size, len(cols))
+        lon_grid = np.tile(lons, len(chunk_rows))
+        if valid.any():
+            proba = predictor.predict_proba(X[valid])  # 按行数选择扁平化森林或 sklearn
+            best = proba.argmax(axis=1)
+            parts["seed_id"].append(predictor.classes[best].astype(np.int32))
+            parts["confidence"].append(proba[np.arange(len(best)), best].astype(np.float32))
+            parts["lat"].append(lat_grid[valid])
+            parts["lon"].append(lon_grid[valid])
+
+    if not parts["lat"]:
+        raise ValueError("栅格中没有有效像元")
+    return {name: np.concatenate(values) for name, values in parts.items()}
+
+
+def build_lattice(predictor, raster, path, fingerprint, stride=None):
+    """打分并建立索引，写入 path；先写临时目录再改名，多个进程同时构建时只保留先完成的一份"""
+    started = time.time()
+    arrays = score_lattice(predictor, raster, stride)
+    tree = BallTree(np.radians(np.column_stack([arrays["lat"], arrays["lon"]])), metric="haversine")
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name in ARRAY_NAMES:
+        np.save(os.path.join(tmp_path, f"{name}.npy"), arrays[name])
+    joblib.dump(tree, os.path.join(tmp_path, "tree.joblib"))
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({"fingerprint": fingerprint, "n_points": len(arrays["lat"]),
+                   "stride": max(1, stride or LATTICE_STRIDE), "raster": raster.layer_dir,
+                   "built_at": time.time()}, f)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)  # 其他进程已完成同一指纹的构建
+    log.info("格点索引构建完成：%d 个格点，耗时 %.1fs", len(arrays["lat"]), time.time() - started)
+    return path
+
+
+@contextmanager
+def _root_lock(root, operation):
+    with open(os.path.join(root, ROOT_LOCK), "a") as f:
+        fcntl.flock(f, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class SiteLattice:
+    """加载后的格点结果和索引，只读"""
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ARRAY_NAMES}
+        self.tree = joblib.load(os.path.join(path, "tree.joblib"))
+
+    @property
+    def fingerprint(self):
+        return self.meta["fingerprint"]
+
+    def _points(self, indices, distances):
+        return [{
+            "lat": round(float(self.arrays["lat"][i]), 6),
+            "lon": round(float(self.arrays["lon"][i]), 6),
+            "seed_id": int(self.arrays["seed_id"][i]),
+            "confidence": round(float(self.arrays["confidence"][i]), 4),
+            "distance_km": round(float(d) * EARTH_RADIUS_KM, 3)
+        } for i, d in zip(indices, distances)]
+
+    def nearest(self, lat, lon, k=1):
+        k = min(int(k), self.meta["n_points"])
+        distances, indices = self.tree.query(np.radians([[lat, lon]]), k=k)
+        return self._points(indices[0], distances[0])
+
+    def within(self, lat, lon, radius_km, limit=None):
+        """半径范围内的格点，按距离从近到远排序"""
+        indices, distances = self.tree.query_radius(np.radians([[lat, lon]]), r=radius_km / EARTH_RADIUS_KM,
+                                                    return_distance=True, sort_results=True)
+        indices, distances = indices[0], distances[0]
+        if limit is not None:
+            indices, distances = indices[:limit], distances[:limit]
+        return self._points(indices, distances)
+
+
+class LatticeIndex:
+    """当前生效的格点索引；气候模型更换后在后台重建，完成后替换"""
+
+    def __init__(self, root, raster, stride=None):
+        self.root = root
+        self.raster = raster
+        self.stride = max(1, stride or LATTICE_STRIDE)
+        # 栅格在启动时打开（内存映射），其指纹在进程生命周期内不变
+        self.raster_fingerprint = file_fingerprint([raster.layer_dir])
+        self.current = None
+        self.last_error = None
+        self.failed_fingerprint = None  # 构建失败的模型版本，不再自动重试
+        self._builder = None
+        self._lock = threading.Lock()
+
+    def ensure(self, slot, wait=False, build=True):
+        """
+        保证索引与 slot 中的气候模型一致：磁盘上已有则直接加载，否则在后台构建
+        build=False 时只加载已有结果，不启动构建线程（gunicorn preload 时 master 进程中使用）
+        """
+        predictor = slot.get()
+        if predictor is None or slot.fingerprint is None:
+            return
+        fingerprint = lattice_key(slot.fingerprint, self.raster_fingerprint, self.stride)
+        if fingerprint == self.failed_fingerprint or (self.current is not None
+                                                      and self.current.fingerprint == fingerprint):
+            return
+
+        with self._lock:
+            path = os.path.join(self.root, fingerprint)
+            if os.path.exists(os.path.join(path, "meta.json")):
+                self._activate(path)
+                return
+            if not build:
+                return
+            # fork 之后父进程的构建线程不会被复制，is_alive() 为 False，可以重新启动
+            if self._builder is not None and self._builder.is_alive():
+                builder = self._builder
+            else:
+                builder = self._builder = threading.Thread(target=self._build, args=(predictor, path, fingerprint),
+                                                           daemon=True, name="lattice-builder")
+                builder.start()
+        if wait:
+            builder.join()
+
+    def _build(self, predictor, path, fingerprint):
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(f"{path}.lock", "w") as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # 其他进程正在构建同一份结果，之后的 ensure 调用在结果写入后直接加载
+                    log.info("格点索引正由其他进程构建: %s", fingerprint)
+                    return
+                if not os.path.exists(os.path.join(path, "meta.json")):  # 等锁期间可能已由其他进程完成
+                    build_lattice(predictor, self.raster, path, fingerprint, self.stride)
+            with self._lock:
+                self._activate(path)
+        except Exception as e:
+            self.last_error = str(e)
+            self.failed_fingerprint = fingerprint
+            log.warning("格点索引构建失败: %s", e)
+
+    def _activate(self, path):
+        with _root_lock(self.root, fcntl.LOCK_SH):
+            self.current = SiteLattice(path)
+        self.last_error = None
+        self._cleanup(path)
+
+    def _cleanup(self, path):
+        """
+        删除更早的结果，保留当前和上一代；其他进程正在加载时（持有共享锁）跳过本次清理
+        已加载的进程只内存映射数组，Linux 下删除目录不影响已打开的文件
+        """
+        try:
+            with _root_lock(self.root, fcntl.LOCK_EX | fcntl.LOCK_NB):
+                generations = []
+                for name in os.listdir(self.root):
+                    old = os.path.join(self.root, name)
+                    meta_path = os.path.join(old, "meta.json")
+                    if old != path and not name.endswith(".tmp") and os.path.exists(meta_path):
+                        generations.append((os.path.getmtime(meta_path), old))
+                for _, old in sorted(generations, reverse=True)[KEEP_GENERATIONS - 1:]:
+                    shutil.rmtree(old, ignore_errors=True)
+                    if os.path.exists(f"{old}.lock"):
+                        os.remove(f"{old}.lock")
+        except BlockingIOError:
+            pass
+
+    def status(self):
+        return {
+            "ready": self.current is not None,
+            "building": self._builder is not None and self._builder.is_alive(),
+            "n_points": self.current.meta["n_points"] if self.current else 0,
+            "fingerprint": self.current.fingerprint if self.current else None,
+            "last_error": self.last_error,
+        }
+
+
+def load_default_index(raster):
+    """按 CLIMATE_LATTICE_DIR 创建索引，未配置或没有气候栅格时返回 None"""
+    if not CLIMATE_LATTICE_DIR or raster is None:
+        return None
+    return LatticeIndex(CLIMATE_LATTICE_DIR, raster)
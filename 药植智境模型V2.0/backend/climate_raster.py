@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+climate_raster.py
+按经纬度从本地气候栅格中取 bio1–bio19
+功能：
+1. 图层目录格式与 climate_grid 相同（grid.json + bio1.npy ... bio19.npy），以只读内存映射方式打开，
+   一次查询只读取涉及像元所在的几个页
+2. 支持最近邻（nearest）和双线性（bilinear）插值；双线性时无数据的角点不参与加权
+3. 最近访问的像元（19 个图层的值）按 LRU 缓存在内存中，热点位置不再读盘
+配置（环境变量）：CLIMATE_RASTER_DIR（图层目录，未设置时不启用）、CLIMATE_RASTER_CACHE_CELLS（缓存像元数）
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from bioclim import BIO_NAMES, open_bio_layers
+
+CLIMATE_RASTER_DIR = os.environ.get("CLIMATE_RASTER_DIR")
+RASTER_CACHE_CELLS = int(os.environ.get("CLIMATE_RASTER_CACHE_CELLS", "65536"))
+INTERPOLATION_METHODS = ("nearest", "bilinear")
+
+
+class ClimateRaster:
+    def __init__(self, layer_dir, cache_cells=None):
+        self.layer_dir = layer_dir
+        self.meta, layers = open_bio_layers(layer_dir, BIO_NAMES)
+        self.layers = [layers[name] for name in BIO_NAMES]
+        self.height = self.meta["height"]
+        self.width = self.meta["width"]
+        self.lon_min = float(self.meta["lon_min"])
+        self.lat_max = float(self.meta["lat_max"])
+        self.cell_size = float(self.meta["cell_size"])
+        self.nodata = self.meta.get("nodata")
+        self.cache_cells = RASTER_CACHE_CELLS if cache_cells is None else cache_cells
+        self._cache = OrderedDict()  # (行, 列) -> 19 个图层的值，无数据时为 None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _read_cells(self, rows, cols):
+        """读取若干像元的 19 个图层值，返回 (值 (k, 19), 是否有效 (k,))，无效像元的值为 NaN；先查 LRU 缓存"""
+        values = np.full((len(rows), len(self.layers)), np.nan)
+        valid = np.zeros(len(rows), dtype=bool)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(zip(rows.tolist(), cols.tolist())):
+                cell = self._cache.get(key)
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    if cell is not None:
+                        values[i] = cell
+                        valid[i] = True
+                else:
+                    missing.append(i)
+            self.misses += len(missing)
+
+        if missing:
+            missing = np.asarray(missing)
+            r, c = rows[missing], cols[missing]
+            read = np.stack([np.asarray(layer[r, c], dtype=np.float64) for layer in self.layers], axis=1)
+            ok = ~np.isnan(read).any(axis=1)
+            if self.nodata is not None:
+                ok &= ~(read == self.nodata).any(axis=1)
+            values[missing] = read
+            values[missing[~ok]] = np.nan  # 不把无数据值（如 -9999）当作气候值返回
+            valid[missing] = ok
+            if self.cache_cells > 0:
+                with self._lock:
+                    for key_r, key_c, row, good in zip(r.tolist(), c.tolist(), read, ok):
+                        self._cache[(key_r, key_c)] = row.copy() if good else None
+                        self._cache.move_to_end((key_r, key_c))
+                    while len(self._cache) > self.cache_cells:
+                        self._cache.popitem(last=False)
+        return values, valid
+
+    def sample(self, lats, lons, method="nearest"):
+        """返回 (bio 值 (n, 19), 是否有效 (n,))；超出栅格范围或无数据的位置无效"""
+        if method not in INTERPOLATION_METHODS:
+            raise ValueError(f"无效插值方法，可选: {INTERPOLATION_METHODS}")
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        x = (lons - self.lon_min) / self.cell_size  # 以像元为单位的列坐标
+        y = (self.lat_max - lats) / self.cell_size  # 以像元为单位的行坐标，北在上
+        inside = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+
+        values = np.full((len(lats), len(self.layers)), np.nan)
+        valid = np.zeros(len(lats), dtype=bool)
+        idx = np.flatnonzero(inside)
+        if not len(idx):
+            return values, valid
+
+        if method == "nearest":
+            rows = np.floor(y[idx]).astype(np.int64)
+            cols = np.floor(x[idx]).astype(np.int64)
+            values[idx], valid[idx] = self._read_cells(rows, cols)
+            return values, valid
+
+        # 双线性：以像元中心为采样点，边缘处夹到最近的像元
+        cx = np.clip(x[idx] - 0.5, 0, self.width - 1)
+        cy = np.clip(y[idx] - 0.5, 0, self.height - 1)
+        c0 = np.minimum(np.floor(cx).astype(np.int64), max(self.width - 2, 0))
+        r0 = np.minimum(np.floor(cy).astype(np.int64), max(self.height - 2, 0))
+        fx = cx - c0
+        fy = cy - r0
+        c1 = np.minimum(c0 + 1, self.width - 1)
+        r1 = np.minimum(r0 + 1, self.height - 1)
+
+        corners = [(r0, c0, (1 - fy) * (1 - fx)), (r0, c1, (1 - fy) * fx),
+                   (r1, c0, fy * (1 - fx)), (r1, c1, fy * fx)]
+        total = np.zeros((len(idx), len(self.layers)))
+        weight = np.zeros(len(idx))
+        for rows, cols, w in corners:
+            cell_values, cell_valid = self._read_cells(rows, cols)
+            w = np.where(cell_valid, w, 0.0)
+            total += np.where(cell_valid[:, np.newaxis], cell_values, 0.0) * w[:, np.newaxis]
+            weight += w
+        ok = weight > 0
+        values[idx[ok]] = total[ok] / weight[ok, np.newaxis]
+        valid[idx[ok]] = True
+        return values, valid
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "layer_dir": self.layer_dir,
+                "shape": [self.height, self.width],
+                "cached_cells": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def load_default_raster():
+    """按 CLIMATE_RASTER_DIR 打开栅格，未配置时返回 None"""
+    if not CLIMATE_RASTER_DIR:
+        return None
+    return ClimateRaster(CLIMATE_RASTER_DIR)
@@ -5,41 +5,63 @@ climate_seed_model.py
 功能：
 1. 训练模型并保存到.pkl文件
 2. 加载模型进行预测
-3. 保存和加载特征选择器及特征名称
+3. 保存和加载特征选择器及特征名称（pickle 或 native 格式，见 model_artifacts）
+4. 把随机森林导出为扁平数组（flat_forest），推理时不经过 sklearn
+5. 新一季数据到来时增量更新：保留已有的树，只在新数据上追加训练若干棵树（warm_start）
 """
 
 import pandas as pd
 import numpy as np
-import pickle
 import json
+import math
 import os
 import argparse
+import threading
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.feature_selection import SelectKBest, f_classif
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
+from prediction_logging import get_logger, configure_logging
+from flat_forest import FlatForest, FLAT_FOREST_MAX_ROWS
+from model_artifacts import save_artifact, load_artifact, artifact_path, MMAP_MODE
+from prediction_cache import PredictionCache
+from dataset_loader import load_dataset
+from bioclim import BIO_NAMES
+from request_metrics import stage
 
 # 常量定义
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # 当前脚本所在目录
-MODEL_PATH = os.path.join(BASE_DIR, "climate_seed_model.pkl")  # 模型保存路径
-SELECTOR_PATH = os.path.join(BASE_DIR, "climate_selector.pkl")  # 特征选择器保存路径
+MODEL_BASE = os.path.join(BASE_DIR, "climate_seed_model")  # 模型保存路径（不含扩展名）
+SELECTOR_BASE = os.path.join(BASE_DIR, "climate_selector")  # 特征选择器保存路径（不含扩展名）
 FEATURE_NAMES_PATH = os.path.join(BASE_DIR, "climate_features.json")  # 特征名称保存路径
+FLAT_FOREST_DIR = os.path.join(BASE_DIR, "climate_flat_forest")  # 扁平化森林导出目录
 DATA_PATH = os.path.join(BASE_DIR, "final_input.csv")
 
+INCREMENTAL_TREES = int(os.environ.get("CLIMATE_INCREMENTAL_TREES", "50"))  # 每次增量更新追加的树数
+PARITY_ATOL = 1e-12  # 扁平化森林与 sklearn 概率输出允许的最大差值
+CACHE_MODEL_NAME = "climate"  # 预测缓存键中的模型名
+
+log = get_logger("climate")
+
 class ClimateSeedModel:
     def __init__(self):
         """初始化模型和特征选择器"""
         self.model = None
+        self.flat_forest = None  # 推理使用的扁平化森林
         self.selector = None
         self.feature_names = None
         self.all_feature_names = None  # 保存所有特征名称
+        self.support_indices = None  # 选中特征在全部特征中的列下标
+        self.column_index = None  # 特征名 -> 在全部特征中的列下标
+        self._local = threading.local()  # 每个线程一个单行输入缓冲区
         self.is_loaded = False  # 添加 is_loaded 属性，与 AstragalusPredictor 保持一致
+        self.cache = PredictionCache()  # 预测结果缓存
 
-    def train(self):
-        """完整训练流程"""
-        # 加载数据
-        data = pd.read_csv(DATA_PATH)
-        climate_data = data.iloc[:, 4:23]  # bio1-bio19列
+    def train(self, data_path=DATA_PATH):
+        """完整训练流程；data_path 需含 bio1..bio19 和 source 列（如 bioclim.py 的输出）"""
+        # 加载数据（按列名读取，不依赖列的位置）
+        data = load_dataset(data_path, columns=BIO_NAMES + ['source'])
+        climate_data = data[BIO_NAMES]
         target = data['source']
         print(f"数据加载成功，样本数: {data.shape[0]}")
 
@@ -70,74 +92,299 @@ class ClimateSeedModel:
 
         # 保存模型和选择器
         self._save_models()
+        self.export_flat_forest()
         print(f"\n关键气候因子: {self.feature_names}")
-        print(f"模型已保存至 {MODEL_PATH}")
+        print(f"模型已保存至 {artifact_path(MODEL_BASE)}")
 
     def predict(self, input_data):
         """预测种子编号"""
         if not self.is_loaded:
             return {"error": "模型未加载"}
 
-        print(f"预期关键特征: {self.feature_names}")
-        print(f"所有特征: {self.all_feature_names}")
-        print(f"输入数据: {input_data}")
+        sampled = log.sampled()
+        if sampled:
+            log.debug("预期关键特征: %s 所有特征: %s 输入数据: %s",
+                      self.feature_names, self.all_feature_names, input_data)
 
         try:
-            # 构造完整的特征集，缺失的特征填充为0
-            full_input = {feature: 0.0 for feature in self.all_feature_names}
-            full_input.update(input_data)  # 用提供的特征值覆盖
-            df = pd.DataFrame([full_input])
-            print(f"输入DataFrame列: {df.columns.tolist()}")
-
-            # 应用特征选择
-            X = df[self.all_feature_names]  # 确保列顺序与训练时一致
-            X_selected = self.selector.transform(X)
+            # 按训练时的列顺序填入预分配的数组，缺失的特征填充为0，未知字段忽略
+            with stage("build_input"):
+                X = self._row_buffer()
+                X.fill(0.0)
+                bad = []
+                for feature, value in input_data.items():
+                    j = self.column_index.get(feature)
+                    if j is not None:
+                        X[0, j] = float(value)
+                        if not math.isfinite(X[0, j]):
+                            bad.append(feature)
+            if bad:
+                # float() 接受 "nan"/"inf" 和溢出的 1e400，随机森林会把 NaN 当作缺失值照常给出结果，这里直接拒绝
+                return {"error": f"输入数据错误: 字段 {bad} 不是有限数值"}
+            cache_key = self.cache.make_key(CACHE_MODEL_NAME, X[0])
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            # 特征选择：直接取支持掩码对应的列
+            with stage("transform"):
+                X_selected = X[:, self.support_indices]
         except Exception as e:
-            print(f"输入数据错误: {str(e)}")
+            log.warning("输入数据错误: %s", e)
             return {"error": f"预测失败: {str(e)}"}
 
-        pred = int(self.model.predict(X_selected)[0])  # 转换为 Python int
-        proba = float(self.model.predict_proba(X_selected).max())  # 转换为 Python float
+        # 一次 predict_proba 同时得到类别和置信度，避免两次遍历森林
+        with stage("estimator"):
+            proba = self.predict_proba(X_selected)[0]
+        best = int(np.argmax(proba))
 
-        return {
-            "seed_id": pred,
-            "confidence": round(proba, 4),
+        result = {
+            "seed_id": int(self.classes[best]),  # 转换为 Python int
+            "confidence": round(float(proba[best]), 4),  # 转换为 Python float
             "key_factors": self.feature_names
         }
+        self.cache.put(cache_key, result)
+        return result
+
+    def predict_batch(self, records):
+        """批量预测种子编号：直接组装 float64 矩阵，按支持掩码取列，只调用一次 predict_proba"""
+        if not self.is_loaded:
+            return {"error": "模型未加载"}
+
+        n_features = len(self.all_feature_names)
+        column_index = self.column_index
+        X = np.zeros((len(records), n_features), dtype=np.float64)  # 缺失的特征填充为0
+        pending = np.ones(len(records), dtype=bool)  # 需要模型计算的行
+        results = [None] * len(records)
+
+        with stage("build_input"):
+            for i, record in enumerate(records):
+                try:
+                    for feature, value in record.items():
+                        j = column_index.get(feature)
+                        if j is not None:
+                            X[i, j] = float(value)
+                except (AttributeError, TypeError, ValueError) as e:
+                    pending[i] = False
+                    results[i] = {"index": i, "error": f"输入数据错误: {str(e)}"}
+                    continue
+                if not np.isfinite(X[i]).all():
+                    bad = [name for name, value in zip(self.all_feature_names, X[i]) if not math.isfinite(value)]
+                    pending[i] = False
+                    results[i] = {"index": i, "error": f"输入数据错误: 字段 {bad} 不是有限数值"}
+
+        # 命中缓存的行不再参与模型计算
+        error_count = int((~pending).sum())
+        cache_keys = [None] * len(records)
+        for i in np.flatnonzero(pending):
+            cache_keys[i] = self.cache.make_key(CACHE_MODEL_NAME, X[i])
+            cached = self.cache.get(cache_keys[i])
+            if cached is not None:
+                results[i] = {"index": int(i), **cached}
+                pending[i] = False
+
+        row_indices = np.flatnonzero(pending)
+        if log.sampled():
+            log.debug("批量预测 %d 条，其中无效 %d 条，需计算 %d 条，首条输入: %s",
+                      len(records), error_count, len(row_indices), records[:1])
+        if len(row_indices):
+            try:
+                with stage("transform"):
+                    X_selected = X[row_indices][:, self.support_indices]
+                with stage("estimator"):
+                    proba = self.predict_proba(X_selected)
+            except Exception as e:
+                return {"error": f"预测失败: {str(e)}"}
+
+            best = proba.argmax(axis=1)
+            seed_ids = self.classes[best]
+            confidences = proba[np.arange(len(best)), best]
+            for i, seed_id, confidence in zip(row_indices, seed_ids, confidences):
+                result = {
+                    "seed_id": int(seed_id),
+                    "confidence": round(float(confidence), 4),
+                    "key_factors": self.feature_names
+                }
+                self.cache.put(cache_keys[i], result)
+                results[i] = {"index": int(i), **result}
+
+        return {
+            "count": len(records),
+            "error_count": error_count,
+            "results": results
+        }
+
+    def update(self, new_data_path, full_retrain=False, data_path=DATA_PATH):
+        """
+        用新一季的数据增量更新：特征选择器不变，随机森林保留已有的树，在新数据上追加 INCREMENTAL_TREES 棵
+        新一季通常只覆盖部分种子来源：缺少的类别各补一行权重为 0 的占位样本，使新增的树与已有的树类别一致；
+        full_retrain=True、没有已保存的模型、或新数据中出现模型从未见过的种子编号时，
+        改为在 data_path（应已并入新数据）上完整重新训练
+        """
+        if not full_retrain:
+            try:
+                # 不使用内存映射：warm_start 会修改模型对象
+                self.model = load_artifact(MODEL_BASE, mmap_mode=None)
+                self.selector = load_artifact(SELECTOR_BASE, mmap_mode=None)
+                with open(FEATURE_NAMES_PATH, 'r') as f:
+                    names = json.load(f)
+                self.feature_names = names["selected_features"]
+                self.all_feature_names = names["all_features"]
+            except FileNotFoundError:
+                print("未找到已保存的模型，改为完整重新训练")
+                full_retrain = True
+        if full_retrain:
+            self.train(data_path)
+            return
+
+        data = load_dataset(new_data_path, columns=self.all_feature_names + ['source'])
+        X_new = self.selector.transform(data[self.all_feature_names])
+        y_new = data['source'].to_numpy()
+        print(f"新数据加载成功，样本数: {data.shape[0]}")
+
+        classes = self.model.classes_
+        unseen = np.setdiff1d(np.unique(y_new), classes)
+        if len(unseen):
+            print(f"新数据中有模型未见过的种子编号 {unseen.tolist()}，改为完整重新训练")
+            self.train(data_path)
+            return
 
-    def _save_models(self):
+        acc_before = accuracy_score(y_new, self.model.predict(X_new))
+        X_fit, y_fit, weight = self._pad_missing_classes(X_new, y_new)
+        n_before = self.model.n_estimators
+        self.model.set_params(warm_start=True, n_estimators=n_before + INCREMENTAL_TREES)
+        self.model.fit(X_fit, y_fit, sample_weight=weight)
+        self.model.set_params(warm_start=False)
+        if not np.array_equal(self.model.classes_, classes):
+            raise RuntimeError(f"增量更新后类别不一致: {self.model.classes_.tolist()}")
+        acc_after = accuracy_score(y_new, self.model.predict(X_new))
+        print(f"\n树数 {n_before} -> {self.model.n_estimators}，新数据准确率 {acc_before:.2%} -> {acc_after:.2%}")
+
+        self._save_models()
+        self.export_flat_forest()
+        print(f"模型已保存至 {artifact_path(MODEL_BASE)}")
+
+    def _pad_missing_classes(self, X, y):
+        """
+        随机森林按拟合数据中出现的类别决定每棵树的输出维度；新数据缺少的类别各补一行权重为 0 的样本
+        （特征取第一行的值，不产生新的分裂点），新增的树因此与已有的树输出相同的类别列，且不受占位样本影响
+        返回 (X, y, sample_weight)
+        """
+        missing = np.setdiff1d(self.model.classes_, y)
+        weight = np.ones(len(y))
+        if not len(missing):
+            return X, y, weight
+        X_pad = np.repeat(X[:1], len(missing), axis=0)
+        return (np.vstack([X, X_pad]), np.concatenate([y, missing.astype(y.dtype)]),
+                np.concatenate([weight, np.zeros(len(missing))]))
+
+    def predict_proba(self, X_selected):
+        """
+        已选特征上的类别概率，列顺序同 self.classes
+        不超过 FLAT_FOREST_MAX_ROWS 行时用扁平化森林，更多行时交给 sklearn（大批量下更快、内存更省）
+        """
+        if len(X_selected) <= FLAT_FOREST_MAX_ROWS:
+            return self.flat_forest.predict_proba(X_selected)
+        return self.model.predict_proba(X_selected)
+
+    @property
+    def classes(self):
+        return self.flat_forest.classes
+
+    def export_flat_forest(self):
+        """把随机森林展平为连续数组并保存，供 predict/predict_batch 使用"""
+        self.flat_forest = FlatForest.from_sklearn(self.model)
+        self.flat_forest.save(FLAT_FOREST_DIR)
+        print(f"扁平化森林已导出至 {FLAT_FOREST_DIR}")
+
+    def check_flat_forest_parity(self, data_path=DATA_PATH):
+        """
+        在训练数据上核对扁平化森林与 sklearn 模型的输出：预测类别必须完全一致，
+        概率允许 PARITY_ATOL 以内的舍入差异（叶子分布的归一化时机不同，见 FlatForest.predict_proba）
+        """
+        data = load_dataset(data_path, columns=self.all_feature_names)
+        X = data[self.all_feature_names].to_numpy(dtype=np.float64)[:, self.support_indices]
+
+        expected_proba = self.model.predict_proba(X)
+        actual_proba = self.flat_forest.predict_proba(X)
+        class_mismatch = int((self.model.predict(X) != self.flat_forest.predict(X)).sum())
+        max_diff = float(np.abs(expected_proba - actual_proba).max())
+
+        print(f"样本数: {len(X)}，类别不一致: {class_mismatch}，概率最大差值: {max_diff:.3e}")
+        return class_mismatch == 0 and max_diff <= PARITY_ATOL
+
+    def _load_flat_forest(self):
+        """加载导出的扁平化森林；不存在或比模型文件旧时从 sklearn 模型重新导出"""
+        if flat_forest_is_current():
+            return FlatForest.load(FLAT_FOREST_DIR, mmap_mode=MMAP_MODE)
+        log.info("扁平化森林不存在或已过期，从模型重新导出")
+        return FlatForest.from_sklearn(self.model)
+
+    def _save_models(self, fmt=None):
         """保存模型和选择器"""
-        with open(MODEL_PATH, 'wb') as f:
-            pickle.dump(self.model, f)
-        with open(SELECTOR_PATH, 'wb') as f:
-            pickle.dump(self.selector, f)
+        save_artifact(self.model, MODEL_BASE, fmt=fmt)
+        save_artifact(self.selector, SELECTOR_BASE, fmt=fmt)
         with open(FEATURE_NAMES_PATH, 'w') as f:
             json.dump({
                 "selected_features": self.feature_names,
                 "all_features": self.all_feature_names
             }, f)
-        print(f"特征选择器已保存至 {SELECTOR_PATH}")
+        print(f"特征选择器已保存至 {artifact_path(SELECTOR_BASE)}")
         print(f"特征名称已保存至 {FEATURE_NAMES_PATH}")
 
     def _load_models(self):
-        """加载模型和选择器"""
+        """加载模型和选择器，并清空预测结果缓存"""
+        if self.is_loaded:
+            self.cache.clear()  # 重新加载后旧模型的预测结果全部失效
         try:
-            with open(MODEL_PATH, 'rb') as f:
-                self.model = pickle.load(f)
-            with open(SELECTOR_PATH, 'rb') as f:
-                self.selector = pickle.load(f)
+            self.model = load_artifact(MODEL_BASE)
+            self.selector = load_artifact(SELECTOR_BASE)
             with open(FEATURE_NAMES_PATH, 'r') as f:
                 data = json.load(f)
                 self.feature_names = data["selected_features"]
                 self.all_feature_names = data["all_features"]
-            print(f"模型加载成功，特征: {self.feature_names}")
+            self._check_feature_names()
+            self.support_indices = np.flatnonzero(self.selector.get_support())
+            self.column_index = {feature: j for j, feature in enumerate(self.all_feature_names)}
+            self.flat_forest = self._load_flat_forest()
+            log.info("模型加载成功，特征: %s", self.feature_names)
             self.is_loaded = True
             return True
         except FileNotFoundError as e:
             self.is_loaded = False
-            print(f"警告: 未找到模型文件，请先训练模型: {str(e)}")
+            log.warning("未找到模型文件，请先训练模型: %s", e)
             return False
 
+    def _check_feature_names(self):
+        """推理时按 all_feature_names 的顺序组装数组，加载时确认它与选择器训练时的列顺序及选中特征一致"""
+        trained_columns = getattr(self.selector, "feature_names_in_", None)
+        if trained_columns is not None and list(trained_columns) != self.all_feature_names:
+            raise ValueError(f"特征列顺序与选择器不一致: {list(trained_columns)}")
+        selected = [name for name, keep in zip(self.all_feature_names, self.selector.get_support()) if keep]
+        if selected != self.feature_names:
+            raise ValueError(f"选中特征与选择器不一致: {selected}")
+
+    def _row_buffer(self):
+        """当前线程复用的 (1, 特征数) 输入数组"""
+        buffer = getattr(self._local, "row", None)
+        if buffer is None or buffer.shape[1] != len(self.all_feature_names):
+            buffer = self._local.row = np.empty((1, len(self.all_feature_names)), dtype=np.float64)
+        return buffer
+
+def flat_forest_is_current():
+    """导出的扁平化森林存在且不比模型文件旧"""
+    meta_path = os.path.join(FLAT_FOREST_DIR, "meta.json")
+    model_path = artifact_path(MODEL_BASE)
+    return (os.path.exists(meta_path) and model_path is not None
+            and os.path.getmtime(meta_path) >= os.path.getmtime(model_path))
+
+def artifact_files():
+    """气候模型相关的所有文件/目录，供热更新监视"""
+    candidates = [MODEL_BASE + suffix for suffix in (".pkl", ".joblib")]
+    candidates += [SELECTOR_BASE + suffix for suffix in (".pkl", ".joblib")]
+    candidates += [FEATURE_NAMES_PATH, FLAT_FOREST_DIR]
+    return [path for path in candidates if os.path.exists(path)]
+
 def load_feature_names():
     """加载保存的特征名称"""
     try:
@@ -151,6 +398,12 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='气候因子-种子编号预测模型')
     parser.add_argument('--train', action='store_true', help="训练并保存模型")
     parser.add_argument('--predict', action='store_true', help="使用模型预测")
+    parser.add_argument('--export-flat', action='store_true', help="把已保存的模型导出为扁平化森林")
+    parser.add_argument('--check-parity', action='store_true', help="核对扁平化森林与 sklearn 模型输出是否一致")
+    parser.add_argument('--convert', choices=['pickle', 'native'], help="把已保存的模型转换为指定格式")
+    parser.add_argument('--data', default=DATA_PATH, help="训练数据（含 bio1..bio19 和 source 列）")
+    parser.add_argument('--update', metavar='NEW_DATA', help="用新一季的数据增量更新已保存的模型")
+    parser.add_argument('--full-retrain', action='store_true', help="与 --update 一起使用时改为在 --data 上完整重新训练")
     
     # 在解析参数前加载特征名称
     feature_names = load_feature_names()
@@ -159,10 +412,29 @@ if __name__ == '__main__':
             parser.add_argument(f'--{feature}', type=float, help=f'{feature} value')
 
     args = parser.parse_args()
+    configure_logging()
     model = ClimateSeedModel()
 
     if args.train:
-        model.train()
+        model.train(args.data)
+    elif args.update:
+        model.update(args.update, full_retrain=args.full_retrain, data_path=args.data)
+    elif args.convert:
+        if not model._load_models():
+            exit(1)
+        model._save_models(fmt=args.convert)
+        model.export_flat_forest()
+    elif args.export_flat or args.check_parity:
+        if not model._load_models():
+            exit(1)
+        if args.export_flat:
+            model.export_flat_forest()
+        if args.check_parity:
+            if model.check_flat_forest_parity():
+                print("一致性检查通过")
+            else:
+                print("一致性检查失败")
+                exit(1)
     elif args.predict:
         if not feature_names:
             print("错误: 请先运行 '--train' 命令以生成模型和特征文件")
@@ -188,5 +460,5 @@ if __name__ == '__main__':
         else:
             print(f"预测失败: {result.get('error', '未知错误')}")
     else:
-        print("请指定运行模式：--train 或 --predict")
+        print("请指定运行模式：--train、--predict、--export-flat 或 --check-parity")
         parser.print_help()
\ No newline at end of file
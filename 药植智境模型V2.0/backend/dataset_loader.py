@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+dataset_loader.py
+调查数据集（final_input.csv / final.input.txt）的列式缓存
+功能：
+1. 源文件只解析一次，按列写成二进制缓存，缓存按源文件内容的 sha256 区分
+2. 之后的加载只读取需要的列，数值列以内存映射方式打开
+3. 支持分块写入（ColumnarCacheWriter），大文件不需要整体读入内存
+
+缓存目录：<源文件所在目录>/.dataset_cache/<文件名>-<sha256 前 16 位>/
+  meta.json                    列名、存储方式、原始类型、行数
+  col_000.bin                  数值列：float64 原始二进制
+  col_001.bin / col_001.offsets.bin / col_001.nulls.bin
+                               字符串列：UTF-8 字节、int64 偏移量、空值标记
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from prediction_logging import get_logger
+
+CACHE_DIRNAME = ".dataset_cache"
+CHUNK_ROWS = int(os.environ.get("DATASET_CHUNK_ROWS", "100000"))
+INDEX_FILENAME = "index.json"  # 源文件 (大小, 修改时间) -> sha256，避免每次加载都重新计算哈希
+
+log = get_logger("dataset")
+
+
+def guess_separator(path):
+    """.txt/.tsv 按制表符分隔，其余按逗号"""
+    return "\t" if path.lower().endswith((".txt", ".tsv")) else ","
+
+
+def file_digest(path, block_size=1 << 20):
+    """源文件内容的 sha256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def default_cache_dir(source):
+    return os.path.join(os.path.dirname(os.path.abspath(source)), CACHE_DIRNAME)
+
+
+def source_digest(source, cache_dir=None):
+    """源文件的 sha256；未变化（大小和修改时间相同）时复用上次计算的结果"""
+    cache_dir = cache_dir or default_cache_dir(source)
+    source = os.path.abspath(source)
+    stat = os.stat(source)
+    index_path = os.path.join(cache_dir, INDEX_FILENAME)
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (FileNotFoundError, ValueError):
+        index = {}
+
+    entry = index.get(source)
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["sha256"]
+
+    digest = file_digest(source)
+    index[source] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+    return digest
+
+
+def cache_path_for(source, digest, cache_dir=None):
+    cache_dir = cache_dir or default_cache_dir(source)
+    return os.path.join(cache_dir, f"{os.path.basename(source)}-{digest[:16]}")
+
+
+class ChunkTypeMismatch(ValueError):
+    """后续分块中某列的类型与首个分块推断的类型不符（如数值列中出现文本）"""
+
+    def __init__(self, message, column=None):
+        super().__init__(message)
+        self.column = column
+
+
+class ColumnarCacheWriter:
+    """分块写入列式缓存；finalize() 之前写在临时目录中，中途失败不会留下不完整的缓存"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = f"{path}.{os.getpid()}.tmp"
+        self.columns = None  # [{name, kind, dtype}]
+        self.n_rows = 0
+        self._files = {}
+        self._offsets = {}  # 字符串列当前已写入的字节数
+        if os.path.exists(self.tmp_path):
+            shutil.rmtree(self.tmp_path)
+        os.makedirs(self.tmp_path)
+
+    def _open_columns(self, df):
+        self.columns = []
+        for i, name in enumerate(df.columns):
+            kind = "numeric" if pd.api.types.is_numeric_dtype(df[name]) else "string"
+            self.columns.append({"name": name, "kind": kind, "dtype": str(df[name].dtype), "file": f"col_{i:03d}"})
+            base = os.path.join(self.tmp_path, f"col_{i:03d}")
+            self._files[name] = [open(base + ".bin", "wb")]
+            if kind == "string":
+                self._files[name] += [open(base + ".offsets.bin", "wb"), open(base + ".nulls.bin", "wb")]
+                self._offsets[name] = 0
+                np.zeros(1, dtype=np.int64).tofile(self._files[name][1])
+
+    def write_chunk(self, df):
+        if self.columns is None:
+            self._open_columns(df)
+        elif list(df.columns) != [column["name"] for column in self.columns]:
+            raise ValueError("分块的列与首个分块不一致")
+
+        for column in self.columns:
+            name = column["name"]
+            series = df[name]
+            files = self._files[name]
+            if column["kind"] == "numeric":
+                # 各分块推断出的类型可能不同（如某块出现空值变成 float），统一按 float64 存储
+                values = pd.to_numeric(series, errors="coerce")
+                if (values.isna() & series.notna()).any():
+                    raise ChunkTypeMismatch(f"列 {name} 在第 {self.n_rows} 行之后出现非数值内容", column=name)
+                if str(series.dtype) != column["dtype"]:
+                    column["dtype"] = "float64"
+                values.to_numpy(dtype=np.float64).tofile(files[0])
+                continue
+            if pd.api.types.is_numeric_dtype(series):
+                # 首个分块为文本而本块被推断为数值：str() 后与原文不一定一致（如 "1.50" -> "1.5"）
+                raise ChunkTypeMismatch(f"列 {name} 在第 {self.n_rows} 行之后被推断为数值", column=name)
+
+            nulls = series.isna().to_numpy()
+            encoded = [b"" if null else str(value).encode("utf-8") for value, null in zip(series, nulls)]
+            lengths = np.fromiter((len(item) for item in encoded), dtype=np.int64, count=len(encoded))
+            (np.cumsum(lengths) + self._offsets[name]).tofile(files[1])
+            self._offsets[name] += int(lengths.sum())
+            files[0].write(b"".join(encoded))
+            nulls.astype(np.uint8).tofile(files[2])
+
+        self.n_rows += len(df)
+
+    def _close_files(self):
+        for files in self._files.values():
+            for f in files:
+                f.close()
+        self._files = {}
+
+    def finalize(self, digest=None):
+        """写入元数据并把临时目录替换为正式缓存目录"""
+        self._close_files()
+        with open(os.path.join(self.tmp_path, "meta.json"), "w") as f:
+            json.dump({"columns": self.columns or [], "n_rows": self.n_rows, "sha256": digest}, f,
+                      ensure_ascii=False)
+        if os.path.exists(self.path):
+            # 其他进程已生成同一份缓存
+            shutil.rmtree(self.tmp_path)
+        else:
+            os.replace(self.tmp_path, self.path)
+        return self.path
+
+    def abort(self):
+        self._close_files()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+def _write_cache(source, path, sep, chunksize, digest):
+    writer = ColumnarCacheWriter(path)
+    try:
+        if chunksize is None:
+            writer.write_chunk(pd.read_csv(source, sep=sep, encoding="utf-8"))
+        else:
+            for chunk in pd.read_csv(source, sep=sep, encoding="utf-8", chunksize=chunksize):
+                writer.write_chunk(chunk)
+        return writer.finalize(digest)
+    except BaseException:
+        writer.abort()
+        raise
+
+
+def build_cache(source, path, sep=None, chunksize=CHUNK_ROWS, digest=None):
+    """
+    分块读取源文件并写入列式缓存
+    列类型按首个分块推断；后续分块类型不符时改为整体读取，由 pandas 按整列推断类型，保证缓存与 read_csv 的结果一致
+    """
+    sep = sep or guess_separator(source)
+    try:
+        return _write_cache(source, path, sep, chunksize, digest)
+    except ChunkTypeMismatch as e:
+        if chunksize is None:
+            raise
+        log.warning("%s，改为整体读取 %s 重新生成缓存", e, source)
+        return _write_cache(source, path, sep, None, digest)
+
+
+def ensure_cache(source, sep=None, cache_dir=None):
+    """返回源文件对应的缓存目录，不存在时生成，并清理同名源文件的旧缓存"""
+    cache_dir = cache_dir or default_cache_dir(source)
+    digest = source_digest(source, cache_dir)
+    path = cache_path_for(source, digest, cache_dir)
+    if os.path.exists(os.path.join(path, "meta.json")):
+        return path
+
+    build_cache(source, path, sep=sep, digest=digest)
+    prefix = f"{os.path.basename(source)}-"
+    for name in os.listdir(cache_dir):
+        stale = os.path.join(cache_dir, name)
+        if name.startswith(prefix) and stale != path and not name.endswith(".tmp"):
+            shutil.rmtree(stale, ignore_errors=True)
+    return path
+
+
+def read_meta(path):
+    with open(os.path.join(path, "meta.json")) as f:
+        return json.load(f)
+
+
+def _read_column(path, column, n_rows):
+    base = os.path.join(path, column["file"])
+    if column["kind"] == "numeric":
+        if n_rows == 0:
+            return np.empty(0, dtype=np.float64)
+        return np.memmap(base + ".bin", dtype=np.float64, mode="r", shape=(n_rows,))
+
+    offsets = np.fromfile(base + ".offsets.bin", dtype=np.int64)
+    nulls = np.fromfile(base + ".nulls.bin", dtype=np.uint8).astype(bool)
+    with open(base + ".bin", "rb") as f:
+        data = f.read()
+    values = np.empty(n_rows, dtype=object)
+    for i in range(n_rows):
+        values[i] = None if nulls[i] else data[offsets[i]:offsets[i + 1]].decode("utf-8")
+    return values
+
+
+def _load_arrays(path, columns):
+    meta = read_meta(path)
+    by_name = {column["name"]: column for column in meta["columns"]}
+    names = list(by_name) if columns is None else list(columns)
+    missing = [name for name in names if name not in by_name]
+    if missing:
+        raise KeyError(f"数据集中不存在列: {missing}")
+    return by_name, {name: _read_column(path, by_name[name], meta["n_rows"]) for name in names}
+
+
+def load_columns(source, columns=None, sep=None, cache_dir=None):
+    """按列加载，返回 {列名: 数组}；数值列为只读 float64 内存映射"""
+    _, arrays = _load_arrays(ensure_cache(source, sep=sep, cache_dir=cache_dir), columns)
+    return arrays
+
+
+def load_dataset(source, columns=None, sep=None, cache_dir=None):
+    """加载为 DataFrame，列顺序与 columns（或源文件）一致，数值列恢复为源文件中的类型"""
+    by_name, arrays = _load_arrays(ensure_cache(source, sep=sep, cache_dir=cache_dir), columns)
+
+    data = {}
+    for name, values in arrays.items():
+        dtype = by_name[name]["dtype"]
+        if by_name[name]["kind"] == "numeric" and dtype != "float64":
+            values = values.astype(dtype)
+        data[name] = values
+    return pd.DataFrame(data, columns=list(arrays))
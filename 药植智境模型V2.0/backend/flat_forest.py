@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+flat_forest.py
+把 sklearn 的 RandomForestClassifier 展平成连续的 NumPy 数组，并用纯 NumPy 做向量化推理
+功能：
+1. 所有树的节点拼接成一组数组（分裂特征、阈值、左右子节点、叶子类别分布）
+2. 所有样本 × 所有树同时逐层下行，层数等于森林最大深度
+3. 以目录形式保存（每个数组一个 .npy 文件），可直接内存映射加载
+只适合单条/小批量：省去 sklearn 的输入校验和调度开销；行数较多时逐层的 (样本 × 树) 花式索引
+比 sklearn 逐树的 Cython 推理慢得多且占用大量内存，超过 FLAT_FOREST_MAX_ROWS 行应改用 sklearn
+"""
+
+import json
+import os
+
+import numpy as np
+
+FLAT_FOREST_MAX_ROWS = int(os.environ.get("FLAT_FOREST_MAX_ROWS", "256"))
+ARRAY_NAMES = ["feature", "threshold", "left", "right", "missing_left", "value", "roots", "classes"]
+
+
+class FlatForest:
+    def __init__(self, feature, threshold, left, right, missing_left, value, roots, classes, max_depth):
+        self.feature = feature  # 每个节点的分裂特征，叶子为 0
+        self.threshold = threshold  # 每个节点的分裂阈值，叶子为 +inf
+        self.left = left  # 左子节点的全局下标，叶子指向自身
+        self.right = right  # 右子节点的全局下标，叶子指向自身
+        self.missing_left = missing_left  # 特征值为 NaN 时是否走左子树
+        self.value = value  # 每个节点归一化后的类别分布 (n_nodes, n_classes)
+        self.roots = roots  # 每棵树根节点的全局下标
+        self.classes = classes
+        self.max_depth = int(max_depth)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """从训练好的 RandomForestClassifier 导出"""
+        if getattr(forest, "n_outputs_", 1) != 1:
+            raise ValueError("只支持单输出的随机森林")
+
+        parts = {name: [] for name in ["feature", "threshold", "left", "right", "missing_left", "value"]}
+        roots = []
+        offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            parts["feature"].append(np.where(is_leaf, 0, tree.feature))
+            parts["threshold"].append(np.where(is_leaf, np.inf, tree.threshold))
+            parts["left"].append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            parts["right"].append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            missing_left = getattr(tree, "missing_go_to_left", None)  # sklearn >= 1.3
+            if missing_left is None:
+                missing_left = np.zeros(tree.node_count, dtype=bool)
+            parts["missing_left"].append(np.asarray(missing_left, dtype=bool) & ~is_leaf)
+
+            # 与 DecisionTreeClassifier.predict_proba 相同的归一化方式
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            parts["value"].append(value / normalizer)
+
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(parts["feature"]).astype(np.int32),
+            threshold=np.concatenate(parts["threshold"]).astype(np.float64),
+            left=np.concatenate(parts["left"]).astype(np.int32),
+            right=np.concatenate(parts["right"]).astype(np.int32),
+            missing_left=np.concatenate(parts["missing_left"]),
+            value=np.ascontiguousarray(np.concatenate(parts["value"])),
+            roots=np.asarray(roots, dtype=np.int32),
+            classes=np.asarray(forest.classes_),
+            max_depth=max_depth,
+        )
+
+    def apply(self, X):
+        """返回每个样本在每棵树中落入的叶子节点 (n_samples, n_trees)"""
+        # sklearn 的树在 float32 上做比较，这里保持一致以得到完全相同的路径
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            go_left = x <= self.threshold[node]
+            go_left |= np.isnan(x) & self.missing_left[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def predict_proba(self, X):
+        """
+        各树类别分布的平均值，与 RandomForestClassifier.predict_proba 在舍入误差内一致（约 1e-17）：
+        两者都按树的顺序逐棵累加再除以树数，但这里的叶子分布在导出时已归一化，
+        sklearn 则在每次预测时对每棵树的输出归一化，浮点结果不保证逐位相同
+        """
+        leaves = self.apply(X)
+        proba = np.zeros((leaves.shape[0], self.value.shape[1]), dtype=np.float64)
+        for t in range(self.n_trees):
+            proba += self.value[leaves[:, t]]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes[self.predict_proba(X).argmax(axis=1)]
+
+    def save(self, path):
+        """保存到目录，每个数组一个 .npy 文件；先写临时文件再替换，不影响正在内存映射旧文件的进程"""
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAY_NAMES:
+            tmp_path = os.path.join(path, f"{name}.tmp.npy")
+            np.save(tmp_path, getattr(self, name))
+            os.replace(tmp_path, os.path.join(path, f"{name}.npy"))
+        tmp_path = os.path.join(path, "meta.tmp.json")
+        with open(tmp_path, "w") as f:
+            json.dump({"max_depth": self.max_depth, "n_trees": self.n_trees}, f)
+        os.replace(tmp_path, os.path.join(path, "meta.json"))
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """从目录加载，mmap_mode='r' 时以只读内存映射方式打开"""
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAY_NAMES}
+        return cls(max_depth=meta["max_depth"], **arrays)
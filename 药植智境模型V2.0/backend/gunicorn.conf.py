@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn.conf.py
+生产环境启动配置：gunicorn -c gunicorn.conf.py
+
+模型在 master 进程中加载一次（preload_app），fork 前用 gc.freeze() 把已有对象移出
+垃圾回收追踪，避免 worker 中的 GC 扫描修改引用计数/GC 头导致共享页被复制。
+注意：懒加载模式（ASTRAGALUS_LAZY_LOAD=1）下未预热的模型会在各 worker 中单独加载，无法共享。
+"""
+
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", "1"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+wsgi_app = os.environ.get("GUNICORN_APP", "app:app")
+preload_app = True
+
+# 同步单线程 worker 每次只处理一个请求，合批队列中永远只有一条，开启合批只会增加延迟；
+# 需要合批时使用多线程 worker（GUNICORN_THREADS > 1）或 ASGI 入口（GUNICORN_APP=asgi:app 配合 uvicorn worker）。
+# 配置文件先于 preload 加载，在这里关闭即可
+if os.environ.get("MICRO_BATCH_ENABLED") == "1" and worker_class == "sync" and threads <= 1:
+    os.environ["MICRO_BATCH_ENABLED"] = "0"
+    print("同步单线程 worker 下不开启合批（MICRO_BATCH_ENABLED 已忽略）")
+
+# 配置文件先于 preload 加载：模型加载期间不触发 GC，避免对象在冻结前被来回移动
+gc.disable()
+
+
+def when_ready(server):
+    # 配置文件加载时工作目录尚未加入 sys.path，钩子内再导入
+    from memory_stats import read_memory_usage, format_memory_usage
+
+    gc.collect()
+    gc.freeze()
+    server.log.info("master 模型已加载并冻结 (%d 个对象)，%s",
+                    gc.get_freeze_count(), format_memory_usage(read_memory_usage()))
+
+
+def pre_fork(server, worker):
+    # 重新冻结 master 在上次 fork 之后新分配的对象
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+    # 监视线程和格点索引构建线程不会随 fork 复制，需在每个 worker 中启动（MODEL_WATCH_INTERVAL=0 时不启动监视）
+    from app import start_background_tasks
+    start_background_tasks()
+
+
+def post_worker_init(worker):
+    from memory_stats import read_memory_usage, format_memory_usage
+
+    worker.log.info("worker %s 启动完成，%s", worker.pid, format_memory_usage(read_memory_usage()))
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+inference_executor.py
+有界的推理线程池
+功能：
+1. 模型计算放到固定大小的线程池中执行（NumPy/XGBoost 计算期间释放 GIL），事件循环不被阻塞；
+   只用于 ASGI 入口（asgi.py），WSGI 部署下并发由 gunicorn 的 worker 数 × 线程数限制
+2. 排队 + 执行中的任务数超过 INFERENCE_QUEUE_LIMIT 时立即拒绝（ExecutorOverloaded，对应 503），
+   不让请求无限堆积
+3. 每个任务有截止时间（INFERENCE_TIMEOUT 秒），超时抛出 DeadlineExceeded（对应 504）；
+   尚未开始的任务会被取消，已开始的任务无法中断，但结果会被丢弃
+4. 任务在提交时的 contextvars 上下文中执行，request_metrics 的阶段计时仍归属到原请求
+配置（环境变量）：INFERENCE_WORKERS（默认 CPU 核数；gunicorn 多 worker 时建议设为 核数/worker 数）
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import os
+import threading
+
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", os.cpu_count() or 1))
+INFERENCE_QUEUE_LIMIT = int(os.environ.get("INFERENCE_QUEUE_LIMIT", str(INFERENCE_WORKERS * 8)))
+INFERENCE_TIMEOUT = float(os.environ.get("INFERENCE_TIMEOUT", "10"))
+
+
+class ExecutorOverloaded(Exception):
+    """队列已满"""
+
+
+class DeadlineExceeded(Exception):
+    """超过请求截止时间"""
+
+
+class InferenceExecutor:
+    def __init__(self, max_workers=None, queue_limit=None, timeout=None):
+        self.max_workers = max_workers or INFERENCE_WORKERS
+        self.queue_limit = INFERENCE_QUEUE_LIMIT if queue_limit is None else queue_limit
+        self.timeout = INFERENCE_TIMEOUT if timeout is None else timeout
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers,
+                                                           thread_name_prefix="inference")
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.queue_limit)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def submit(self, fn, *args, **kwargs):
+        """提交任务，返回 concurrent.futures.Future；队列已满时抛出 ExecutorOverloaded"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise ExecutorOverloaded(f"推理队列已满（{self.max_workers + self.queue_limit}）")
+        with self._lock:
+            self.pending += 1
+
+        context = contextvars.copy_context()
+        try:
+            future = self._pool.submit(context.run, fn, *args, **kwargs)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def _deadline_exceeded(self, future, timeout):
+        future.cancel()
+        with self._lock:
+            self.timed_out += 1
+        return DeadlineExceeded(f"推理超过 {timeout:g} 秒未完成")
+
+    async def run_async(self, fn, *args, timeout=None, **kwargs):
+        """在事件循环中等待结果，不占用事件循环线程"""
+        timeout = self.timeout if timeout is None else timeout
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            raise self._deadline_exceeded(future, timeout) from None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queue_limit": self.queue_limit,
+                "timeout": self.timeout,
+                "pending": self.pending,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+memory_stats.py
+读取进程内存占用（Linux /proc），区分与其他进程共享的页和进程私有的页
+用于观察 gunicorn 预加载模型后各 worker 的写时复制效果
+"""
+
+import os
+
+SMAPS_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared_clean",
+    "Shared_Dirty": "shared_dirty",
+    "Private_Clean": "private_clean",
+    "Private_Dirty": "private_dirty",
+    "Swap": "swap",
+}
+
+
+def read_memory_usage(pid="self"):
+    """返回进程内存占用（单位 kB），非 Linux 系统返回 None"""
+    rollup_path = f"/proc/{pid}/smaps_rollup"
+    if not os.path.exists(rollup_path):
+        return _read_status_rss(pid)
+
+    usage = {name: 0 for name in SMAPS_FIELDS.values()}
+    with open(rollup_path) as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            name = SMAPS_FIELDS.get(key)
+            if name:
+                usage[name] = int(rest.split()[0])
+
+    usage["shared"] = usage["shared_clean"] + usage["shared_dirty"]
+    usage["private"] = usage["private_clean"] + usage["private_dirty"]
+    return usage
+
+
+def _read_status_rss(pid):
+    """旧内核没有 smaps_rollup 时只能拿到 RSS"""
+    status_path = f"/proc/{pid}/status"
+    if not os.path.exists(status_path):
+        return None
+    with open(status_path) as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return {"rss": int(line.split()[1])}
+    return None
+
+
+def format_memory_usage(usage):
+    """格式化为一行日志"""
+    if not usage:
+        return "内存信息不可用"
+    if "shared" not in usage:
+        return f"RSS={usage['rss'] / 1024:.1f}MB"
+    return (f"RSS={usage['rss'] / 1024:.1f}MB PSS={usage['pss'] / 1024:.1f}MB "
+            f"共享={usage['shared'] / 1024:.1f}MB 私有={usage['private'] / 1024:.1f}MB")
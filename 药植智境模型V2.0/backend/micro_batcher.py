@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+micro_batcher.py
+并发单条预测请求的动态合批
+功能：
+1. 每个模型一个队列和一个合批线程；第一条请求到达后最多再等待 MICRO_BATCH_WINDOW_MS 毫秒
+   （或凑满 MICRO_BATCH_MAX_SIZE 条），然后用一次 predict_batch 完成整批计算
+2. 每条请求拿到一个 Future，结果按顺序分发回各自的请求；整批失败时每条请求收到同样的错误
+3. 单条请求增加的延迟不超过一个窗口；负载低时窗口内只有一条请求，退化为逐条预测
+4. 每个队列有长度上限（MICRO_BATCH_QUEUE_LIMIT，默认与 INFERENCE_QUEUE_LIMIT 相同），
+   已满时立即抛出 ExecutorOverloaded（对应 503），与推理线程池的背压一致；同步等待超时（predict 的 timeout）时同样处理
+5. 只有同时处理多条请求时合批才有意义：Flask 需运行在多线程 worker（GUNICORN_THREADS > 1）或 ASGI 入口下，
+   同步单线程 worker 中队列里永远只有一条请求，只会多等一个窗口，gunicorn.conf.py 在这种配置下关闭合批
+配置（环境变量）：MICRO_BATCH_ENABLED（1 开启）、MICRO_BATCH_WINDOW_MS、MICRO_BATCH_MAX_SIZE、MICRO_BATCH_QUEUE_LIMIT
+"""
+
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from inference_executor import ExecutorOverloaded, INFERENCE_QUEUE_LIMIT
+from prediction_logging import get_logger
+
+MICRO_BATCH_ENABLED = os.environ.get("MICRO_BATCH_ENABLED", "0") == "1"
+MICRO_BATCH_WINDOW_MS = float(os.environ.get("MICRO_BATCH_WINDOW_MS", "2"))
+MICRO_BATCH_MAX_SIZE = int(os.environ.get("MICRO_BATCH_MAX_SIZE", "64"))
+MICRO_BATCH_QUEUE_LIMIT = int(os.environ.get("MICRO_BATCH_QUEUE_LIMIT", str(INFERENCE_QUEUE_LIMIT)))
+
+log = get_logger("micro_batcher")
+
+
+class MicroBatcher:
+    def __init__(self, name, run_batch, window_ms=None, max_size=None, queue_limit=None):
+        """
+        run_batch: run_batch(key, records)，返回 predict_batch 格式的结果
+                   （{"results": [...]} 或 {"error": ...}），key 为模型名
+        """
+        self.name = name
+        self.run_batch = run_batch
+        self.window = (MICRO_BATCH_WINDOW_MS if window_ms is None else window_ms) / 1000
+        self.max_size = max_size or MICRO_BATCH_MAX_SIZE
+        self.queue_limit = MICRO_BATCH_QUEUE_LIMIT if queue_limit is None else queue_limit
+        self._queues = {}
+        self._lock = threading.Lock()  # 保护队列的创建和统计计数
+        self.batches = 0
+        self.rows = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _queue_for(self, key):
+        q = self._queues.get(key)
+        if q is None:
+            with self._lock:
+                q = self._queues.get(key)
+                if q is None:
+                    q = self._queues[key] = queue.Queue(maxsize=max(1, self.queue_limit))
+                    threading.Thread(target=self._worker, args=(key, q), daemon=True,
+                                     name=f"micro-batch-{self.name}-{key}").start()
+        return q
+
+    def submit(self, key, record):
+        """加入 key 对应模型的队列，返回 Future，结果为单条预测的结果字典；队列已满时抛出 ExecutorOverloaded"""
+        future = Future()
+        try:
+            self._queue_for(key).put_nowait((record, future))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise ExecutorOverloaded(f"合批队列已满（{self.queue_limit}）")
+        return future
+
+    def predict(self, key, record, timeout=None):
+        """同步等待单条结果；timeout 秒内未完成时取消该请求（尚未计算的不再计算）并抛出 ExecutorOverloaded"""
+        future = self.submit(key, record)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            with self._lock:
+                self.timed_out += 1
+            raise ExecutorOverloaded(f"合批预测超过 {timeout:g} 秒未完成") from None
+
+    def _collect(self, q):
+        """阻塞取第一条，然后在窗口内继续收集，直到凑满或窗口结束"""
+        batch = [q.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(q.get(timeout=remaining) if remaining > 0 else q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self, key, q):
+        while True:
+            batch = self._collect(q)
+            # 客户端已放弃（超时取消）的请求不再计算
+            batch = [(record, future) for record, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            with self._lock:
+                self.batches += 1
+                self.rows += len(batch)
+            try:
+                result = self.run_batch(key, [record for record, _ in batch])
+            except Exception as e:
+                log.warning("%s 合批预测失败（%d 条）: %s", self.name, len(batch), e)
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            if "error" in result:
+                for _, future in batch:
+                    future.set_result({"error": result["error"]})
+                continue
+            for (_, future), row in zip(batch, result["results"]):
+                row = dict(row)
+                row.pop("index", None)
+                future.set_result(row)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "window_ms": self.window * 1000,
+                "max_size": self.max_size,
+                "queue_limit": self.queue_limit,
+                "queued": sum(q.qsize() for q in self._queues.values()),
+                "batches": self.batches,
+                "rows": self.rows,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "mean_batch_size": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            }
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+model_artifacts.py
+模型文件的保存与加载
+支持两种格式（环境变量 MODEL_ARTIFACT_FORMAT）：
+1. pickle：原有格式，<name>.pkl
+2. native：NumPy 数组较多的模型用 joblib 保存（<name>.joblib），加载时内存映射，多个进程共享同一份页缓存；
+   XGBoost 模型用其原生 UBJ 格式保存提升树（<name>.ubj），前面的预处理步骤仍用 joblib
+加载时优先使用 native 格式，不存在时回退到 pickle
+"""
+
+import os
+import pickle
+
+import joblib
+
+ARTIFACT_FORMAT = os.environ.get("MODEL_ARTIFACT_FORMAT", "pickle")  # pickle 或 native
+MMAP_MODE = os.environ.get("MODEL_MMAP_MODE", "r") or None  # 设为空字符串可关闭内存映射
+
+NATIVE_SUFFIXES = (".joblib", ".ubj")
+PICKLE_SUFFIX = ".pkl"
+
+
+def _tmp_path(path):
+    root, suffix = os.path.splitext(path)
+    return f"{root}.tmp{suffix}"  # 保留扩展名，XGBoost 按扩展名决定保存格式
+
+
+def _write_all(writers):
+    """
+    writers: [(目标路径, 写入函数)]。先全部写入临时文件，都成功后再逐个原子替换：
+    正在内存映射旧文件的进程仍读取旧 inode，写入失败或中断时旧文件保持不变
+    """
+    tmp_paths = []
+    try:
+        for path, write in writers:
+            tmp_paths.append(_tmp_path(path))
+            write(tmp_paths[-1])
+    except BaseException:
+        for tmp_path in tmp_paths:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise
+    for path, _ in writers:
+        os.replace(_tmp_path(path), path)
+    return [path for path, _ in writers]
+
+
+def _is_xgboost_pipeline(obj):
+    """最后一步是 XGBoost 模型的 sklearn Pipeline"""
+    steps = getattr(obj, "steps", None)
+    return bool(steps) and len(steps) > 1 and type(steps[-1][1]).__module__.startswith("xgboost")
+
+
+def artifact_path(base_path):
+    """返回加载时会使用的主文件路径，不存在时返回 None"""
+    for suffix in (".joblib", PICKLE_SUFFIX):
+        if os.path.exists(base_path + suffix):
+            return base_path + suffix
+    return None
+
+
+def artifact_exists(base_path):
+    return artifact_path(base_path) is not None
+
+
+def artifact_format(base_path):
+    """已保存模型的格式（pickle 或 native，与 load_artifact 的选择一致），不存在时返回 None"""
+    path = artifact_path(base_path)
+    if path is None:
+        return None
+    return "pickle" if path.endswith(PICKLE_SUFFIX) else "native"
+
+
+def save_artifact(obj, base_path, fmt=None):
+    """保存模型，base_path 不带扩展名；返回写入的文件列表"""
+    fmt = fmt or ARTIFACT_FORMAT
+    if fmt not in ("pickle", "native"):
+        raise ValueError(f"未知的模型格式: {fmt}")
+
+    if fmt == "pickle":
+        def write_pickle(path):
+            with open(path, "wb") as f:
+                pickle.dump(obj, f)
+        writers = [(base_path + PICKLE_SUFFIX, write_pickle)]
+    elif _is_xgboost_pipeline(obj):
+        from sklearn.pipeline import Pipeline
+
+        preprocess = Pipeline(obj.steps[:-1])
+        writers = [
+            (base_path + ".joblib", lambda path: joblib.dump(preprocess, path)),
+            (base_path + ".ubj", obj.steps[-1][1].save_model),
+        ]
+    else:
+        # 不压缩，才能在加载时内存映射其中的 NumPy 数组
+        writers = [(base_path + ".joblib", lambda path: joblib.dump(obj, path))]
+
+    paths = _write_all(writers)
+    # 新文件就位后再删除其他格式的旧文件，避免加载到过期版本；任何时刻磁盘上都有一份完整的模型
+    for suffix in NATIVE_SUFFIXES + (PICKLE_SUFFIX,):
+        stale = base_path + suffix
+        if stale not in paths and os.path.exists(stale):
+            os.remove(stale)
+    return paths
+
+
+def load_artifact(base_path, mmap_mode=MMAP_MODE):
+    """加载模型，优先 native 格式；文件不存在时抛出 FileNotFoundError"""
+    joblib_path = base_path + ".joblib"
+    if os.path.exists(joblib_path):
+        obj = joblib.load(joblib_path, mmap_mode=mmap_mode)
+        if os.path.exists(base_path + ".ubj"):
+            from sklearn.pipeline import Pipeline
+            from xgboost import XGBRegressor
+
+            booster = XGBRegressor()
+            booster.load_model(base_path + ".ubj")
+            obj = Pipeline(obj.steps + [("model", booster)])
+        return obj
+
+    with open(base_path + PICKLE_SUFFIX, "rb") as f:
+        return pickle.load(f)
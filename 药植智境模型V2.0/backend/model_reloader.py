@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+model_reloader.py
+模型热更新：不重启服务即可加载重新训练后的模型
+功能：
+1. ModelSlot 持有当前生效的预测器，新版本在后台加载并通过冒烟测试后整体替换引用，请求不会等待加载
+2. ModelReloader 轮询模型文件的修改时间/大小（MODEL_WATCH_INTERVAL 秒，0 表示关闭），
+   文件稳定后自动触发重新加载；也可通过管理接口手动触发
+3. 多 worker 部署时，手动触发写入一个共享的请求文件（MODEL_RELOAD_REQUEST_PATH），
+   各 worker 的监视线程发现请求编号变化后各自重新加载；监视关闭时只有处理该请求的 worker 会重新加载
+"""
+
+import json
+import os
+import threading
+import time
+
+from prediction_logging import get_logger
+
+WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", "0"))
+RELOAD_REQUEST_PATH = os.environ.get(
+    "MODEL_RELOAD_REQUEST_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".reload_request.json"))
+
+log = get_logger("reloader")
+
+
+class ModelSlot:
+    def __init__(self, name, loader, validator, watch_paths):
+        """
+        loader: 无参函数，返回新的预测器，失败时抛出异常
+        validator: 接收新预测器，冒烟测试不通过时抛出异常
+        watch_paths: 无参函数，返回需要监视的模型文件/目录列表
+        """
+        self.name = name
+        self.loader = loader
+        self.validator = validator
+        self.watch_paths = watch_paths
+        self.version = 0
+        self.loaded_at = None
+        self.last_error = None
+        self.fingerprint = None
+        self.rejected_fingerprint = None  # 校验失败的文件版本，监视线程不再重复尝试
+        self.listeners = []  # 切换成功后调用 listener(slot)，用于重建依赖当前模型的派生数据
+        self._current = None
+        self._reload_lock = threading.Lock()
+
+    def get(self):
+        """当前生效的预测器（读取引用是原子操作，无需加锁）"""
+        return self._current
+
+    def reload(self):
+        """加载并校验新版本，成功后替换；同一时间只允许一个重新加载任务"""
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        fingerprint = None
+        try:
+            fingerprint = file_fingerprint(self.watch_paths())
+            started = time.time()
+            predictor = self.loader()
+            self.validator(predictor)
+            self._current = predictor
+            self.fingerprint = fingerprint
+            self.version += 1
+            self.loaded_at = time.time()
+            self.last_error = None
+            log.info("%s 模型已切换到版本 %d，耗时 %.2fs", self.name, self.version, self.loaded_at - started)
+            self._notify()
+            return True
+        except Exception as e:
+            self.last_error = str(e)
+            self.rejected_fingerprint = fingerprint
+            log.warning("%s 模型重新加载失败，继续使用当前版本: %s", self.name, e)
+            if self._current is None:
+                raise
+            return False
+        finally:
+            self._reload_lock.release()
+
+    def _notify(self):
+        for listener in self.listeners:
+            try:
+                listener(self)
+            except Exception as e:
+                log.warning("%s 模型切换后的回调失败: %s", self.name, e)
+
+    @property
+    def reloading(self):
+        return self._reload_lock.locked()
+
+    def status(self):
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "reloading": self.reloading,
+            "last_error": self.last_error,
+        }
+
+
+def file_fingerprint(paths):
+    """文件路径、修改时间和大小组成的指纹，目录会展开一层，忽略写入中的临时文件"""
+    entries = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+        else:
+            files = [path]
+        for file_path in files:
+            if ".tmp" in os.path.basename(file_path) or not os.path.isfile(file_path):
+                continue
+            stat = os.stat(file_path)
+            entries.append((file_path, stat.st_mtime_ns, stat.st_size))
+    return tuple(entries)
+
+
+def read_reload_request(path):
+    """读取共享的重新加载请求，不存在或无法解析时返回 None"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class ModelReloader:
+    def __init__(self, slots, interval=None, request_path=None):
+        self.slots = {slot.name: slot for slot in slots}
+        self.interval = WATCH_INTERVAL if interval is None else interval
+        self.request_path = request_path or RELOAD_REQUEST_PATH
+        self._watcher = None
+        self._seen_request = None  # 本进程已处理的请求编号
+
+    @property
+    def watching(self):
+        return self._watcher is not None and self._watcher.is_alive()
+
+    def broadcast(self, names=None):
+        """写入重新加载请求，所有 worker 的监视线程在下一轮检查时重新加载；返回请求编号"""
+        request_id = f"{time.time_ns()}-{os.getpid()}"
+        tmp_path = f"{self.request_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"id": request_id, "names": names}, f)
+        os.replace(tmp_path, self.request_path)
+        self._seen_request = request_id  # 当前进程由调用方直接重新加载
+        return request_id
+
+    def trigger(self, names=None, wait=False):
+        """在后台线程中重新加载指定模型；wait=True 时等待完成"""
+        threads = []
+        for name in names or list(self.slots):
+            slot = self.slots[name]
+            if slot.reloading:
+                continue
+            thread = threading.Thread(target=self._safe_reload, args=(slot,), daemon=True,
+                                      name=f"reload-{name}")
+            thread.start()
+            threads.append(thread)
+        if wait:
+            for thread in threads:
+                thread.join()
+        return self.status()
+
+    def status(self):
+        return {name: slot.status() for name, slot in self.slots.items()}
+
+    def start_watching(self):
+        """启动文件监视线程（每个进程一个，gunicorn 下需在 fork 之后调用）"""
+        if self.interval <= 0 or self.watching:
+            return
+        # 启动前已存在的请求视为已处理，新 worker 不会因旧请求重复加载
+        request = read_reload_request(self.request_path)
+        self._seen_request = request and request.get("id")
+        self._watcher = threading.Thread(target=self._watch, daemon=True, name="model-watcher")
+        self._watcher.start()
+        log.info("已启动模型文件监视，间隔 %.1fs", self.interval)
+
+    def _watch(self):
+        pending = {}  # 上一轮看到的新指纹；连续两轮一致才加载，避免读到写了一半的文件
+        while True:
+            time.sleep(self.interval)
+            self._check_request()
+            for name, slot in self.slots.items():
+                try:
+                    fingerprint = file_fingerprint(slot.watch_paths())
+                except OSError:
+                    continue
+                if fingerprint in (slot.fingerprint, slot.rejected_fingerprint):
+                    pending.pop(name, None)
+                elif pending.get(name) == fingerprint:
+                    pending.pop(name)
+                    log.info("检测到 %s 模型文件更新，开始重新加载", name)
+                    self._safe_reload(slot)
+                else:
+                    pending[name] = fingerprint
+
+    def _check_request(self):
+        request = read_reload_request(self.request_path)
+        if not request or request.get("id") == self._seen_request:
+            return
+        self._seen_request = request.get("id")
+        names = [name for name in request.get("names") or list(self.slots) if name in self.slots]
+        log.info("收到重新加载请求 %s: %s", self._seen_request, names)
+        for name in names:
+            self._safe_reload(self.slots[name])
+
+    @staticmethod
+    def _safe_reload(slot):
+        try:
+            slot.reload()
+        except Exception:
+            pass  # 失败信息已记录在 slot.last_error
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+prediction_cache.py
+进程内预测结果缓存（LRU + TTL）
+功能：
+1. 以“模型名 + 按精度取整后的输入”为键，前端拖动滑块产生的相近输入可以命中同一条缓存
+2. 统计命中/未命中/淘汰/过期次数
+3. 模型重新加载时整体清空
+配置（环境变量）：PREDICTION_CACHE_SIZE（0 表示关闭）、PREDICTION_CACHE_TTL（秒）、PREDICTION_CACHE_PRECISION（小数位数）
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "4096"))
+CACHE_TTL = float(os.environ.get("PREDICTION_CACHE_TTL", "300"))
+CACHE_PRECISION = int(os.environ.get("PREDICTION_CACHE_PRECISION", "4"))
+
+
+class PredictionCache:
+    def __init__(self, maxsize=None, ttl=None, precision=None):
+        self.maxsize = CACHE_SIZE if maxsize is None else maxsize
+        self.ttl = CACHE_TTL if ttl is None else ttl
+        self.precision = CACHE_PRECISION if precision is None else precision
+        self._entries = OrderedDict()  # key -> (过期时间, 结果)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def make_key(self, model_name, values):
+        """values 为按固定特征顺序排列的数值，取整后作为缓存键；无法转换为数值时返回 None"""
+        try:
+            return (model_name,) + tuple(round(float(v), self.precision) for v in values)
+        except (TypeError, ValueError):
+            return None
+
+    def get(self, key):
+        """命中时返回结果的浅拷贝，否则返回 None"""
+        if key is None or not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, result = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(result)
+
+    def put(self, key, result):
+        """只缓存成功的结果"""
+        if key is None or not self.enabled or "error" in result:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """模型重新加载后调用，使全部缓存失效"""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "precision": self.precision,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
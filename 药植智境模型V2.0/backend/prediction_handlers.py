@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+prediction_handlers.py
+预测接口的处理逻辑，与 Web 框架无关
+Flask 视图（app.py）和 ASGI 入口（asgi.py）共用；每个函数接收预测器和已解析的请求体，
+返回 (响应体, 状态码)
+"""
+
+import os
+from functools import wraps
+
+from astragalus_predictor import MODEL_NAMES
+from bioclim import BIO_NAMES
+from inference_executor import ExecutorOverloaded, INFERENCE_TIMEOUT
+from request_metrics import set_model, stage
+
+# 单次批量请求允许的最大记录数
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "10000"))
+
+
+INVALID_JSON_ERROR = "请求体必须是合法的 JSON 对象"
+
+
+def json_object_required(handler):
+    """请求体缺失、不是合法 JSON（框架解析结果为 None）或不是对象时直接返回 400"""
+    @wraps(handler)
+    def wrapper(predictor, data, *args, **kwargs):
+        if not isinstance(data, dict):
+            return {"error": INVALID_JSON_ERROR}, 400
+        return handler(predictor, data, *args, **kwargs)
+    return wrapper
+
+
+def _check_records(data):
+    """校验批量请求的 records 字段，返回 (records, 错误响应)"""
+    records = data['records']
+    if not isinstance(records, list):
+        return None, ({"error": "records 必须是数组"}, 400)
+    if len(records) > MAX_BATCH_SIZE:
+        return None, ({"error": f"单次最多 {MAX_BATCH_SIZE} 条记录"}, 400)
+    return records, None
+
+
+def _model_label(model_name):
+    """指标中的模型名标签：只允许已知模型，客户端传入的其他字符串统一记为 invalid，避免标签数量无限增长"""
+    return model_name if model_name in MODEL_NAMES else "invalid"
+
+
+def parse_astragalus_request(data):
+    """单条请求 -> (模型名, 输入记录)，字段缺失或无法转换为数值时抛出异常"""
+    if not isinstance(data, dict):
+        raise ValueError(INVALID_JSON_ERROR)
+    # 从请求中获取模型名称，如果没有提供则使用默认值
+    model_name = data.get('model_name', 'XGBoost')
+    record = {
+        'root_length': float(data['root_length']),
+        'yield': float(data['yield']),
+        'c7g_content': float(data['c7g_content'])
+    }
+    return model_name, record
+
+
+@json_object_required
+def astragalus_predict(predictor, data, batcher=None):
+    """处理根长、产量和C7G含量的预测请求；传入 batcher 时与并发请求合批计算"""
+    try:
+        model_name, record = parse_astragalus_request(data)
+        set_model(_model_label(model_name))
+        if batcher is not None and model_name in MODEL_NAMES:  # 无效模型名不建队列，直接返回错误
+            with stage("micro_batch"):
+                return batcher.predict(model_name, record, timeout=INFERENCE_TIMEOUT), 200
+        return predictor.predict(record, model_name=model_name), 200
+    except ExecutorOverloaded as e:
+        return {"error": str(e)}, 503
+    except Exception as e:
+        return {"error": str(e)}, 400
+
+
+@json_object_required
+def astragalus_predict_ensemble(predictor, data):
+    """四个模型集成预测，返回均值和区间"""
+    try:
+        _, record = parse_astragalus_request(data)
+        set_model("ensemble")
+        return predictor.predict_ensemble(record), 200
+    except Exception as e:
+        return {"error": str(e)}, 400
+
+
+@json_object_required
+def astragalus_predict_batch(predictor, data):
+    """批量处理根长、产量和C7G含量的预测请求"""
+    try:
+        records, error = _check_records(data)
+        if error:
+            return error
+
+        model_name = data.get('model_name', 'XGBoost')
+        set_model(_model_label(model_name))
+        result = predictor.predict_batch(records, model_name=model_name)
+        return result, 400 if "error" in result else 200
+    except Exception as e:
+        return {"error": str(e)}, 400
+
+
+def parse_climate_request(data):
+    """单条请求 -> (合批队列名, 输入记录)"""
+    if not isinstance(data, dict):
+        raise ValueError(INVALID_JSON_ERROR)
+    return "climate", data
+
+
+@json_object_required
+def climate_predict(predictor, data, batcher=None):
+    """处理气候因子的预测请求；传入 batcher 时与并发请求合批计算"""
+    try:
+        set_model("climate")
+        if batcher is not None:
+            key, record = parse_climate_request(data)
+            with stage("micro_batch"):
+                return batcher.predict(key, record, timeout=INFERENCE_TIMEOUT), 200
+        return predictor.predict(data), 200
+    except ExecutorOverloaded as e:
+        return {"error": str(e)}, 503
+    except Exception as e:
+        return {"error": str(e)}, 400
+
+
+@json_object_required
+def climate_predict_batch(predictor, data):
+    """批量处理多个站点气候因子的预测请求"""
+    try:
+        set_model("climate")
+        records, error = _check_records(data)
+        if error:
+            return error
+
+        result = predictor.predict_batch(records)
+        return result, 400 if "error" in result else 200
+    except Exception as e:
+        return {"error": str(e)}, 400
+
+
+@json_object_required
+def climate_predict_by_location(predictor, data, raster=None):
+    """
+    按经纬度预测：从本地气候栅格取 bio1–bio19 后交给气候模型
+    请求体为 {"lat", "lon"} 或 {"locations": [{"lat", "lon"}, ...]}，可选 "method": nearest/bilinear
+    """
+    if raster is None:
+        return {"error": "未配置气候栅格（CLIMATE_RASTER_DIR）"}, 404
+    try:
+        set_model("climate")
+        method = data.get('method', 'bilinear')
+        single = 'locations' not in data
+        if single:
+            locations = [data]
+        else:
+            locations, error = _check_records({'records': data['locations']})
+            if error:
+                return error
+        lats = [float(location['lat']) for location in locations]
+        lons = [float(location['lon']) for location in locations]
+
+        with stage("sample"):
+            values, valid = raster.sample(lats, lons, method=method)
+        records = [dict(zip(BIO_NAMES, row.tolist())) for row in values[valid]]
+        batch = predictor.predict_batch(records) if records else {"results": []}
+        if "error" in batch:
+            return batch, 400
+        predictions = iter(batch["results"])
+    except Exception as e:
+        return {"error": str(e)}, 400
+
+    results = []
+    for i, (lat, lon, ok) in enumerate(zip(lats, lons, valid)):
+        location = {"lat": lat, "lon": lon}
+        if not ok:
+            results.append({"index": i, "location": location, "error": "坐标超出栅格范围或该处无数据"})
+            continue
+        row = next(predictions)
+        bio = dict(zip(BIO_NAMES, (round(v, 4) for v in values[i].tolist())))
+        results.append({**row, "index": i, "location": location, "bio": bio})
+
+    if single:
+        result = results[0]
+        result.pop("index")
+        return result, 400 if "error" in result else 200
+    return {
+        "count": len(results),
+        "error_count": sum("error" in row for row in results),
+        "method": method,
+        "results": results
+    }, 200
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+prediction_logging.py
+预测服务的日志工具
+功能：
+1. 统一配置两个预测器的日志级别（环境变量 PREDICTION_LOG_LEVEL）
+2. 调试详情按 1/N 采样输出（环境变量 PREDICTION_LOG_SAMPLE_RATE），未采样的请求不做任何格式化
+"""
+
+import itertools
+import logging
+import os
+
+LOGGER_NAMESPACE = "predictors"
+LOG_LEVEL = os.environ.get("PREDICTION_LOG_LEVEL", "INFO")
+LOG_SAMPLE_RATE = int(os.environ.get("PREDICTION_LOG_SAMPLE_RATE", "100"))  # 每 N 次请求记录一次调试详情，0 表示关闭
+
+_sample_rate = LOG_SAMPLE_RATE
+
+
+class SampledLogger:
+    """带采样的日志记录器，热路径上先调用 sampled() 再决定是否构造调试信息"""
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(f"{LOGGER_NAMESPACE}.{name}")
+        self._counter = itertools.count()
+
+    def sampled(self):
+        """当前请求是否需要输出调试详情"""
+        if _sample_rate <= 0 or not self.logger.isEnabledFor(logging.DEBUG):
+            return False
+        return next(self._counter) % _sample_rate == 0
+
+    def debug(self, msg, *args):
+        self.logger.debug(msg, *args)
+
+    def info(self, msg, *args):
+        self.logger.info(msg, *args)
+
+    def warning(self, msg, *args):
+        self.logger.warning(msg, *args)
+
+
+def get_logger(name):
+    """获取某个预测器的采样日志记录器"""
+    return SampledLogger(name)
+
+
+def configure_logging(level=None, sample_rate=None):
+    """配置预测器日志级别和采样率，未传入时使用环境变量"""
+    global _sample_rate
+    if sample_rate is not None:
+        _sample_rate = int(sample_rate)
+
+    level = level or LOG_LEVEL
+    if isinstance(level, str):
+        level = level.upper()
+
+    logger = logging.getLogger(LOGGER_NAMESPACE)
+    logger.setLevel(level)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    return logger
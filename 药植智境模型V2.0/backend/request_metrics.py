@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+request_metrics.py
+请求级耗时统计，以 Prometheus 文本格式导出
+功能：
+1. track(route, model) 包住一次请求：记录总耗时直方图、请求计数、错误计数和进行中请求数
+2. stage(name) 记录请求内部各阶段（JSON 解析、构造输入、预处理、模型计算、序列化）的耗时直方图，
+   标签为所在请求的路由和模型名；当前请求通过 contextvars 传递，预测器内部无需传参
+3. 关闭时（REQUEST_METRICS_ENABLED=0）stage() 直接返回共享的空上下文，热路径上只多一次函数调用
+注意：统计数据保存在进程内，gunicorn 多 worker 时每个 worker 各自计数
+"""
+
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+METRICS_ENABLED = os.environ.get("REQUEST_METRICS_ENABLED", "1") == "1"
+
+# 直方图分桶上界（秒）
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NULL_CONTEXT = nullcontext()
+_current = contextvars.ContextVar("request_metrics_current", default=None)
+
+
+class Histogram:
+    """固定分桶的累计直方图，按标签组合分别计数"""
+
+    def __init__(self, name, help_text, label_names, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [各桶计数..., +Inf 计数, 总和]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            base = _format_labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{base},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{base}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names, kind="counter"):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.kind = kind
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{{{_format_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+
+def _format_labels(names, values):
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+REQUEST_DURATION = Histogram("predictor_request_duration_seconds", "请求总耗时",
+                             ("route", "model", "status"))
+STAGE_DURATION = Histogram("predictor_stage_duration_seconds", "请求内各阶段耗时",
+                           ("route", "model", "stage"))
+REQUESTS_TOTAL = Counter("predictor_requests_total", "请求数", ("route", "model", "status"))
+ERRORS_TOTAL = Counter("predictor_errors_total", "失败请求数（状态码 >= 400 或抛出异常）", ("route", "model"))
+IN_FLIGHT = Counter("predictor_requests_in_flight", "进行中的请求数", ("route",), kind="gauge")
+
+ALL_METRICS = (REQUEST_DURATION, STAGE_DURATION, REQUESTS_TOTAL, ERRORS_TOTAL, IN_FLIGHT)
+
+
+class RequestTimer:
+    """一次请求的标签；视图函数可以在解析出模型名/状态码后再补上"""
+
+    __slots__ = ("route", "model", "status")
+
+    def __init__(self, route, model):
+        self.route = route
+        self.model = model
+        self.status = 200
+
+
+@contextmanager
+def track(route, model=""):
+    """统计一次请求；关闭时不做任何记录"""
+    if not METRICS_ENABLED:
+        yield None
+        return
+
+    timer = RequestTimer(route, model)
+    token = _current.set(timer)
+    IN_FLIGHT.inc((route,))
+    started = time.perf_counter()
+    try:
+        yield timer
+    except Exception as e:
+        # werkzeug 的 HTTPException（如请求体无法解析时的 BadRequest）带有状态码，按其状态码记录
+        code = getattr(e, "code", None)
+        timer.status = code if isinstance(code, int) else 500
+        raise
+    except BaseException:
+        timer.status = 500
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        IN_FLIGHT.inc((route,), -1)
+        _current.reset(token)
+        status = str(timer.status)
+        REQUEST_DURATION.observe((route, timer.model, status), elapsed)
+        REQUESTS_TOTAL.inc((route, timer.model, status))
+        if timer.status >= 400:
+            ERRORS_TOTAL.inc((route, timer.model))
+
+
+def set_model(model):
+    """为当前请求补充模型名标签"""
+    timer = _current.get()
+    if timer is not None:
+        timer.model = model
+
+
+@contextmanager
+def _timed_stage(timer, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.observe((timer.route, timer.model, name), time.perf_counter() - started)
+
+
+def stage(name):
+    """记录当前请求中某个阶段的耗时；不在请求内或已关闭时返回空上下文"""
+    timer = _current.get()
+    if timer is None:
+        return _NULL_CONTEXT
+    return _timed_stage(timer, name)
+
+
+def render():
+    """Prometheus 文本格式"""
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -24,6 +24,24 @@ def test_api():
     print("RandomForest模型预测结果:", response.json())
     print()
 
+    print("=== 测试黄芪集成预测 ===")
+    response = requests.post(f"{BASE_URL}/api/astragalus/predict/ensemble", json=data)
+    print("集成预测结果:", response.json())
+    print()
+
+    print("=== 测试黄芪批量预测 ===")
+    batch_data = {
+        "model_name": "XGBoost",
+        "records": [
+            {"root_length": 10.5, "yield": 200.0, "c7g_content": 0.8},
+            {"root_length": 32.5, "yield": 142.0, "c7g_content": 0.038},
+            {"root_length": 12.0, "yield": 180.0}
+        ]
+    }
+    response = requests.post(f"{BASE_URL}/api/astragalus/predict/batch", json=batch_data)
+    print("批量预测结果:", response.json())
+    print()
+
     print("=== 测试气候预测 ===")
     climate_data = {
         "bio1": 15.0,
@@ -34,6 +52,23 @@ def test_api():
     }
     response = requests.post(f"{BASE_URL}/api/climate/predict", json=climate_data)
     print("气候预测结果:", response.json())
+    print()
+
+    print("=== 测试气候批量预测 ===")
+    batch_climate = {
+        "records": [
+            climate_data,
+            {"bio15": 114.2, "bio16": 193.0, "bio17": 7.0, "bio18": 193.0, "bio19": 7.0}
+        ]
+    }
+    response = requests.post(f"{BASE_URL}/api/climate/predict/batch", json=batch_climate)
+    print("气候批量预测结果:", response.json())
+    print()
+
+    print("=== 测试按经纬度预测（需配置 CLIMATE_RASTER_DIR）===")
+    response = requests.post(f"{BASE_URL}/api/climate/predict/by-location",
+                             json={"lat": 35.5, "lon": 104.6, "method": "bilinear"})
+    print("按经纬度预测结果:", response.json())
 
 if __name__ == "__main__":
     test_api()
\ No newline at end of file
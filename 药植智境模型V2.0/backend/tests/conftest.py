@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""后端模块均为平铺的脚本式模块，测试时把 backend 目录加入导入路径"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_astragalus_dataset():
+    """写出含三个特征列和 source 列的 CSV，返回路径"""
+    import numpy as np
+    import pandas as pd
+
+    import astragalus_predictor as ap
+
+    def make(path, n_rows, seed):
+        rng = np.random.default_rng(seed)
+        frame = pd.DataFrame(rng.uniform(1, 10, size=(n_rows, len(ap.FEATURE_COLUMNS))),
+                             columns=list(ap.FEATURE_COLUMNS.values()))
+        frame["source"] = frame.sum(axis=1) + rng.normal(scale=0.1, size=n_rows)
+        frame.to_csv(path, index=False)
+        return str(path)
+    return make
+
+
+@pytest.fixture
+def astragalus_models(tmp_path, monkeypatch, make_astragalus_dataset):
+    """在临时目录中训练四个产量模型，XGBoost 以 native 格式保存，其余以 pickle 保存"""
+    import pandas as pd
+    from sklearn.base import clone
+    from sklearn.pipeline import Pipeline
+
+    import astragalus_predictor as ap
+    from model_artifacts import save_artifact
+
+    monkeypatch.setattr(ap, "MODELS_DIR", str(tmp_path))
+    data = pd.read_csv(make_astragalus_dataset(tmp_path / "history.csv", 60, seed=0))
+    X, y = data[list(ap.FEATURE_COLUMNS.values())], data["source"].to_numpy()
+    preprocessor = ap.build_preprocessor().fit(X)
+    X_t = preprocessor.transform(X)
+    for name, estimator in ap.build_models().items():
+        estimator = clone(estimator).fit(X_t, y)
+        if name == "KNN":
+            ap.keep_training_set(estimator, X_t, y)
+        pipe = Pipeline(preprocessor.steps + [("model", estimator)])
+        save_artifact(pipe, ap.model_base_path(name), fmt="native" if name == "XGBoost" else "pickle")
+    return tmp_path
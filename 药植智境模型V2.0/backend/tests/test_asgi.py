@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""ASGI 入口：预测接口经推理线程池处理，其余接口转发给 Flask"""
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+pytest.importorskip("xgboost")
+pytest.importorskip("flask")
+pytest.importorskip("starlette")
+pytest.importorskip("a2wsgi")
+pytest.importorskip("httpx")
+
+from starlette.testclient import TestClient
+
+import asgi
+from inference_executor import ExecutorOverloaded
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(asgi.app) as client:
+        yield client
+
+
+def test_invalid_json_is_a_400(client):
+    response = client.post("/api/astragalus/predict/batch", content=b"{not json",
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+    assert "error" in response.json()
+
+
+def test_overload_is_a_503(client, monkeypatch):
+    def overloaded(*args, **kwargs):
+        raise ExecutorOverloaded("推理队列已满")
+    monkeypatch.setattr(asgi.executor, "submit", overloaded)
+
+    response = client.post("/api/astragalus/predict/batch", json={"records": []})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_inference_stats_and_flask_routes(client):
+    assert set(client.get("/api/system/inference").json()) >= {"workers", "queue_limit", "rejected"}
+    assert client.get("/api/astragalus/models").status_code == 200  # 由 Flask 处理
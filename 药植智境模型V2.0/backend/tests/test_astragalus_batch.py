@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""AstragalusPredictor.predict_batch：一次计算整批，逐行返回结果或错误"""
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+pytest.importorskip("xgboost")
+
+import astragalus_predictor as ap
+
+RECORDS = [
+    {"root_length": 30.0, "yield": 160.0, "c7g_content": 0.04},
+    {"root_length": 25.0, "yield": 120.0, "c7g_content": 0.03},
+]
+
+
+@pytest.fixture
+def predictor(astragalus_models):
+    predictor = ap.AstragalusPredictor(lazy=False)
+    assert predictor.is_loaded
+    return predictor
+
+
+@pytest.mark.parametrize("model_name", ap.MODEL_NAMES)
+def test_batch_matches_single_predictions(predictor, model_name):
+    result = predictor.predict_batch(RECORDS, model_name=model_name)
+    assert result["count"] == 2 and result["error_count"] == 0
+    for record, row in zip(RECORDS, result["results"]):
+        single = predictor.predict(record, model_name=model_name)
+        assert row["seed_id"] == single["seed_id"]
+
+
+def test_invalid_rows_get_their_own_errors(predictor, monkeypatch):
+    calls = []
+    predict = ap.pipeline_predict
+    monkeypatch.setattr(ap, "pipeline_predict", lambda model, X: calls.append(len(X)) or predict(model, X))
+
+    records = [RECORDS[0], {"root_length": 1.0}, {**RECORDS[1], "yield": "abc"}, {**RECORDS[1], "yield": "nan"},
+               RECORDS[1]]
+    result = predictor.predict_batch(records, model_name="RandomForest")
+
+    assert result["error_count"] == 3
+    assert [("error" in row) for row in result["results"]] == [False, True, True, True, False]
+    assert "yield" in result["results"][1]["error"]
+    assert [row["index"] for row in result["results"]] == list(range(5))
+    assert calls == [2]  # 合法的两行只调用一次模型
+
+
+def test_unknown_model_is_rejected(predictor):
+    assert "error" in predictor.predict_batch(RECORDS, model_name="SVM")
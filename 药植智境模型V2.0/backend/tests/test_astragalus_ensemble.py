@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""集成预测：四个模型一次完成，返回均值和区间"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+pytest.importorskip("xgboost")
+
+import astragalus_predictor as ap
+
+RECORD = {"root_length": 30.0, "yield": 160.0, "c7g_content": 0.04}
+
+
+@pytest.fixture
+def predictor(astragalus_models):
+    return ap.AstragalusPredictor(lazy=False)
+
+
+def test_ensemble_summarises_member_predictions(predictor):
+    result = predictor.predict_ensemble(RECORD)
+    X = np.array([[RECORD[key] for key in ap.FEATURE_COLUMNS]], dtype=np.float64)
+    members = np.array([ap.pipeline_predict(predictor.get_model(name), X)[0] for name in ap.MODEL_NAMES])
+
+    assert list(result["members"]) == ap.MODEL_NAMES
+    assert result["mean"] == pytest.approx(members.mean(), abs=1e-4)
+    assert result["std"] == pytest.approx(members.std(), abs=1e-4)
+    assert result["interval"] == pytest.approx([members.min(), members.max()], abs=1e-4)
+    assert result["interval"][0] <= result["mean"] <= result["interval"][1]
+    assert result["seed_id"] == int(round(members.mean()))
+
+
+def test_shared_preprocessing_runs_once(predictor, monkeypatch):
+    calls = []
+    transform = ap.pipeline_transform
+    monkeypatch.setattr(ap, "pipeline_transform", lambda model, X: calls.append(1) or transform(model, X))
+    predictor.predict_ensemble(RECORD)
+    assert len(calls) == 1  # 四个模型共用同一组预处理
+
+
+def test_lazy_mode_with_small_cache_is_rejected(astragalus_models):
+    predictor = ap.AstragalusPredictor(lazy=True, cache_size=2, preload=[])
+    assert "error" in predictor.predict_ensemble(RECORD)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""懒加载模式：模型缓存容量和热更新冒烟测试"""
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+pytest.importorskip("xgboost")
+
+import astragalus_predictor as ap
+
+RECORDS = [{"root_length": 30.0, "yield": 160.0, "c7g_content": 0.04}]
+
+
+@pytest.fixture
+def lazy_predictor(astragalus_models):
+    predictor = ap.AstragalusPredictor(lazy=True, cache_size=1, preload=["XGBoost"])
+    assert predictor.is_loaded
+    return predictor
+
+
+def test_validate_model_does_not_fill_the_cache(lazy_predictor, monkeypatch):
+    loaded = []
+    load = ap.load_inference_pipeline
+    monkeypatch.setattr(ap, "load_inference_pipeline", lambda name: loaded.append(name) or load(name))
+
+    for name in ap.MODEL_NAMES:
+        lazy_predictor.validate_model(name, RECORDS)
+    assert list(lazy_predictor.models) == ["XGBoost"]  # 预热的模型仍在缓存中
+    assert sorted(loaded) == sorted(name for name in ap.MODEL_NAMES if name != "XGBoost")
+
+
+def test_validate_model_reports_bad_input(lazy_predictor):
+    with pytest.raises(RuntimeError, match="KNN"):
+        lazy_predictor.validate_model("KNN", [{"root_length": 1.0}])
+
+
+def test_cache_evicts_least_recently_used(lazy_predictor):
+    assert "seed_id" in lazy_predictor.predict(RECORDS[0], model_name="KNN")
+    assert list(lazy_predictor.models) == ["KNN"]
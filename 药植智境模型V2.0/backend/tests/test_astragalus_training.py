@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""train_and_compare_models：各折预处理只拟合一次并在模型间共享"""
+
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+pytest.importorskip("xgboost")
+
+from sklearn.model_selection import KFold
+
+import astragalus_predictor as ap
+from model_artifacts import artifact_exists
+
+
+def test_fold_cache_matches_per_fold_preprocessing(tmp_path, make_astragalus_dataset):
+    data = pd.read_csv(make_astragalus_dataset(tmp_path / "data.csv", 40, seed=0))
+    X, y = data[list(ap.FEATURE_COLUMNS.values())], data["source"]
+    cache = ap.prepare_fold_cache(X, y)
+
+    assert len(cache["folds"]) == ap.CV_FOLDS
+    for (train_idx, test_idx), (X_train, y_train, X_test, _) in zip(KFold(n_splits=ap.CV_FOLDS).split(X),
+                                                                     cache["folds"]):
+        preprocessor = ap.build_preprocessor().fit(X.iloc[train_idx])
+        np.testing.assert_allclose(X_train, preprocessor.transform(X.iloc[train_idx]))
+        np.testing.assert_allclose(X_test, preprocessor.transform(X.iloc[test_idx]))
+        np.testing.assert_array_equal(y_train, y.iloc[train_idx].to_numpy())
+    np.testing.assert_allclose(cache["full"][0], ap.build_preprocessor().fit(X).transform(X))
+
+
+def test_train_and_compare_models_saves_every_model(tmp_path, monkeypatch, make_astragalus_dataset):
+    monkeypatch.setattr(ap, "DATA_PATH", make_astragalus_dataset(tmp_path / "data.csv", 40, seed=0))
+    monkeypatch.setattr(ap, "MODELS_DIR", str(tmp_path / "models"))
+    monkeypatch.setattr(ap, "RESULTS_PATH", str(tmp_path / "model_comparison.csv"))
+    os.makedirs(ap.MODELS_DIR)
+
+    ap.train_and_compare_models(n_jobs=1)
+
+    results = pd.read_csv(ap.RESULTS_PATH)
+    assert results["Model"].tolist() == ap.MODEL_NAMES
+    assert all(artifact_exists(ap.model_base_path(name)) for name in ap.MODEL_NAMES)
+    assert ap.load_pipeline("KNN").steps[-1][1].train_X_.shape[0] == 40
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""update_models 增量更新：随机森林追加树、XGBoost 继续提升、KNN 追加样本，并保持原有文件格式"""
+
+import os
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+pytest.importorskip("xgboost")
+
+import astragalus_predictor as ap
+from model_artifacts import artifact_format, load_artifact
+
+
+def test_update_models_extends_each_model(astragalus_models, make_astragalus_dataset):
+    before = {name: load_artifact(ap.model_base_path(name), mmap_mode=None).steps[-1][1] for name in ap.MODEL_NAMES}
+    ap.update_models(make_astragalus_dataset(astragalus_models / "season.csv", 20, seed=1))
+    after = {name: load_artifact(ap.model_base_path(name), mmap_mode=None).steps[-1][1] for name in ap.MODEL_NAMES}
+
+    assert len(after["RandomForest"].estimators_) == len(before["RandomForest"].estimators_) + ap.INCREMENTAL_RF_TREES
+    assert (after["XGBoost"].get_booster().num_boosted_rounds()
+            == before["XGBoost"].get_booster().num_boosted_rounds() + ap.INCREMENTAL_XGB_ROUNDS)
+    assert after["KNN"].train_X_.shape[0] == before["KNN"].train_X_.shape[0] + 20
+    assert after["KNN"].n_samples_fit_ == after["KNN"].train_X_.shape[0]
+
+
+def test_update_models_keeps_artifact_format(astragalus_models, make_astragalus_dataset):
+    ap.update_models(make_astragalus_dataset(astragalus_models / "season.csv", 20, seed=1))
+    assert artifact_format(ap.model_base_path("XGBoost")) == "native"
+    assert artifact_format(ap.model_base_path("RandomForest")) == "pickle"
+    assert not os.path.exists(ap.model_base_path("RandomForest") + ".joblib")
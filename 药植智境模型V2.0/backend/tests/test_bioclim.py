@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""bio1–bio19 的计算"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+
+from bioclim import BIO_NAMES, compute_bioclim
+
+
+def bio(values, name):
+    return values[..., BIO_NAMES.index(name)]
+
+
+@pytest.fixture
+def monthly():
+    tmin = np.array([-10, -8, -2, 4, 10, 15, 18, 17, 11, 4, -3, -9], dtype=np.float64)
+    tmax = tmin + 10
+    # 最湿的季度跨年（11、12、1 月），最干的季度为 5–7 月
+    prec = np.array([40, 20, 15, 10, 2, 1, 3, 12, 18, 25, 50, 60], dtype=np.float64)
+    return tmin, tmax, prec
+
+
+def test_temperature_variables(monthly):
+    tmin, tmax, prec = monthly
+    values = compute_bioclim(tmin, tmax, prec)
+    tavg = (tmin + tmax) / 2
+
+    assert bio(values, "bio1") == pytest.approx(tavg.mean())
+    assert bio(values, "bio2") == pytest.approx(10.0)
+    assert bio(values, "bio5") == pytest.approx(tmax.max())
+    assert bio(values, "bio6") == pytest.approx(tmin.min())
+    assert bio(values, "bio7") == pytest.approx(tmax.max() - tmin.min())
+    assert bio(values, "bio3") == pytest.approx(100 * 10.0 / (tmax.max() - tmin.min()))
+    assert bio(values, "bio4") == pytest.approx(100 * tavg.std(ddof=1))
+
+
+def test_quarters_wrap_around_the_year(monthly):
+    tmin, tmax, prec = monthly
+    values = compute_bioclim(tmin, tmax, prec)
+    tavg = (tmin + tmax) / 2
+
+    assert bio(values, "bio12") == pytest.approx(prec.sum())
+    assert bio(values, "bio16") == pytest.approx(50 + 60 + 40)  # 11、12、1 月
+    assert bio(values, "bio8") == pytest.approx(tavg[[10, 11, 0]].mean())
+    assert bio(values, "bio17") == pytest.approx(2 + 1 + 3)  # 5–7 月
+    assert bio(values, "bio9") == pytest.approx(tavg[[4, 5, 6]].mean())
+    prec1 = prec + 1
+    assert bio(values, "bio15") == pytest.approx(100 * prec1.std(ddof=1) / prec1.mean())
+
+
+def test_raster_shape_matches_per_site_result(monthly):
+    tmin, tmax, prec = monthly
+    shifts = np.arange(6, dtype=np.float64).reshape(2, 3, 1)
+    grid = compute_bioclim(tmin + shifts, tmax + shifts, prec + shifts)
+    assert grid.shape == (2, 3, 19)
+    np.testing.assert_allclose(grid[1, 2], compute_bioclim(tmin + 5, tmax + 5, prec + 5))
+
+
+def test_mismatched_shapes_are_rejected(monthly):
+    tmin, tmax, prec = monthly
+    with pytest.raises(ValueError):
+        compute_bioclim(tmin, tmax, prec[:11])
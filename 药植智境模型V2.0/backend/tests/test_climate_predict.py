@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""ClimateSeedModel.predict / predict_batch 的输入校验"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sklearn")
+
+from sklearn.ensemble import RandomForestClassifier
+
+from climate_seed_model import ClimateSeedModel
+from flat_forest import FlatForest
+
+FEATURES = ["bio1", "bio2", "bio3"]
+
+
+@pytest.fixture(scope="module")
+def model():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, len(FEATURES)))
+    y = (X[:, 0] > 0).astype(int) + 1
+    forest = RandomForestClassifier(n_estimators=10, max_depth=4, random_state=0).fit(X[:, :2], y)
+    model = ClimateSeedModel()
+    model.model = forest
+    model.flat_forest = FlatForest.from_sklearn(forest)
+    model.all_feature_names = FEATURES
+    model.feature_names = FEATURES[:2]
+    model.support_indices = np.array([0, 1])
+    model.column_index = {name: j for j, name in enumerate(FEATURES)}
+    model.is_loaded = True
+    return model
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", float("-inf"), "1e400"])
+def test_predict_rejects_non_finite_values(model, value):
+    result = model.predict({"bio1": value, "bio2": 0.5})
+    assert "error" in result and "bio1" in result["error"]
+
+
+def test_predict_batch_rejects_non_finite_rows_individually(model):
+    result = model.predict_batch([{"bio1": 1.0, "bio2": 0.5}, {"bio1": 1.0, "bio2": "nan"}, {"bio1": "x"}])
+    assert result["error_count"] == 2
+    assert "seed_id" in result["results"][0]
+    assert "bio2" in result["results"][1]["error"]
+    assert "error" in result["results"][2]
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""ClimateRaster 按经纬度取值"""
+
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+
+from bioclim import BIO_NAMES
+from climate_raster import ClimateRaster
+
+NODATA = -9999.0
+
+
+@pytest.fixture
+def raster(tmp_path):
+    """4 行 5 列，左上角 (lat 40, lon 100)，像元 1 度；图层 k 的像元 (r, c) 值为 k*100 + r*10 + c"""
+    height, width = 4, 5
+    with open(tmp_path / "grid.json", "w") as f:
+        json.dump({"height": height, "width": width, "lon_min": 100.0, "lat_max": 40.0,
+                   "cell_size": 1.0, "nodata": NODATA}, f)
+    rows, cols = np.mgrid[0:height, 0:width]
+    for k, name in enumerate(BIO_NAMES):
+        layer = (k * 100 + rows * 10 + cols).astype(np.float32)
+        layer[3, 4] = NODATA
+        np.save(tmp_path / f"{name}.npy", layer)
+    return ClimateRaster(str(tmp_path))
+
+
+def test_nearest_returns_cell_values(raster):
+    # 像元 (1, 2) 的中心为 (38.5, 102.5)
+    values, valid = raster.sample([38.5, 38.9], [102.5, 102.1])
+    assert valid.tolist() == [True, True]
+    expected = np.array([k * 100 + 12 for k in range(len(BIO_NAMES))], dtype=np.float64)
+    np.testing.assert_array_equal(values[0], expected)
+    np.testing.assert_array_equal(values[1], expected)
+
+
+def test_outside_and_nodata_are_invalid(raster):
+    values, valid = raster.sample([45.0, 36.5], [102.5, 104.5])  # 栅格以北；像元 (3, 4) 为无数据
+    assert valid.tolist() == [False, False]
+    assert np.isnan(values).all()
+
+
+def test_bilinear_interpolates_between_cell_centres(raster):
+    values, valid = raster.sample([38.5, 38.5], [102.5, 103.0], method="bilinear")
+    assert valid.all()
+    assert values[0, 0] == pytest.approx(12.0)  # 正好在像元中心
+    assert values[1, 0] == pytest.approx(12.5)  # 像元 (1, 2) 与 (1, 3) 中心的中点
+
+
+def test_bilinear_skips_nodata_corners(raster):
+    # (3, 3) 与 (3, 4) 中心的中点，(3, 4) 为无数据，只用 (3, 3) 的值
+    values, valid = raster.sample([36.5], [104.0], method="bilinear")
+    assert valid.all()
+    assert values[0, 0] == pytest.approx(33.0)
+
+
+def test_invalid_cells_are_nan_on_cache_hits_and_in_bilinear_mode(raster):
+    for _ in range(2):  # 第二次命中缓存中的无数据像元
+        values, valid = raster.sample([36.5], [104.5])
+        assert not valid[0]
+        assert np.isnan(values).all()
+    # 第一个点只有无数据角点有权重，第二个点在栅格外
+    values, valid = raster.sample([36.5, 45.0, 36.5], [104.5, 102.5, 104.0], method="bilinear")
+    assert valid.tolist() == [False, False, True]
+    assert np.isnan(values[:2]).all()
+    assert (values[2] != NODATA).all()
+
+
+def test_repeated_lookups_hit_the_cache(raster):
+    raster.sample([38.5], [102.5])
+    raster.sample([38.5], [102.5])
+    stats = raster.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+
+
+def test_unknown_method_is_rejected(raster):
+    with pytest.raises(ValueError):
+        raster.sample([38.5], [102.5], method="cubic")
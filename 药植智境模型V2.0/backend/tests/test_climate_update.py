@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""ClimateSeedModel.update 增量更新"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+
+import climate_seed_model
+from bioclim import BIO_NAMES
+from climate_seed_model import ClimateSeedModel
+
+
+def make_dataset(path, classes, rows_per_class, seed):
+    """各类别的 bio 变量均值不同，便于特征选择和分类"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for seed_id in classes:
+        values = rng.normal(loc=seed_id * 10.0, scale=1.0, size=(rows_per_class, len(BIO_NAMES)))
+        frame = pd.DataFrame(values, columns=BIO_NAMES)
+        frame["source"] = seed_id
+        frames.append(frame)
+    pd.concat(frames, ignore_index=True).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    """模型文件写入临时目录"""
+    monkeypatch.setattr(climate_seed_model, "MODEL_BASE", str(tmp_path / "climate_seed_model"))
+    monkeypatch.setattr(climate_seed_model, "SELECTOR_BASE", str(tmp_path / "climate_selector"))
+    monkeypatch.setattr(climate_seed_model, "FEATURE_NAMES_PATH", str(tmp_path / "climate_features.json"))
+    monkeypatch.setattr(climate_seed_model, "FLAT_FOREST_DIR", str(tmp_path / "climate_flat_forest"))
+    return tmp_path
+
+
+@pytest.fixture
+def trained(model_dir):
+    history = make_dataset(model_dir / "history.csv", [1, 2, 3], 40, seed=0)
+    model = ClimateSeedModel()
+    model.train(history)
+    return history, model.model.n_estimators
+
+
+def test_partial_season_updates_incrementally(model_dir, trained, monkeypatch):
+    history, n_before = trained
+    # 只覆盖部分种子来源的一季数据
+    season = make_dataset(model_dir / "season.csv", [1, 2], 10, seed=1)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("不应回退到完整重新训练")
+
+    monkeypatch.setattr(ClimateSeedModel, "train", fail)
+    ClimateSeedModel().update(season, data_path=history)
+
+    reloaded = ClimateSeedModel()
+    assert reloaded._load_models()
+    assert reloaded.model.n_estimators == n_before + climate_seed_model.INCREMENTAL_TREES
+    assert len(reloaded.model.estimators_) == reloaded.model.n_estimators
+    assert reloaded.model.classes_.tolist() == [1, 2, 3]
+
+    X = np.random.default_rng(2).normal(20.0, 5.0, size=(50, len(reloaded.feature_names)))
+    np.testing.assert_allclose(reloaded.flat_forest.predict_proba(X), reloaded.model.predict_proba(X))
+
+
+def test_unseen_seed_id_falls_back_to_full_retrain(model_dir, trained, monkeypatch):
+    history, _ = trained
+    season = make_dataset(model_dir / "season.csv", [1, 4], 10, seed=1)
+    calls = []
+    monkeypatch.setattr(ClimateSeedModel, "train", lambda self, data_path: calls.append(data_path))
+
+    ClimateSeedModel().update(season, data_path=history)
+    assert calls == [history]
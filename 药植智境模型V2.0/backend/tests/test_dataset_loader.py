@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""列式缓存与 read_csv 的一致性"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+from dataset_loader import build_cache, load_dataset, read_meta, _read_column
+
+
+def test_cache_matches_read_csv(tmp_path):
+    source = tmp_path / "data.csv"
+    pd.DataFrame({"a": [1.5, 2.0, None], "b": ["x", None, "z"]}).to_csv(source, index=False)
+    loaded = load_dataset(str(source), cache_dir=str(tmp_path / "cache"))
+    pd.testing.assert_frame_equal(loaded, pd.read_csv(source), check_dtype=False)
+
+
+def test_text_in_later_chunk_is_not_coerced_to_nan(tmp_path):
+    source = tmp_path / "data.csv"
+    source.write_text("a,b\n1,x\n2,y\noops,z\n", encoding="utf-8")
+    path = build_cache(str(source), str(tmp_path / "cache"), chunksize=2)  # 首个分块中 a 为数值列
+
+    meta = read_meta(path)
+    column = next(column for column in meta["columns"] if column["name"] == "a")
+    assert column["kind"] == "string"
+    assert _read_column(path, column, meta["n_rows"]).tolist() == pd.read_csv(source)["a"].tolist()
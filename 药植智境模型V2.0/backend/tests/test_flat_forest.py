@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""FlatForest 与 sklearn RandomForestClassifier 的输出一致性"""
+
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sklearn")
+
+from sklearn.ensemble import RandomForestClassifier
+
+import climate_seed_model
+from climate_seed_model import ClimateSeedModel, PARITY_ATOL
+from flat_forest import FlatForest
+from model_artifacts import artifact_exists
+
+
+@pytest.fixture(scope="module")
+def forest_and_data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 5))
+    y = np.digitize(X[:, 0] + 0.5 * X[:, 1], [-0.5, 0.5]) + 1  # 三个类别 1/2/3
+    forest = RandomForestClassifier(n_estimators=30, max_depth=6, random_state=0).fit(X, y)
+    X_test = rng.normal(size=(200, 5))
+    return forest, X_test
+
+
+def test_predict_proba_matches_sklearn(forest_and_data):
+    forest, X = forest_and_data
+    flat = FlatForest.from_sklearn(forest)
+    np.testing.assert_allclose(flat.predict_proba(X), forest.predict_proba(X), rtol=0, atol=PARITY_ATOL)
+    assert np.array_equal(flat.predict(X), forest.predict(X))
+
+
+def test_save_and_mmap_load_round_trip(forest_and_data, tmp_path):
+    forest, X = forest_and_data
+    FlatForest.from_sklearn(forest).save(str(tmp_path / "flat"))
+    loaded = FlatForest.load(str(tmp_path / "flat"), mmap_mode="r")
+    assert loaded.n_trees == len(forest.estimators_)
+    np.testing.assert_allclose(loaded.predict_proba(X), forest.predict_proba(X), rtol=0, atol=PARITY_ATOL)
+
+
+@pytest.mark.skipif(not artifact_exists(climate_seed_model.MODEL_BASE)
+                    or not os.path.exists(climate_seed_model.DATA_PATH),
+                    reason="仓库中没有已训练的气候模型或 final_input.csv")
+def test_shipped_model_parity_on_final_input():
+    """仓库自带的模型在 final_input.csv 上与扁平化森林一致（即 --check-parity 通过）"""
+    model = ClimateSeedModel()
+    assert model._load_models()
+    assert model.check_flat_forest_parity(climate_seed_model.DATA_PATH)
+
+
+def test_large_batches_fall_back_to_sklearn(forest_and_data, monkeypatch):
+    forest, X = forest_and_data
+    model = ClimateSeedModel()
+    model.model = forest
+    model.flat_forest = FlatForest.from_sklearn(forest)
+    monkeypatch.setattr(climate_seed_model, "FLAT_FOREST_MAX_ROWS", 10)
+
+    calls = []
+    monkeypatch.setattr(model.flat_forest, "predict_proba",
+                        lambda X_: calls.append(len(X_)) or FlatForest.predict_proba(model.flat_forest, X_))
+    np.testing.assert_allclose(model.predict_proba(X[:5]), forest.predict_proba(X[:5]), rtol=0, atol=PARITY_ATOL)
+    assert np.array_equal(model.predict_proba(X), forest.predict_proba(X))
+    assert calls == [5]
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""InferenceExecutor 的背压、截止时间和上下文传递"""
+
+import asyncio
+import contextvars
+import threading
+
+import pytest
+
+from inference_executor import DeadlineExceeded, ExecutorOverloaded, InferenceExecutor
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def test_full_queue_is_rejected():
+    executor = InferenceExecutor(max_workers=1, queue_limit=1, timeout=5)
+    release = threading.Event()
+    try:
+        running = executor.submit(release.wait, 5)
+        queued = executor.submit(lambda: "queued")
+        with pytest.raises(ExecutorOverloaded):
+            executor.submit(lambda: "rejected")
+        assert executor.stats()["rejected"] == 1
+
+        release.set()
+        assert running.result(timeout=5) is True
+        assert queued.result(timeout=5) == "queued"
+        executor.submit(lambda: None).result(timeout=5)  # 完成的任务释放名额
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_deadline_exceeded():
+    executor = InferenceExecutor(max_workers=1, queue_limit=1, timeout=0.05)
+    release = threading.Event()
+    try:
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(executor.run_async(release.wait, 5))
+        assert executor.stats()["timed_out"] == 1
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_task_runs_in_the_submitting_context():
+    executor = InferenceExecutor(max_workers=1, queue_limit=1, timeout=5)
+
+    async def handle():
+        request_id.set("req-1")
+        return await executor.run_async(request_id.get)
+
+    try:
+        assert asyncio.run(handle()) == "req-1"
+    finally:
+        executor.shutdown()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""推理路径直接输入 NumPy 数组：结果与按 DataFrame 预测一致，特征列顺序在加载时校验"""
+
+import warnings
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+pytest.importorskip("xgboost")
+
+from sklearn.pipeline import Pipeline
+
+import astragalus_predictor as ap
+from model_artifacts import save_artifact
+
+RECORD = {"root_length": 30.0, "yield": 160.0, "c7g_content": 0.04}
+
+
+@pytest.mark.parametrize("model_name", ap.MODEL_NAMES)
+def test_array_input_matches_dataframe_input(astragalus_models, model_name):
+    frame = pd.DataFrame([[RECORD[key] for key in ap.FEATURE_COLUMNS]], columns=list(ap.FEATURE_COLUMNS.values()))
+    expected = ap.load_pipeline(model_name).predict(frame)
+
+    model = ap.load_inference_pipeline(model_name)
+    X = np.array([[RECORD[key] for key in ap.FEATURE_COLUMNS]], dtype=np.float64)
+    with warnings.catch_warnings():
+        # 去掉列名后，输入数组不应再触发缺少特征名的警告
+        warnings.filterwarnings("error", message=".*feature names.*")
+        actual = ap.pipeline_predict(model, X)
+    np.testing.assert_allclose(actual, expected)
+
+
+def test_column_order_mismatch_is_rejected_at_load(astragalus_models):
+    columns = list(ap.FEATURE_COLUMNS.values())[::-1]
+    X = pd.DataFrame(np.random.default_rng(0).uniform(1, 10, size=(20, 3)), columns=columns)
+    pipe = Pipeline(ap.build_preprocessor().steps + [("model", ap.build_models()["KNN"])]).fit(X, X.sum(axis=1))
+    save_artifact(pipe, ap.model_base_path("KNN"), fmt="pickle")
+
+    with pytest.raises(ValueError, match="特征列"):
+        ap.load_inference_pipeline("KNN")
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""MicroBatcher 合批、错误分发和队列上限"""
+
+import threading
+
+import pytest
+
+from inference_executor import ExecutorOverloaded
+from micro_batcher import MicroBatcher
+
+
+def echo_batch(key, records):
+    return {"results": [{"index": i, "key": key, "value": record["x"] * 2} for i, record in enumerate(records)]}
+
+
+def test_results_are_routed_back_to_each_request():
+    batches = []
+
+    def run_batch(key, records):
+        batches.append(len(records))
+        return echo_batch(key, records)
+
+    batcher = MicroBatcher("test", run_batch, window_ms=50, max_size=16)
+    futures = [batcher.submit("m", {"x": i}) for i in range(8)]
+    results = [future.result(timeout=5) for future in futures]
+
+    assert results == [{"key": "m", "value": i * 2} for i in range(8)]
+    assert sum(batches) == 8
+    stats = batcher.stats()
+    assert stats["rows"] == 8
+    assert stats["batches"] == len(batches)
+
+
+def test_batch_error_is_returned_to_every_request():
+    batcher = MicroBatcher("test", lambda key, records: {"error": "模型未加载"}, window_ms=10)
+    futures = [batcher.submit("m", {"x": i}) for i in range(3)]
+    assert [future.result(timeout=5) for future in futures] == [{"error": "模型未加载"}] * 3
+
+
+def test_full_queue_is_rejected():
+    started = threading.Event()
+    release = threading.Event()
+
+    def run_batch(key, records):
+        started.set()
+        release.wait(5)
+        return echo_batch(key, records)
+
+    batcher = MicroBatcher("test", run_batch, window_ms=0, max_size=1, queue_limit=2)
+    first = batcher.submit("m", {"x": 0})
+    assert started.wait(5)  # 合批线程正在计算第一条，队列为空
+    queued = [batcher.submit("m", {"x": i}) for i in (1, 2)]
+    with pytest.raises(ExecutorOverloaded):
+        batcher.submit("m", {"x": 3})
+    assert batcher.stats()["rejected"] == 1
+
+    release.set()
+    assert first.result(timeout=5)["value"] == 0
+    assert [future.result(timeout=5)["value"] for future in queued] == [2, 4]
+
+
+def test_cancelled_requests_are_skipped():
+    started = threading.Event()
+    release = threading.Event()
+    seen = []
+
+    def run_batch(key, records):
+        started.set()
+        release.wait(5)
+        seen.extend(record["x"] for record in records)
+        return echo_batch(key, records)
+
+    batcher = MicroBatcher("test", run_batch, window_ms=0, max_size=1)
+    first = batcher.submit("m", {"x": 0})
+    assert started.wait(5)
+    cancelled = batcher.submit("m", {"x": 1})
+    kept = batcher.submit("m", {"x": 2})
+    assert cancelled.cancel()
+
+    release.set()
+    assert kept.result(timeout=5)["value"] == 4
+    assert first.result(timeout=5)["value"] == 0
+    assert seen == [0, 2]
+
+
+def test_predict_timeout_is_overload_and_skips_the_request():
+    started = threading.Event()
+    release = threading.Event()
+    seen = []
+
+    def run_batch(key, records):
+        started.set()
+        release.wait(5)
+        seen.extend(record["x"] for record in records)
+        return echo_batch(key, records)
+
+    batcher = MicroBatcher("test", run_batch, window_ms=0, max_size=1)
+    first = batcher.submit("m", {"x": 0})
+    assert started.wait(5)
+    with pytest.raises(ExecutorOverloaded):
+        batcher.predict("m", {"x": 1}, timeout=0.05)  # 排在正在计算的批次之后，等待超时
+    assert batcher.stats()["timed_out"] == 1
+
+    release.set()
+    assert first.result(timeout=5)["value"] == 0
+    assert batcher.predict("m", {"x": 2}, timeout=5)["value"] == 4
+    assert seen == [0, 2]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""/api/astragalus/model-metrics：加载时预先生成响应，支持 ETag 协商缓存"""
+
+import json
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+pytest.importorskip("xgboost")
+
+import astragalus_predictor as ap
+
+METRICS = {
+    "XGBoost": {"Train_R2_mean": 0.9, "Test_R2_mean": 0.8, "Train_RMSE_mean": 1.23456, "Test_RMSE_mean": 2.5},
+    "KNN": {"Train_R2_mean": 1.0, "Test_R2_mean": 0.5, "Train_RMSE_mean": 0.0, "Test_RMSE_mean": 3.0},
+}
+
+
+def test_response_body_and_etag():
+    body, etag = ap.build_metrics_response(METRICS)
+    payload = json.loads(body)
+    assert [item["name"] for item in payload["metrics"]] == ["XGBoost", "KNN"]
+    assert payload["metrics"][0]["metrics"]["train"] == {"r2": 90.0, "rmse": 1.2346}
+    assert ap.build_metrics_response(dict(METRICS))[1] == etag  # 内容相同时 ETag 不变
+    changed = {**METRICS, "KNN": {**METRICS["KNN"], "Test_R2_mean": 0.6}}
+    assert ap.build_metrics_response(changed)[1] != etag
+
+
+def test_endpoint_returns_304_for_matching_etag(monkeypatch):
+    pytest.importorskip("flask")
+    import app as app_module
+
+    predictor = app_module.astragalus_slot.get()
+    if predictor is None:
+        pytest.skip("仓库中的产量模型未能加载")
+    monkeypatch.setattr(predictor, "metrics_response", ap.build_metrics_response(METRICS))
+    client = app_module.app.test_client()
+
+    first = client.get("/api/astragalus/model-metrics")
+    assert first.status_code == 200
+    assert "max-age" in first.headers["Cache-Control"]
+    etag = first.headers["ETag"]
+
+    second = client.get("/api/astragalus/model-metrics", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.data == b""
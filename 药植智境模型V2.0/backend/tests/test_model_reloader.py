@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""ModelSlot 热更新和多 worker 重新加载请求"""
+
+import pytest
+
+from model_reloader import ModelReloader, ModelSlot, file_fingerprint
+
+
+def make_slot(tmp_path, versions, name="model"):
+    """每次加载返回 versions 中的下一个值；值为 "bad" 时冒烟测试失败"""
+    model_file = tmp_path / f"{name}.pkl"
+    model_file.write_text("v0")
+    loads = iter(versions)
+
+    def validator(predictor):
+        if predictor == "bad":
+            raise RuntimeError("冒烟测试失败")
+
+    return ModelSlot(name, lambda: next(loads), validator, lambda: [str(model_file)]), model_file
+
+
+def test_reload_swaps_and_notifies_listeners(tmp_path):
+    slot, _ = make_slot(tmp_path, ["v1", "v2"])
+    notified = []
+    slot.listeners.append(lambda s: notified.append(s.get()))
+
+    assert slot.reload()
+    assert slot.reload()
+    assert slot.get() == "v2"
+    assert slot.version == 2
+    assert notified == ["v1", "v2"]
+
+
+def test_failed_validation_keeps_current_model(tmp_path):
+    slot, model_file = make_slot(tmp_path, ["v1", "bad"])
+    slot.reload()
+    model_file.write_text("broken model")
+
+    assert not slot.reload()
+    assert slot.get() == "v1"
+    assert slot.version == 1
+    assert slot.last_error
+    assert slot.rejected_fingerprint == file_fingerprint([str(model_file)])
+
+
+def test_first_load_failure_raises(tmp_path):
+    slot, _ = make_slot(tmp_path, ["bad"])
+    with pytest.raises(RuntimeError):
+        slot.reload()
+
+
+def test_fingerprint_ignores_temporary_files(tmp_path):
+    (tmp_path / "model.joblib").write_text("a")
+    before = file_fingerprint([str(tmp_path)])
+    (tmp_path / "model.tmp.joblib").write_text("partial")
+    assert file_fingerprint([str(tmp_path)]) == before
+
+
+def test_broadcast_request_reaches_other_workers(tmp_path):
+    request_path = str(tmp_path / "reload_request.json")
+    slot_a, _ = make_slot(tmp_path, ["a1", "a2"], name="a")
+    slot_b, _ = make_slot(tmp_path, ["b1", "b2"], name="b")
+    slot_a.reload()
+    slot_b.reload()
+    worker_a = ModelReloader([slot_a], interval=0, request_path=request_path)
+    worker_b = ModelReloader([slot_b], interval=0, request_path=request_path)
+
+    worker_a.broadcast()
+    worker_a._check_request()  # 发出请求的进程自己直接重新加载，不重复处理
+    assert slot_a.get() == "a1"
+
+    worker_b._check_request()
+    assert slot_b.get() == "b2"
+    worker_b._check_request()  # 同一请求只处理一次
+    assert slot_b.version == 2
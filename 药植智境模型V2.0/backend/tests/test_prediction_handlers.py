@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""预测接口处理函数对请求体的校验（Flask 与 ASGI 共用）"""
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+pytest.importorskip("xgboost")
+
+import prediction_handlers as handlers
+
+
+@pytest.mark.parametrize("handler", [handlers.astragalus_predict, handlers.astragalus_predict_batch,
+                                     handlers.astragalus_predict_ensemble, handlers.climate_predict,
+                                     handlers.climate_predict_batch, handlers.climate_predict_by_location])
+@pytest.mark.parametrize("data", [None, [1, 2], "text"])
+def test_invalid_json_body_is_rejected(handler, data):
+    assert handler(object(), data) == ({"error": handlers.INVALID_JSON_ERROR}, 400)
+
+
+def test_parse_rejects_non_object_body():
+    with pytest.raises(ValueError, match=handlers.INVALID_JSON_ERROR):
+        handlers.parse_astragalus_request(None)
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""请求统计的状态码标签"""
+
+import pytest
+
+import request_metrics
+from request_metrics import REQUESTS_TOTAL, track
+
+pytestmark = pytest.mark.skipif(not request_metrics.METRICS_ENABLED, reason="REQUEST_METRICS_ENABLED=0")
+
+
+class BadRequest(Exception):
+    """与 werkzeug.exceptions.BadRequest 一样带有 code 属性"""
+    code = 400
+
+
+def count(route, status):
+    return REQUESTS_TOTAL._values.get((route, "", status), 0)
+
+
+def test_http_exception_is_recorded_with_its_status():
+    with pytest.raises(BadRequest):
+        with track("/test/bad-json"):
+            raise BadRequest()
+    assert count("/test/bad-json", "400") == 1
+    assert count("/test/bad-json", "500") == 0
+
+
+def test_other_exceptions_are_recorded_as_500():
+    with pytest.raises(RuntimeError):
+        with track("/test/crash"):
+            raise RuntimeError()
+    assert count("/test/crash", "500") == 1
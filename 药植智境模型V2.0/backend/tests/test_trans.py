@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""4_9/trans.py 分块转换：后续分块出现文本、转换失败时不破坏已有 CSV"""
+
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "4_9"))
+
+import trans
+from dataset_loader import read_meta
+
+COLUMNS = trans.REQUIRED_COLUMNS + ["note"]
+
+
+def write_source(path, n_rows, text_row=None):
+    rows = []
+    for i in range(n_rows):
+        values = [f"{i * 0.01:.2f}"] * len(trans.REQUIRED_COLUMNS) + ["1"]
+        if i == text_row:
+            values[-1] = "unknown"
+        rows.append("\t".join(values))
+    path.write_text("\t".join(COLUMNS) + "\n" + "\n".join(rows) + "\n", encoding="utf-8")
+
+
+def test_text_in_later_chunk_is_converted_as_text(tmp_path):
+    src, dst = tmp_path / "final.input.txt", tmp_path / "final_input.csv"
+    write_source(src, 3000, text_row=2500)
+
+    assert trans.convert(str(src), str(dst), emit_cache=True, max_memory_mb=1) == 3000
+    assert pd.read_csv(dst).shape == (3000, len(COLUMNS))
+    path = trans.cache_path_for(str(src), trans.source_digest(str(src)))
+    meta = read_meta(path)
+    assert meta["n_rows"] == 3000
+    assert next(column for column in meta["columns"] if column["name"] == "note")["kind"] == "string"
+
+
+def test_failed_conversion_keeps_existing_csv(tmp_path):
+    src, dst = tmp_path / "final.input.txt", tmp_path / "final_input.csv"
+    dst.write_text("previous\n", encoding="utf-8")
+    src.write_text("\t".join(COLUMNS) + "\n" + "1\t2\n" + "\"unterminated\n", encoding="utf-8")
+
+    with pytest.raises(Exception):
+        trans.convert(str(src), str(dst), max_memory_mb=1)
+    assert dst.read_text(encoding="utf-8") == "previous\n"
+    assert sorted(os.listdir(tmp_path)) == ["final.input.txt", "final_input.csv"]